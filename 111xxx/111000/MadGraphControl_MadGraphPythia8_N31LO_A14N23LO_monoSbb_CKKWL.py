@@ -1,13 +1,21 @@
 import MadGraphControl.MadGraphUtils
 from MadGraphControl.MadGraphUtils import *
+import fcntl, glob, hashlib, itertools, math, shutil, subprocess
 
 
 #####################
 # Settings
 #####################
 # safe factor to ensure a sufficient number of event has been generated
+# (only used if the merging acceptance of the mass point has not been measured yet)
 safefactor=2.5
 
+# relative margin on top of the measured merging acceptance
+try:
+    lhe_margin
+except NameError:
+    lhe_margin = 0.2
+
 # determine whether MadGraph reweight module should be run
 try:
     reweight
@@ -17,6 +25,42 @@ except NameError:
     locallog.info("reweight not set, defaulting to 'False'")
     reweight = False
 
+# coupling grid of the reweight module: 'gq', 'gx' and 'th' are given either as a list of values or as
+# a (min, max, step) range, couplings which are not listed stay at their nominal value,
+# e.g. reweight_grid = {'gq': [0.1, 0.25], 'gx': (0.5, 3.0, 0.5)}
+try:
+    reweight_grid
+except NameError:
+    reweight_grid = {'gx': (0.1, 3.5, 0.1)} # gchi < (4 pi)^0.5 \approx 3.55 (perturbativity bound)
+
+# explicit list of reweight points, e.g. [{'gx': 1.5, 'th': 0.1}], replaces reweight_grid if given
+try:
+    reweight_points
+except NameError:
+    reweight_points = []
+
+# number of MadGraph reweight launches the points are split into (limits the memory of a single launch)
+try:
+    reweight_split
+except NameError:
+    reweight_split = 1
+
+# determine whether the events should be generated from a gridpack
+# (the gridpack is built in a dedicated job and unpacked by all seed jobs)
+try:
+    gridpack
+except NameError:
+    gridpack = os.environ.get('MONOSBB_GRIDPACK', 'False') == 'True'
+    if gridpack:
+        from AthenaCommon import Logging
+        locallog = Logging.logging.getLogger('monoSbb')
+        locallog.info("gridpack mode enabled via MONOSBB_GRIDPACK")
+
+# shared cache of MadGraph process directories (disabled if no location is given)
+procdir_cache = os.environ.get('MONOSBB_PROCDIR_CACHE', '')
+# maximum size of the process directory cache in MB
+procdir_cache_size = int(os.environ.get('MONOSBB_PROCDIR_CACHE_SIZE', '20000'))
+
 
 evgenConfig.contact = ["Paul Philipp Gadow <pgadow@cern.ch>"]
 evgenConfig.generators = ["MadGraph", "Pythia8", "EvtGen"]
@@ -39,7 +83,89 @@ generate p p > zp > n1 n1 hs QED<=2, (hs > b b~) @0
 add process p p > zp > n1 n1 hs j QED<=2, (hs > b b~) @1
 output -f
 """
-process_dir = new_process(process)
+def model_version(model_name):
+    # hash of the UFO model files picked up from the PYTHONPATH
+    version = hashlib.sha1()
+    for path in os.environ.get('PYTHONPATH', '').split(':'):
+        model_dir = os.path.join(path, model_name)
+        if not os.path.isdir(model_dir):
+            continue
+        for model_file in sorted(os.listdir(model_dir)):
+            if model_file.endswith('.py'):
+                with open(os.path.join(model_dir, model_file), 'rb') as f:
+                    version.update(f.read())
+        break
+    return version.hexdigest()
+
+def cache_entry_size(path):
+    size = 0
+    for root, dirs, files in os.walk(path):
+        size += sum(os.path.getsize(os.path.join(root, f)) for f in files if not os.path.islink(os.path.join(root, f)))
+    return size
+
+def evict_process_cache(cache_dir, keep):
+    # drop the least recently used process directories until the cache fits into its size cap
+    with open(os.path.join(cache_dir, '.cache.lock'), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        entries = []
+        for key in os.listdir(cache_dir):
+            marker = os.path.join(cache_dir, key, '.complete')
+            if not os.path.isfile(marker):
+                continue
+            with open(marker) as f:
+                entries += [(os.path.getmtime(marker), int(f.read().strip() or 0), key)]
+        total = sum(e[1] for e in entries)
+        for last_used, size, key in sorted(entries):
+            if total <= procdir_cache_size * 1024 * 1024:
+                break
+            if key == keep:
+                continue
+            with open(os.path.join(cache_dir, key + '.lock'), 'a') as entry_lock:
+                fcntl.flock(entry_lock, fcntl.LOCK_EX)
+                shutil.rmtree(os.path.join(cache_dir, key), ignore_errors=True)
+            total -= size
+
+def cached_process(process, cache_dir):
+    # the process directory only depends on the process string, the model and the release
+    key = hashlib.sha1((process + model_version('DarkHiggs2MDM') + os.environ.get('AtlasVersion', '') +
+                        os.environ.get('MADPATH', '')).encode('utf-8')).hexdigest()
+    entry = os.path.join(cache_dir, key)
+    marker = os.path.join(entry, '.complete')
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    # complete entries are copied under a shared lock, so all jobs hitting the cache copy at the same time.
+    # The first job builds the directory under the exclusive lock, which is also taken by the eviction
+    process_dir = None
+    with open(entry + '.lock', 'a') as lock:
+        while process_dir is None:
+            fcntl.flock(lock, fcntl.LOCK_SH)
+            if os.path.isfile(marker):
+                with open(os.path.join(entry, 'process_dir.txt')) as f:
+                    process_dir = f.read().strip()
+                shutil.copytree(os.path.join(entry, process_dir), process_dir, symlinks=True)
+                os.utime(marker, None)
+                continue
+            # the conversion is not atomic: another job may have built the entry in the meantime
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if os.path.isfile(marker):
+                continue
+            process_dir = new_process(process)
+            shutil.rmtree(entry, ignore_errors=True)
+            os.makedirs(entry)
+            shutil.copytree(process_dir, os.path.join(entry, os.path.basename(process_dir)), symlinks=True)
+            with open(os.path.join(entry, 'process_dir.txt'), 'w') as f:
+                f.write(os.path.basename(process_dir))
+            with open(marker, 'w') as f:
+                f.write('%d' % cache_entry_size(entry))
+    evict_process_cache(cache_dir, key)
+    return process_dir
+
+if is_gen_from_gridpack():
+    process_dir = MADGRAPH_GRIDPACK_LOCATION
+elif procdir_cache:
+    process_dir = cached_process(process, procdir_cache)
+else:
+    process_dir = new_process(process)
 
 
 ########
@@ -64,8 +190,39 @@ try:
 except AssertionError:
     ktdurham = 40
 
+def jo_data_file(name):
+    # data files are shipped next to the job option
+    for jo_dir in (runArgs.jobConfig if hasattr(runArgs, 'jobConfig') else []) + [os.getcwd()]:
+        if os.path.isfile(os.path.join(jo_dir, name)):
+            return os.path.join(jo_dir, name)
+    return None
+
+def merging_acceptance(mzp, mdm, mhs, ktdurham):
+    # measured by UpdateAcceptanceTable.py from the logs of previous productions, which only writes
+    # mass points with enough showered events
+    table = jo_data_file('monoSbb_acceptance.dat')
+    if not table:
+        return None
+    with open(table) as f:
+        for line in f:
+            fields = line.split()
+            if line.startswith('#') or len(fields) != 6:
+                continue
+            if [int(x) for x in fields[:4]] == [mzp, mdm, mhs, ktdurham]:
+                tried, accepted = int(fields[4]), int(fields[5])
+                if tried > 0 and accepted > 0:
+                    return float(accepted) / tried
+    return None
+
 # set settings for run card
-nevents = runArgs.maxEvents*safefactor if runArgs.maxEvents>0 else safefactor*evgenConfig.nEventsPerJob
+nevents_target = runArgs.maxEvents if runArgs.maxEvents>0 else evgenConfig.nEventsPerJob
+acceptance = merging_acceptance(mzp, mdm, mhs, ktdurham)
+if acceptance:
+    nevents = int(math.ceil(nevents_target * (1. + lhe_margin) / acceptance))
+else:
+    nevents = int(math.ceil(nevents_target * safefactor))
+from AthenaCommon import Logging
+Logging.logging.getLogger('monoSbb').info("requesting %d LHE events (merging acceptance: %s)" % (nevents, acceptance))
 settings = {'lhe_version':'3.0',
             'cut_decays': 'F',
             'event_norm': 'sum',
@@ -78,6 +235,12 @@ settings = {'lhe_version':'3.0',
           }
 modify_run_card(process_dir=process_dir,runArgs=runArgs,settings=settings)
 
+# use all cores of the batch slot (submit.py --nCores) for the integration and the event generation
+n_cores = int(os.environ.get('ATHENA_CORE_NUMBER', os.environ.get('ATHENA_PROC_NUMBER', '1')))
+if n_cores > 1:
+    Logging.logging.getLogger('monoSbb').info("running MadGraph in multi-core mode with %d cores" % n_cores)
+    modify_config_card(process_dir=process_dir, settings={'run_mode': 2, 'nb_core': n_cores})
+
 
 ##################
 # Parameter card
@@ -88,32 +251,113 @@ params = {}
 params['mass'] = {'54': mhs, '55': mzp, '1000022': mdm}
 # couplings
 params['frblock'] = {'1': gq , '2': gx , '3': th}
-# decay width
-params['decay'] = {'54':"AUTO" , '55':"AUTO"}
+# decay width: precomputed values if available, otherwise computed by MadGraph
+def load_width_table():
+    # filled by MakeWidthTable.py, keyed by (mzp, mdm, mhs, gq, gx, th)
+    widths = {}
+    table = jo_data_file('monoSbb_widths.dat')
+    if table:
+        with open(table) as f:
+            for line in f:
+                fields = line.split()
+                if line.startswith('#') or len(fields) != 8:
+                    continue
+                widths[tuple(round(float(x), 6) for x in fields[:6])] = (float(fields[6]), float(fields[7]))
+    return widths
+
+def decay_widths(width_table, i_gq, i_gx, i_th):
+    return width_table.get(tuple(round(float(x), 6) for x in (mzp, mdm, mhs, i_gq, i_gx, i_th)))
+
+width_table = load_width_table()
+widths = decay_widths(width_table, gq, gx, th)
+if widths:
+    params['decay'] = {'54': "%e" % widths[0], '55': "%e" % widths[1]}
+else:
+    params['decay'] = {'54':"AUTO" , '55':"AUTO"}
+Logging.logging.getLogger('monoSbb').info("decay widths (hs, zp): %s" % (widths if widths else "AUTO"))
 modify_param_card(process_dir=process_dir, params=params)
 
 
 ##################
 # Reweight card
 ##################
-if reweight:
-    gx_scan = [0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0,
-               1.1, 1.2, 1.3, 1.4, 1.5, 1.6, 1.7, 1.8, 1.9, 2.0,
-               2.1, 2.2, 2.3, 2.4, 2.5, 2.6, 2.7, 2.8, 2.9, 3.0,
-               3.1, 3.2, 3.3, 3.4, 3.5] # gchi < (4 pi)^0.5 \approx 3.55 (perturbativity bound)
-    reweightCommand=""
-    for i_gx in gx_scan:
-        reweightCommand += "launch --rwgt_name=rwgt_gx_{gx_str}\n".format(gx_str=str(i_gx).replace('.', 'p'))
-        reweightCommand += "set frblock 2 {gx}\n\n".format(gx=i_gx)
+def coupling_values(spec):
+    # (min, max, step) ranges are expanded including both ends
+    if isinstance(spec, tuple) and len(spec) == 3:
+        low, high, step = spec
+        return [round(low + i * step, 6) for i in range(int(round((high - low) / step)) + 1)]
+    if isinstance(spec, (list, tuple)):
+        return [float(x) for x in spec]
+    return [float(spec)]
+
+def reweight_couplings():
+    # list of (gq, gx, th) points
+    if reweight_points:
+        return [(p.get('gq', gq), p.get('gx', gx), p.get('th', th)) for p in reweight_points]
+    return list(itertools.product(*[coupling_values(reweight_grid.get(c, nominal))
+                                    for c, nominal in [('gq', gq), ('gx', gx), ('th', th)]]))
+
+def coupling_label(value):
+    return str(value).replace('.', 'p').replace('-', 'm')
+
+def reweight_launch(i_gq, i_gx, i_th, gx_only):
+    # the names rwgt_gx_* of the gx scan are kept if only gx varies
+    if gx_only:
+        command = "launch --rwgt_name=rwgt_gx_{gx_str}\n".format(gx_str=coupling_label(i_gx))
+    else:
+        command = "launch --rwgt_name=rwgt_gq_{0}_gx_{1}_th_{2}\n".format(*[coupling_label(x) for x in (i_gq, i_gx, i_th)])
+        command += "set frblock 1 {gq}\n".format(gq=i_gq)
+    command += "set frblock 2 {gx}\n".format(gx=i_gx)
+    if not gx_only:
+        command += "set frblock 3 {th}\n".format(th=i_th)
+    # the widths change with the couplings: use the precomputed ones or let MadGraph recompute them
+    if widths:
+        i_widths = decay_widths(width_table, i_gq, i_gx, i_th)
+        command += "set decay 54 {w}\n".format(w="%e" % i_widths[0] if i_widths else "auto")
+        command += "set decay 55 {w}\n".format(w="%e" % i_widths[1] if i_widths else "auto")
+    return command + "\n", not (widths and i_widths)
+
+def write_reweight_card(commands):
     rcard = open(os.path.join(process_dir,'Cards', 'reweight_card.dat'), 'w')
-    rcard.write(reweightCommand)
+    rcard.write("".join(commands))
     rcard.close()
 
+reweight_chunks = []
+if reweight:
+    couplings = reweight_couplings()
+    gx_only = all(i_gq == gq and i_th == th for i_gq, i_gx, i_th in couplings)
+    launches = [reweight_launch(i_gq, i_gx, i_th, gx_only) for i_gq, i_gx, i_th in couplings]
+    # every point re-evaluates the matrix element of all events, points without a precomputed width
+    # additionally need the width computation of MadGraph
+    n_auto = sum(1 for command, auto in launches if auto)
+    Logging.logging.getLogger('monoSbb').info(
+        "reweight grid: %d points in %d launches, %d matrix element evaluations per point, %d points with width computation"
+        % (len(launches), min(reweight_split, len(launches)), nevents, n_auto))
+    n_chunks = max(1, min(reweight_split, len(launches)))
+    # the gridpack run moves its events out of the process directory, the further launches would find nothing
+    if n_chunks > 1 and (gridpack or is_gen_from_gridpack()):
+        raise RuntimeError("reweight_split = %d is not supported for gridpacks, set reweight_split = 1" % reweight_split)
+    reweight_chunks = [[command for command, auto in launches[i::n_chunks]] for i in range(n_chunks)]
+    # the first chunk is run by the launch of the event generation
+    write_reweight_card(reweight_chunks[0])
+
+def run_reweight_chunks(chunks):
+    # further launches of the reweight module on the events of the run made by generate()
+    run_name = MADGRAPH_RUN_NAME
+    if not glob.glob(os.path.join(process_dir, 'Events', run_name, 'unweighted_events.lhe*')):
+        raise RuntimeError("No events found in %s to reweight" % os.path.join(process_dir, 'Events', run_name))
+    for i, chunk in enumerate(chunks):
+        Logging.logging.getLogger('monoSbb').info("reweight launch %d/%d on %s" % (i + 2, len(chunks) + 1, run_name))
+        write_reweight_card(chunk)
+        subprocess.check_call([os.path.join('bin', 'madevent'), 'reweight', run_name, '-f'], cwd=process_dir)
+
 
 ###################
 # Event generation
 ###################
-generate(runArgs=runArgs, process_dir=process_dir)
+generate(runArgs=runArgs, process_dir=process_dir, grid_pack=gridpack)
+if len(reweight_chunks) > 1:
+    run_reweight_chunks(reweight_chunks[1:])
 
 # multi-core capability
 check_reset_proc_number(opts)
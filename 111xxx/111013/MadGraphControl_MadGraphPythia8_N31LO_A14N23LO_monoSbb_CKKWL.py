@@ -0,0 +1 @@
+../111000/MadGraphControl_MadGraphPythia8_N31LO_A14N23LO_monoSbb_CKKWL.py
\ No newline at end of file
@@ -1,7 +1,7 @@
 #! /usr/bin/env python
 from __future__ import print_function
 from ClusterSubmission.Utils import CreateDirectory, WriteList, ResolvePath, prettyPrint, id_generator
-import os, time, logging
+import os, time, hashlib, logging
 from random import shuffle
 logging.basicConfig(format='%(levelname)s : %(message)s', level=logging.INFO)
 
@@ -40,6 +40,7 @@ class ClusterEngine(object):
     ###  --- run_in_container: Switch whether a singularity container shall be emplaced
     ###  --- exclude_nodes: The job is not sent to certain nodes in the system (Cluster dependent)
     ###  --- submit_build: Compile the source code again on the cluster beforehand (Recommended)
+    ###  --- date: <YYYY-MM-DD> Day of the folder structure. Today if not given (Needed to resume a job on a later day)
     def __init__(self,
                  jobName,
                  baseDir,
@@ -56,11 +57,12 @@ class ClusterEngine(object):
                  run_in_container=True,
                  hold_build=[],
                  exclude_nodes=[],
-                 submit_build=True):
+                 submit_build=True,
+                 date=""):
 
         self.__jobName = jobName
         self.__baseFolder = baseDir
-        self.__Today = time.strftime("%Y-%m-%d")
+        self.__Today = date if date else time.strftime("%Y-%m-%d")
         self.__buildTime = buildTime
 
         self.__submit_build = submit_build
@@ -80,6 +82,10 @@ class ClusterEngine(object):
         self.__exclude_nodes = exclude_nodes
 
         self.__cluster_control_file = ""
+        self.__list_index_file = ""
+        ### Files already copied to the config directory. The source files are mapped to (size, mtime, copy)
+        ### such that repeated calls do not read the file again
+        self.__copied_files = {}
         #######################################################
         #   Folder structure
         #     BASEFOLDER
@@ -116,6 +122,10 @@ class ClusterEngine(object):
     def merge_mem(self):
         return self.__mergeMem
 
+    ### Day of the folder structure
+    def date(self):
+        return self.__Today
+
     ### Very basic directory to establish the folder structure mentioned above
     def base_dir(self):
         return self.__baseFolder
@@ -150,18 +160,37 @@ class ClusterEngine(object):
     def accountinggroup(self):
         return self.__accountinggroup
 
-    ### Copy a given file to the config directory unde a random hash. If the same file
-    ### is given twice to the method it is also copied twice as no link-connection between the files
-    ### is stored
+    ### Copy a given file to the config directory named after the hash of its content. A file
+    ### given several times to the method or files with the same content are copied only once
     def link_to_copy_area(self, config_file):
         config_path = ResolvePath(config_file)
         if not config_path: return None
+        stat = os.stat(config_path)
+        cached = self.__copied_files.get(config_path)
+        if cached and cached[:2] == (stat.st_size, stat.st_mtime) and os.path.exists(cached[2]):
+            return cached[2]
+        with open(config_path, "rb") as in_file:
+            content = in_file.read()
+        ### Keep the ending of the file
+        final_path = self.write_config_file(content, extension=config_file[config_file.rfind(".") + 1:])
+        if final_path: self.__copied_files[config_path] = (stat.st_size, stat.st_mtime, final_path)
+        return final_path
+
+    ### Write a file into the config directory named <prefix><sha1 of the content>.<extension> which
+    ### is only executable by the user. A file with the same content is written only once
+    ###    --- content: Either the bytes of the file or a list of lines
+    def write_config_file(self, content, prefix="", extension="sh"):
+        if isinstance(content, list): content = "".join("%s\n" % (line) for line in content).encode()
+        final_path = "%s/%s%s.%s" % (self.config_dir(), prefix, hashlib.sha1(content).hexdigest(), extension)
+        if os.path.exists(final_path): return final_path
         ### Create the directory
-        CreateDirectory(self.config_dir(), False)
-        ### Keep the ending of the file but rename it to a random thing
-        final_path = "%s/%s.%s" % (self.config_dir(), id_generator(99), config_file[config_file.rfind(".") + 1:])
-        os.system("cp %s %s" % (config_path, final_path))
-        os.system("chmod 0700 %s " % final_path)
+        if not os.path.isdir(self.config_dir()) and not CreateDirectory(self.config_dir(), False): return None
+        ### Rename a temporary file such that other processes never see a partially written file
+        tmp_path = "%s.%d" % (final_path, os.getpid())
+        with open(tmp_path, "wb") as out_file:
+            out_file.write(content)
+        os.chmod(tmp_path, 0o700)
+        os.rename(tmp_path, final_path)
         return final_path
 
     ### Check if a job has already been submitted under the same name
@@ -187,10 +216,8 @@ class ClusterEngine(object):
     #### write a file to be sourced inside the singularity container to
     #### pass the environment variables of the job
     def write_ship_file(self, env_vars):
-        ship_file_name = WriteList(["#!/bin/bash"] + ["export %s='%s'" % (var, val) for var, val in env_vars + self.common_env_vars()],
-                                   "%s/%s.sh" % (self.config_dir(), id_generator(74)))
-        os.system("chmod 0700 %s" % (ship_file_name))
-        return ship_file_name
+        return self.write_config_file(["#!/bin/bash"] + ["export %s='%s'" % (var, val) for var, val in env_vars + self.common_env_vars()],
+                                      prefix="Ship_")
 
     ### Will the job run inside a singularity container?
     def run_singularity(self):
@@ -212,10 +239,9 @@ class ClusterEngine(object):
             ])
             exec_script = self.link_to_copy_area(ResolvePath("ClusterSubmission/Singularity.sh"))
 
-        env_script = WriteList(["#!/bin/bash", "source %s" %
-                                (ship_file), "source %s" % (exec_script)], "%s/EnvScript_%s.sh" % (self.config_dir(), id_generator(50)))
-        os.system("chmod 0700 %s" % (env_script))
-        return env_script
+        ### All tasks of an array share the script. Variables differing between the tasks have to be
+        ### set in the environment of each task
+        return self.write_config_file(["#!/bin/bash", "source %s" % (ship_file), "source %s" % (exec_script)], prefix="EnvScript_")
 
     ### How many cores can be used to compile the environment on the cluster
     def get_build_cores(self):
@@ -405,7 +431,7 @@ class ClusterEngine(object):
             common_vars += [("OriginalArea", os.path.join(TESTAREA, "source"))]
 
         if len(self.__cluster_control_file) > 0:
-            common_vars += [("ClusterControlModule", self.__cluster_control_file)]
+            common_vars += [("ClusterControlModule", self.__cluster_control_file), ("ListIndexModule", self.__list_index_file)]
         return common_vars
 
     ### Helper method to parse a shell script sourced at
@@ -423,6 +449,8 @@ class ClusterEngine(object):
             return
         logging.info("Set the Cluster control module to %s" % (control_location))
         self.__cluster_control_file = self.link_to_copy_area(file_loc)
+        ### get_list_entry reading the index of WriteListIndex, sourced by all control modules
+        self.__list_index_file = self.link_to_copy_area("ClusterSubmission/ListIndex.sh")
 
     ### Ensures that the jobs always wait on the build job
     def to_hold(self, hold_jobs):
@@ -582,8 +610,8 @@ class MergeSubmit(object):
     ### Schedule the job on the cluster
     def submit_job(self):
         if self.__submitted: return False
-        job_array = WriteList(self.merge_lists(), "%s/%s.txt" % (self.engine().config_dir(), id_generator(31)))
-        final_merge_name = WriteList(self.temporary_files(), "%s/%s.txt" % (self.engine().config_dir(), id_generator(30)))
+        job_array = WriteList(self.merge_lists(), "%s/%s.txt" % (self.engine().config_dir(), id_generator(31)), index=True)
+        final_merge_name = WriteList(self.temporary_files(), "%s/%s.txt" % (self.engine().config_dir(), id_generator(30)), index=True)
         if not self.engine().submit_array(script="ClusterSubmission/Merge.sh",
                                           sub_job=self.job_name(),
                                           mem=self.engine().merge_mem(),
@@ -57,7 +57,7 @@ class HTCondorJob(object):
         if not isinstance(child, HTCondorJob):
             logging.warning("Wrong object given to addChild")
             return False
-        if self.getChild(child): return True
+        if self.getChild(child.getJobName()): return True
         if child == self: return True
         self.__children += [(child, task_ids)]
         return True
@@ -97,7 +97,7 @@ class HTCondorJob(object):
                         parent_dict[p_str] = [child.get_child_str()]
             ### One by one mapping of the jobs
             elif -1 in tasks:
-                for tsk_id in range(1, self.array_size() + 1):
+                for tsk_id in range(1, min(self.array_size(), child.array_size()) + 1):
                     p_str = "%s%d" % (self.abb_letter(), tsk_id)
                     ch_str = "%s%d" % (child.abb_letter(), tsk_id)
                     try:
@@ -112,7 +112,7 @@ class HTCondorJob(object):
                         parent_dict[p_str] += [child.get_child_str()]
                     except:
                         parent_dict[p_str] = [child.get_child_str()]
-        return sorted(["PARENT %s CHILD %s" % (parent, " ".join(children)) for parent, children in parent_dict.iteritems()])
+        return sorted(["PARENT %s CHILD %s" % (parent, " ".join(children)) for parent, children in parent_dict.items()])
 
 
 class HTCondorEngine(ClusterEngine):
@@ -229,7 +229,8 @@ class HTCondorEngine(ClusterEngine):
            *must* start with a 1. 0's are ignored by the system. There
            a third option, where the user parses
                ["MyJobArray", -1]
-           that is supported by the slurm engine is currently not supported for htcondor."""
+           indicating a one-by-one dependency of the tasks in the two arrays, i.e. task i
+           of the array only waits for task i of MyJobArray."""
 
         child = self._get_condor_job(self.subjob_name(sub_job))
         for parent in self.to_hold(hold_jobs):
@@ -238,7 +239,10 @@ class HTCondorEngine(ClusterEngine):
             if not parent_job:
                 logging.warning("Could not establish dependency towards %s" % (parent_name))
                 continue
-            parent_job.addChild(child, [] if isinstance(parent, str) else parent[1])
+            if isinstance(parent, str): task_ids = []
+            elif isinstance(parent[1], int): task_ids = [parent[1]]
+            else: task_ids = parent[1]
+            parent_job.addChild(child, task_ids)
 
     def submit_job(self, script, sub_job="", mem=-1, env_vars=[], hold_jobs=[], run_time="", n_cores=1):
         if not self._write_submission_file(
@@ -0,0 +1,319 @@
+#! /usr/bin/env python
+from ClusterSubmission.LocalEngine import LocalEngine, LocalResources
+import os, time, json, heapq, socket, argparse, threading, logging
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+logging.basicConfig(format='%(levelname)s : %(message)s', level=logging.INFO)
+
+
+###############################################################
+##              LocalDaemon
+## Long-lived process owning the cores and the memory of the
+## machine. The LocalEngines of several submissions send their
+## DAGs over a Unix domain socket to the daemon which runs the jobs
+## of all DAGs with one resource budget. The free resources are
+## shared fairly: The next job is taken from the DAG using the
+## fewest cores at the moment.
+## Each request is a single line of json answered by a single line
+##      {"command": "submit", ...}  --> {"dag": <id>}
+##      {"command": "wait", "dag": <id>}  --> {"success": <bool>}
+##      {"command": "status"}  --> {"dags": [...], ...}
+##      {"command": "shutdown"}  --> {}
+###############################################################
+class LocalDaemon(object):
+    ###  --- socket_path: Location of the Unix domain socket
+    ###  --- maxCores, maxMemory, maxRunning: Resources of the machine given to the jobs. See LocalResources
+    ###  --- share_with_group: Allow the members of the group to submit to the daemon. The jobs run under the account of the daemon
+    ###  --- keep_finished: Number of finished DAGs kept for the status queries
+    def __init__(self, socket_path, maxCores=-1, maxMemory=-1, maxRunning=-1, share_with_group=False, keep_finished=100):
+        self.__socket_path = socket_path
+        self.__resources = LocalResources(maxCores=maxCores, maxMemory=maxMemory, maxRunning=maxRunning)
+        self.__share_with_group = share_with_group
+        self.__keep_finished = keep_finished
+        ### The threads of all DAGs report their end to this queue. None only wakes up the scheduler
+        self.__finished = queue.Queue()
+        self.__lock = threading.Lock()
+        self.__dags = {}
+        self.__next_dag = 1
+        self.__stop = False
+
+    def socket_path(self):
+        return self.__socket_path
+
+    def resources(self):
+        return self.__resources
+
+    ### Opens the socket and runs the jobs until the daemon is shut down
+    def serve(self):
+        if os.path.exists(self.__socket_path):
+            try:
+                send_request(self.__socket_path, {"command": "status"})
+                logging.error("<LocalDaemon>: There is already a daemon listening on %s" % (self.__socket_path))
+                return False
+            except socket.error:
+                ### Left over by a daemon which has not been shut down properly
+                os.remove(self.__socket_path)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.__socket_path)
+        os.chmod(self.__socket_path, 0o660 if self.__share_with_group else 0o600)
+        server.listen(64)
+        listener = threading.Thread(target=self.__listen, args=(server, ))
+        listener.daemon = True
+        listener.start()
+        logging.info("<LocalDaemon>: Listening on %s with %d cores%s" %
+                     (self.__socket_path, self.__resources.max_cores(),
+                      "" if self.__resources.max_memory() <= 0 else " and %d MB memory" % (self.__resources.max_memory())))
+        try:
+            self.__schedule()
+        finally:
+            server.close()
+            if os.path.exists(self.__socket_path): os.remove(self.__socket_path)
+        logging.info("<LocalDaemon>: Shut down")
+        return True
+
+    def __listen(self, server):
+        while True:
+            try:
+                connection, address = server.accept()
+            except socket.error:
+                return
+            handler = threading.Thread(target=self.__handle, args=(connection, ))
+            handler.daemon = True
+            handler.start()
+
+    def __handle(self, connection):
+        try:
+            request = json.loads(read_line(connection))
+            command = request.get("command")
+            if command == "submit": reply = self.submit(request)
+            elif command == "wait": reply = self.wait(request.get("dag", -1))
+            elif command == "status": reply = self.status()
+            elif command == "shutdown": reply = self.shutdown()
+            else: reply = {"error": "Unknown command %s" % (command)}
+        except Exception as error:
+            logging.error("<LocalDaemon>: Failed to handle a request: %s" % (error))
+            reply = {"error": str(error)}
+        try:
+            connection.sendall((json.dumps(reply) + "\n").encode())
+        except socket.error:
+            pass
+        connection.close()
+
+    ### Rebuilds the DAG of a LocalEngine and schedules its jobs
+    def submit(self, request):
+        if self.__stop: return {"error": "The daemon is shutting down"}
+        engine = LocalEngine.rebuild(request["engine"],
+                                     request["jobs"],
+                                     request.get("states", {}),
+                                     maxCores=self.__resources.max_cores(),
+                                     maxMemory=self.__resources.max_memory())
+        if request.get("environment"): engine.set_job_environment(dict((str(k), str(v)) for k, v in request["environment"].items()))
+        engine.set_completion_queue(self.__finished)
+        with self.__lock:
+            engine.prepare_run()
+            dag_id = self.__next_dag
+            self.__next_dag += 1
+            self.__dags[dag_id] = {
+                "engine": engine,
+                "user": request.get("user", ""),
+                "submitted": time.time(),
+                "done": threading.Event(),
+                "success": False,
+            }
+            self.__prune()
+        logging.info("<LocalDaemon>: Received DAG %d with %d jobs of %s from %s" %
+                     (dag_id, engine.n_threads(), engine.job_name(), request.get("user", "")))
+        self.__finished.put(None)
+        return {"dag": dag_id}
+
+    ### Blocks until the DAG is done
+    def wait(self, dag_id):
+        dag = self.__dags.get(dag_id)
+        if dag is None: return {"error": "Unknown DAG %s" % (dag_id)}
+        ### Event.wait without timeout cannot be interrupted in python 2
+        while not dag["done"].wait(60):
+            pass
+        return {"success": dag["success"]}
+
+    def status(self):
+        with self.__lock:
+            dags = []
+            for dag_id in sorted(self.__dags.keys()):
+                dag = self.__dags[dag_id]
+                engine = dag["engine"]
+                entry = {
+                    "dag": dag_id,
+                    "user": dag["user"],
+                    "job_name": engine.job_name(),
+                    "submitted": dag["submitted"],
+                    "done": dag["done"].is_set(),
+                    "success": dag["success"],
+                    "cores": sum(th.n_cores() for th in engine.running_jobs()),
+                    "memory": sum(th.memory() for th in engine.running_jobs()),
+                }
+                entry.update(engine.run_status())
+                dags += [entry]
+        return {"max_cores": self.__resources.max_cores(), "max_memory": self.__resources.max_memory(), "dags": dags}
+
+    ### No further DAGs are accepted. The daemon stops once the submitted DAGs are done
+    def shutdown(self):
+        self.__stop = True
+        self.__finished.put(None)
+        return {}
+
+    def __active(self):
+        return [self.__dags[d]["engine"] for d in sorted(self.__dags.keys()) if not self.__dags[d]["done"].is_set()]
+
+    def __prune(self):
+        finished = sorted(d for d in self.__dags.keys() if self.__dags[d]["done"].is_set())
+        for dag_id in finished[:max(0, len(finished) - self.__keep_finished)]:
+            del self.__dags[dag_id]
+
+    ### Ready jobs of the DAGs in the order of fair share: The next job is taken from the DAG
+    ### with the fewest cores in use, counting the jobs already handed out
+    def __candidates(self, engines):
+        heap = [(sum(th.n_cores() for th in e.running_jobs()), i, e) for i, e in enumerate(engines) if e.ready_jobs()]
+        heapq.heapify(heap)
+        while heap:
+            usage, i, engine = heapq.heappop(heap)
+            th = engine.ready_jobs().popleft()
+            yield th
+            if engine.ready_jobs(): heapq.heappush(heap, (usage + th.n_cores(), i, engine))
+
+    def __dispatch(self):
+        engines = self.__active()
+        running = set()
+        for engine in engines:
+            running |= engine.running_jobs()
+        waiting = self.__resources.dispatch(self.__candidates(engines), running, lambda th: th.thread_engine().start_job(th))
+        for th in reversed(waiting):
+            th.thread_engine().ready_jobs().appendleft(th)
+
+    ### Marks the DAGs as done which have no jobs left to run
+    def __close_finished(self):
+        for dag_id in sorted(self.__dags.keys()):
+            dag = self.__dags[dag_id]
+            engine = dag["engine"]
+            if dag["done"].is_set(): continue
+            if not engine.run_finished() and (engine.running_jobs() or engine.ready_jobs()): continue
+            dag["success"] = engine.close_run()
+            dag["done"].set()
+            logging.info("<LocalDaemon>: DAG %d of %s finished %s" % (dag_id, engine.job_name(), "successfully" if dag["success"] else "with failures"))
+
+    def __schedule(self):
+        while True:
+            with self.__lock:
+                self.__close_finished()
+                if self.__stop and not self.__active(): return
+                self.__dispatch()
+            try:
+                th = self.__finished.get(timeout=60)
+            except queue.Empty:
+                continue
+            if th is None: continue
+            with self.__lock:
+                th.thread_engine().job_finished(th)
+
+
+### Reads a single line from the socket
+def read_line(connection):
+    data = b""
+    while not data.endswith(b"\n"):
+        chunk = connection.recv(1 << 16)
+        if not chunk: break
+        data += chunk
+    return data.decode()
+
+
+### Sends a request to the daemon and returns its reply
+def send_request(socket_path, request):
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(socket_path)
+        connection.sendall((json.dumps(request) + "\n").encode())
+        return json.loads(read_line(connection))
+    finally:
+        connection.close()
+
+
+### Sends the jobs of the engine to the daemon and waits until they are done
+def submit_to_daemon(socket_path, engine):
+    request = {
+        "command": "submit",
+        "user": os.getenv("USER", ""),
+        "engine": {
+            "job_name": engine.job_name(),
+            "base_dir": engine.base_dir(),
+            "date": engine.date()
+        },
+        "jobs": [th.spec() for th in engine.get_threads()],
+        "states": dict((th.task_name(), "succeeded") for th in engine.get_threads() if th.is_success()),
+        "environment": dict(os.environ),
+    }
+    try:
+        reply = send_request(socket_path, request)
+        if "error" in reply:
+            logging.error("<submit_to_daemon>: The daemon refused the jobs: %s" % (reply["error"]))
+            return False
+        logging.info("<submit_to_daemon>: Submitted %d jobs as DAG %d to %s. The status is shown by" %
+                     (engine.n_threads(), reply["dag"], socket_path))
+        logging.info("<submit_to_daemon>:    python %s --socket %s --status" % (os.path.abspath(__file__).replace(".pyc", ".py"), socket_path))
+        reply = send_request(socket_path, {"command": "wait", "dag": reply["dag"]})
+    except (socket.error, ValueError) as error:
+        logging.error("<submit_to_daemon>: Could not talk to the daemon at %s: %s" % (socket_path, error))
+        return False
+    return reply.get("success", False)
+
+
+def print_status(socket_path):
+    status = send_request(socket_path, {"command": "status"})
+    logging.info("Daemon at %s with %d cores and %d MB memory" % (socket_path, status["max_cores"], status["max_memory"]))
+    logging.info("   {0:>5} {1:>10} {2:>30} {3:>6} {4:>8} {5:>8} {6:>8} {7:>10} {8:>7} {9:>8}".format(
+        "DAG", "user", "job", "cores", "memory", "pending", "running", "succeeded", "failed", "skipped"))
+    for dag in status["dags"]:
+        logging.info("   {0:>5} {1:>10} {2:>30} {3:>6} {4:>8} {5:>8} {6:>8} {7:>10} {8:>7} {9:>8}".format(
+            dag["dag"], dag["user"], dag["job_name"], dag["cores"], dag["memory"], dag["pending"], dag["running"], dag["succeeded"],
+            dag["failed"], dag["skipped"]))
+
+
+def getArgumentParser():
+    """Get arguments from command line."""
+    parser = argparse.ArgumentParser(prog='LocalDaemon',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+                                     description="Daemon running the jobs of several LOCAL submissions on one machine")
+    parser.add_argument('--socket', help='Location of the Unix domain socket of the daemon', required=True)
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument('--start', help='Start the daemon', action='store_true', default=False)
+    action.add_argument('--status', help='Print the status of the DAGs of the daemon', action='store_true', default=False)
+    action.add_argument('--shutdown', help='Stop the daemon once the submitted DAGs are done', action='store_true', default=False)
+    parser.add_argument("--maxCurrentJobs", help="Maximum number of running jobs. Values below 1 do not limit the number", type=int, default=-1)
+    parser.add_argument("--localCores", help="Number of cores used. By default all cores of the machine", type=int, default=-1)
+    parser.add_argument("--localMemory", help="Memory in MB used. By default the physical memory of the machine", type=int, default=-1)
+    parser.add_argument("--shareWithGroup",
+                        help="Allow the group to submit to the daemon. The jobs run under the account of the daemon",
+                        action='store_true',
+                        default=False)
+    return parser
+
+
+def main():
+    options = getArgumentParser().parse_args()
+    if options.start:
+        daemon = LocalDaemon(options.socket,
+                             maxCores=options.localCores,
+                             maxMemory=options.localMemory,
+                             maxRunning=options.maxCurrentJobs,
+                             share_with_group=options.shareWithGroup)
+        exit(0 if daemon.serve() else 1)
+    try:
+        if options.status: print_status(options.socket)
+        elif options.shutdown: send_request(options.socket, {"command": "shutdown"})
+    except socket.error as error:
+        logging.error("Could not talk to the daemon at %s: %s" % (options.socket, error))
+        exit(1)
+
+
+if __name__ == '__main__':
+    main()
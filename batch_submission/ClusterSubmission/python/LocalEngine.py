@@ -1,7 +1,12 @@
 #! /usr/bin/env python
 from ClusterSubmission.ClusterEngine import ClusterEngine
-from ClusterSubmission.Utils import CreateDirectory, ResolvePath, id_generator, getRunningThreads, ReadListFromFile, WriteList, AppendToList
-import os, time, threading, logging
+from ClusterSubmission.Utils import CreateDirectory, id_generator, ReadListFromFile, WriteList, AppendToList, TimeToSeconds
+from collections import deque
+import os, time, json, shutil, argparse, subprocess, threading, multiprocessing, logging
+try:
+    import queue
+except ImportError:
+    import Queue as queue
 logging.basicConfig(format='%(levelname)s : %(message)s', level=logging.INFO)
 
 
@@ -9,22 +14,327 @@ logging.basicConfig(format='%(levelname)s : %(message)s', level=logging.INFO)
 ##              LocalEngine
 ## the local engine manages the local submission of the jobs
 ## i.e. many threads are started in parallel
+## The jobs form a DAG. Each job counts its unfinished dependencies
+## and is queued once the counter drops to zero. The threads
+## report their completion to the engine such that the next jobs
+## are dispatched immediately without polling
+## A job is only started if its cores and memory fit into what is
+## left on the machine. Smaller jobs are backfilled around a large
+## job waiting for resources as long as they do not delay it
+## The states of the jobs are journaled in the tmp_dir such that an
+## interrupted run can be resumed with
+##      python LocalEngine.py --resume <tmp_dir>/LocalJournal.txt
+## If a LocalDaemon is given, the jobs are sent to the daemon which
+## runs the jobs of several submissions on the same machine
 ###############################################################
+def get_machine_memory():
+    """Physical memory of the machine in MB or -1 if it cannot be determined."""
+    try:
+        return int(os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / 1024**2)
+    except (ValueError, OSError, AttributeError):
+        return -1
+
+
+###############################################################
+##              LocalResources
+## Cores and memory of the machine shared by the running jobs
+###############################################################
+class LocalResources(object):
+    ###  --- maxCores: Number of cores available to the jobs. By default all cores of the machine
+    ###  --- maxMemory: Memory in MB available to the jobs. By default the physical memory of the machine
+    ###  --- maxRunning: Maximum number of simultaneously running jobs. Values below 1 do not limit the number
+    def __init__(self, maxCores=-1, maxMemory=-1, maxRunning=-1):
+        self.__max_cores = maxCores if maxCores > 0 else multiprocessing.cpu_count()
+        self.__max_memory = maxMemory if maxMemory > 0 else get_machine_memory()
+        self.__max_running = maxRunning
+        self.__warned = set()
+
+    def max_cores(self):
+        return self.__max_cores
+
+    ### -1 if unknown, then memory is not accounted
+    def max_memory(self):
+        return self.__max_memory
+
+    def max_running(self):
+        return self.__max_running
+
+    ### Resources claimed by a job. A job asking for more than the machine has would never
+    ### start, hence its request is reduced to the machine
+    def claim(self, n_cores, mem, job_name):
+        if (n_cores > self.max_cores() or (self.max_memory() > 0 and mem > self.max_memory())) and job_name not in self.__warned:
+            self.__warned.add(job_name)
+            logging.warning("<LocalResources>: %s asks for %d cores and %d MB but only %d cores and %d MB are available" %
+                            (job_name, n_cores, mem, self.max_cores(), self.max_memory()))
+        n_cores = min(max(1, n_cores), self.max_cores())
+        mem = max(0, mem) if self.max_memory() <= 0 else min(max(0, mem), self.max_memory())
+        return n_cores, mem
+
+    ### Starts the jobs fitting into the free resources and returns the jobs taken from candidates which have to wait.
+    ### The first job which does not fit gets a reservation: From the expected end of the running jobs
+    ### the time is estimated when enough resources are free for it. Later jobs are only started if they
+    ### end before this time or if they fit into what is left over once the reserved job runs
+    ###   --- candidates: Iterator over the ready jobs in the order of their priority
+    ###   --- running: The running jobs
+    ###   --- start: Method starting a job
+    def dispatch(self, candidates, running, start):
+        free_cores = self.max_cores() - sum(th.n_cores() for th in running)
+        free_mem = self.max_memory() - sum(th.memory() for th in running)
+        n_running = len(running)
+        waiting = []
+        reservation = None
+        not_fitting = set()
+        now = time.time()
+        for th in candidates:
+            request = (th.n_cores(), th.memory())
+            if free_cores < 1 or (self.max_running() > 0 and n_running >= self.max_running()):
+                waiting.append(th)
+                break
+            if request in not_fitting or th.n_cores() > free_cores or (self.max_memory() > 0 and th.memory() > free_mem):
+                not_fitting.add(request)
+                if reservation is None: reservation = self.__reserve(th, running, now)
+                waiting.append(th)
+                continue
+            if reservation is not None:
+                shadow_time, extra_cores, extra_mem = reservation
+                if th.run_time() > 0 and now + th.run_time() <= shadow_time < float("inf"):
+                    pass
+                elif th.n_cores() <= extra_cores and (self.max_memory() <= 0 or th.memory() <= extra_mem):
+                    reservation = (shadow_time, extra_cores - th.n_cores(), extra_mem - th.memory())
+                else:
+                    waiting.append(th)
+                    continue
+            start(th)
+            n_running += 1
+            free_cores -= th.n_cores()
+            free_mem -= th.memory()
+        return waiting
+
+    ### Returns (time, cores, memory): When the running jobs have freed enough resources for the job
+    ### and what is left over then. The time is infinite if a running job has no run time given
+    def __reserve(self, job, running, now):
+        cores = self.max_cores() - sum(th.n_cores() for th in running)
+        mem = self.max_memory() - sum(th.memory() for th in running)
+        shadow_time = now
+        for th in sorted(running, key=lambda th: th.expected_end()):
+            if cores >= job.n_cores() and (self.max_memory() <= 0 or mem >= job.memory()): break
+            cores += th.n_cores()
+            mem += th.memory()
+            shadow_time = th.expected_end()
+        return shadow_time, cores - job.n_cores(), mem - job.memory()
+
+
+### Yields the jobs of the deque from the left until it is empty
+def pop_jobs(jobs):
+    while jobs:
+        yield jobs.popleft()
+
+
+###############################################################
+##              LocalJournal
+## Append-only record of a local run. Each line is a json object.
+## The first line describes the engine, then every job is recorded
+## once as pending together with everything needed to run it again.
+## Later lines record the state changes of the jobs:
+##      running, succeeded, failed (with exit code and duration)
+##      and skipped if one of their dependencies failed
+###############################################################
+class LocalJournal(object):
+    def __init__(self, journal_file):
+        self.__journal_file = journal_file
+        self.__stream = None
+
+    def journal_file(self):
+        return self.__journal_file
+
+    def open(self, append=False):
+        self.__stream = open(self.__journal_file, "a" if append else "w")
+
+    def close(self):
+        if self.__stream: self.__stream.close()
+        self.__stream = None
+
+    def write(self, record):
+        ### Flush each record such that it survives an interruption of the process
+        self.__stream.write(json.dumps(record, sort_keys=True) + "\n")
+        self.__stream.flush()
+
+    def engine(self, engine):
+        self.write({
+            "engine": {
+                "job_name": engine.job_name(),
+                "base_dir": engine.base_dir(),
+                "date": engine.date(),
+                "max_current": engine.max_running_per_array(),
+                "max_cores": engine.max_cores(),
+                "max_memory": engine.max_memory(),
+            }
+        })
+
+    def pending(self, thread):
+        self.write({"time": time.time(), "task": thread.task_name(), "state": "pending", "job": thread.spec()})
+
+    def state(self, thread, state):
+        record = {"time": time.time(), "task": thread.task_name(), "state": state}
+        if state in ["succeeded", "failed"]:
+            record["exit_code"] = thread.exit_code()
+            record["duration"] = thread.duration()
+        self.write(record)
+
+    ### Returns the engine record, the pending records of the jobs in their order and the last state of each job
+    def read(self):
+        engine = None
+        jobs = []
+        states = {}
+        with open(self.__journal_file) as stream:
+            for line in stream:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    ### The last line may be incomplete if the process was killed while writing it
+                    continue
+                if "engine" in record:
+                    engine = record["engine"]
+                    continue
+                if record["state"] == "pending" and record["task"] not in states:
+                    jobs += [record["job"]]
+                states[record["task"]] = record["state"]
+        return engine, jobs, states
+
+
 class LocalEngine(ClusterEngine):
-    def __init__(self, jobName="", baseDir="", maxCurrentJobs=-1, singularity_image="", run_in_container=False):
+    ###  --- maxCurrentJobs: Maximum number of simultaneously running jobs. Values below 1 do not limit the number
+    ###  --- maxCores: Number of cores available to the jobs. By default all cores of the machine
+    ###  --- maxMemory: Memory in MB available to the jobs. By default the physical memory of the machine
+    ###  --- date: Day of the folder structure of the job, only needed to resume a job
+    ###  --- daemon: Socket of a LocalDaemon running the jobs instead of the engine itself
+    def __init__(self,
+                 jobName="",
+                 baseDir="",
+                 maxCurrentJobs=-1,
+                 singularity_image="",
+                 run_in_container=False,
+                 maxCores=-1,
+                 maxMemory=-1,
+                 date="",
+                 daemon=""):
         ClusterEngine.__init__(self,
                                jobName=jobName,
                                baseDir=baseDir,
                                maxCurrentJobs=maxCurrentJobs,
                                submit_build=run_in_container,
                                singularity_image=singularity_image,
-                               run_in_container=run_in_container)
+                               run_in_container=run_in_container,
+                               date=date)
+        self.__resources = LocalResources(maxCores=maxCores, maxMemory=maxMemory, maxRunning=maxCurrentJobs)
+        self.__daemon = daemon
         self.__threads = []
         self.__runned_jobs = 0
+        ### Threads put themselves into the queue once they are done
+        self.__finished = queue.Queue()
+        self.__journal = LocalJournal("%s/LocalJournal.txt" % (self.tmp_dir()))
+        self.__resumed = False
+        ### Environment the jobs are started in. By default the one of this process
+        self.__environment = None
+        ### State of the DAG while the jobs are executed
+        self.__n_waiting = {}
+        self.__successors = {}
+        self.__ready = deque()
+        self.__running = set()
+        self.__n_done = 0
+        self.__dead_jobs = []
 
     def get_threads(self):
         return self.__threads
 
+    def journal(self):
+        return self.__journal
+
+    ### Rebuilds the jobs of an interrupted run from its journal. Jobs which succeeded are not executed again
+    ###  --- journal_file: Location of the journal in the tmp_dir of the job
+    ###  --- maxCurrentJobs, maxCores, maxMemory: Override the settings of the interrupted run if given
+    @staticmethod
+    def resume(journal_file, maxCurrentJobs=-1, maxCores=-1, maxMemory=-1):
+        if not os.path.exists(journal_file):
+            logging.error("<LocalEngine::resume>: The journal %s does not exist" % (journal_file))
+            return None
+        engine_record, jobs, states = LocalJournal(journal_file).read()
+        if not engine_record:
+            logging.error("<LocalEngine::resume>: The journal %s does not describe a local run" % (journal_file))
+            return None
+        engine = LocalEngine.rebuild(engine_record,
+                                     jobs,
+                                     states,
+                                     maxCurrentJobs=maxCurrentJobs if maxCurrentJobs > 0 else engine_record["max_current"],
+                                     maxCores=maxCores if maxCores > 0 else engine_record["max_cores"],
+                                     maxMemory=maxMemory if maxMemory > 0 else engine_record["max_memory"])
+        if os.path.abspath(engine.journal().journal_file()) != os.path.abspath(journal_file):
+            logging.error("<LocalEngine::resume>: The journal %s has been moved away from %s" % (journal_file, engine.tmp_dir()))
+            return None
+        logging.info("<LocalEngine::resume>: Resume %s with %d/%d jobs left" %
+                     (engine.job_name(), len([th for th in engine.get_threads() if not th.is_success()]), engine.n_threads()))
+        return engine
+
+    ### Builds an engine from the description of its jobs written to the journal
+    ###  --- engine_record: Job name, base directory and date of the run
+    ###  --- jobs: Descriptions of the jobs (LocalClusterThread.spec()) in the order of their submission
+    ###  --- states: Last state of each job. Jobs which succeeded are not executed again
+    @staticmethod
+    def rebuild(engine_record, jobs, states={}, maxCurrentJobs=-1, maxCores=-1, maxMemory=-1):
+        engine = LocalEngine(jobName=engine_record["job_name"],
+                             baseDir=engine_record["base_dir"],
+                             maxCurrentJobs=maxCurrentJobs,
+                             maxCores=maxCores,
+                             maxMemory=maxMemory,
+                             date=engine_record["date"])
+        threads = {}
+        for job in jobs:
+            ### The machine may be smaller than the one the jobs were submitted to
+            n_cores, mem = engine.resources().claim(job["n_cores"], job["mem"], job["name"])
+            th = LocalClusterThread(thread_name=job["name"],
+                                    subthread=job["number"],
+                                    thread_engine=engine,
+                                    dependencies=[threads[d] for d in job["dependencies"]],
+                                    script_exec=job["script"],
+                                    n_cores=n_cores,
+                                    mem=mem,
+                                    run_time=job["run_time"])
+            if states.get(th.task_name()) == "succeeded": th.set_succeeded()
+            threads[th.task_name()] = th
+            engine.get_threads().append(th)
+        ### The jobs which are not yet succeeded are already journaled as pending
+        engine.__resumed = os.path.exists(engine.journal().journal_file()) and len(states) > 0
+        return engine
+
+    def resources(self):
+        return self.__resources
+
+    ### Cores available to the jobs
+    def max_cores(self):
+        return self.__resources.max_cores()
+
+    ### Memory in MB available to the jobs. -1 if unknown, then memory is not accounted
+    def max_memory(self):
+        return self.__resources.max_memory()
+
+    ### Socket of the LocalDaemon running the jobs
+    def daemon(self):
+        return self.__daemon
+
+    ### Environment variables the jobs are started with
+    def job_environment(self):
+        return self.__environment if self.__environment is not None else os.environ
+
+    def set_job_environment(self, environment):
+        self.__environment = environment
+
+    ### The threads report their end to the given queue instead
+    def set_completion_queue(self, completion_queue):
+        self.__finished = completion_queue
+
+    def __claim(self, n_cores, mem, sub_job):
+        return self.__resources.claim(n_cores, mem, self.subjob_name(sub_job))
+
     def n_threads(self):
         return len(self.get_threads())
 
@@ -32,18 +342,23 @@ class LocalEngine(ClusterEngine):
         return len([x for x in self.get_threads() if x.name() == task_name])
 
     #### Basic method to submit a job
-    def submit_job(self, script, sub_job="", mem=-1, env_vars=[], hold_jobs=[], run_time=""):
-        ### Memory is senseless in this setup. Do not pipe it further
+    def submit_job(self, script, sub_job="", mem=-1, env_vars=[], hold_jobs=[], run_time="", n_cores=1):
+        n_cores, mem = self.__claim(n_cores, mem, sub_job)
         pending_threads, direct_pending = self.get_holding_threads(hold_jobs=hold_jobs)
+        ### The control module has to be known before the environment is packed
+        self.set_cluster_control_module("ClusterSubmission/ClusterControlLOCAL.sh")
         exec_script = self.pack_environment(env_vars, script)
         if not exec_script: return False
-        self.set_cluster_control_module("ClusterSubmission/ClusterControlLOCAL.sh")
         self.__threads += [
             LocalClusterThread(thread_name=self.subjob_name(sub_job),
                                subthread=-1,
                                thread_engine=self,
-                               dependencies=pending_threads + [th for th in direct_pending if th.thread_number() == i + 1],
-                               script_exec=exec_script)
+                               ### A single job waits for all tasks of a one-by-one dependency
+                               dependencies=pending_threads + direct_pending,
+                               script_exec=exec_script,
+                               n_cores=n_cores,
+                               mem=mem,
+                               run_time=run_time)
         ]
         return True
 
@@ -73,81 +388,168 @@ class LocalEngine(ClusterEngine):
         if array_size < 1:
             logging.error("<submit_array>: Please give a valid array size")
             return False
+        n_cores, mem = self.__claim(n_cores, mem, sub_job)
         pending_threads, direct_pending = self.get_holding_threads(hold_jobs=hold_jobs)
+        ### The control module has to be known before the environment is packed
+        self.set_cluster_control_module("ClusterSubmission/ClusterControlLOCAL.sh")
         exec_script = self.pack_environment(env_vars, script)
         if not exec_script: return False
-        self.set_cluster_control_module("ClusterSubmission/ClusterControlLOCAL.sh")
         for i in range(array_size):
             self.__threads += [
                 LocalClusterThread(thread_name=self.subjob_name(sub_job),
                                    subthread=i + 1 if array_size > 0 else -1,
                                    thread_engine=self,
                                    dependencies=pending_threads + [th for th in direct_pending if th.thread_number() == i + 1],
-                                   script_exec=exec_script)
+                                   script_exec=exec_script,
+                                   n_cores=n_cores,
+                                   mem=mem,
+                                   run_time=run_time)
             ]
         return True
 
-    def print_status(self, running):
+    def print_status(self):
         logging.info("<LocalEngine>: Executed %d/%d jobs at the moment %d jobs are running" %
-                     (self.__runned_jobs, self.n_threads(), len(running)))
-        for th in running:
-            if not th.isAlive(): return
+                     (self.__runned_jobs, self.n_threads(), len(self.__running)))
+        for th in self.__running:
+            if not th.is_alive(): continue
             th.print_log_file()
-            time.sleep(0.2)
 
-    def finish(self):
+    ### Called by the threads at the end of their execution
+    def task_finished(self, thread):
+        self.__finished.put(thread)
+
+    ### Opens the journal and builds the DAG once: Number of unfinished dependencies and successors of each job.
+    ### Jobs which already succeeded in an interrupted run are done
+    def prepare_run(self):
         CreateDirectory(self.log_dir(), False)
         CreateDirectory(self.tmp_dir(), False)
-        executable = [th for th in self.get_threads() if th.is_launchable()]
-        running = []
-        dead_jobs = []
-
-        cycles = 0
-        ### There are still some jobs to execute
-        while self.__runned_jobs + len(dead_jobs) < self.n_threads():
-            cycles += 1
-            running = [th for th in running if th.isAlive()]
-            if len(running) < self.max_running_per_array():
-                for th in executable:
-                    if len(running) >= self.max_running_per_array(): break
-                    th.start()
-                    self.__runned_jobs += 1
-                    running += [th]
-                executable = [th for th in self.get_threads() if th.is_launchable()]
-            else:
-                dead_jobs += [th for th in self.get_threads() if th.is_dead() or th.in_dead_chain() and not th in dead_jobs]
-            time.sleep(1)
-            if cycles % 120 == 0:
-                self.print_status(running)
+        ### A resumed run appends to the journal of the interrupted one
+        self.__journal.open(append=self.__resumed)
+        if not self.__resumed:
+            self.__journal.engine(self)
+            for th in self.get_threads():
+                self.__journal.pending(th)
+        logging.info("<LocalEngine>: The states of the jobs are written to %s. Resume an interrupted run with" %
+                     (self.__journal.journal_file()))
+        logging.info("<LocalEngine>:    python %s --resume %s" % (os.path.abspath(__file__).replace(".pyc", ".py"), self.__journal.journal_file()))
+        self.__successors = dict((th, []) for th in self.get_threads())
+        for th in self.get_threads():
+            dependencies = set(dep for dep in th.dependencies() if not dep.is_success())
+            self.__n_waiting[th] = len(dependencies)
+            for dep in dependencies:
+                self.__successors[dep] += [th]
+        ### Jobs are dispatched in the order of their submission
+        self.__ready = deque([th for th in self.get_threads() if self.__n_waiting[th] == 0 and not th.is_success()])
+        self.__n_done = len([th for th in self.get_threads() if th.is_success()])
+        return True
+
+    ### Jobs whose dependencies are all done in the order of their submission
+    def ready_jobs(self):
+        return self.__ready
+
+    def running_jobs(self):
+        return self.__running
+
+    def run_finished(self):
+        return self.__n_done >= self.n_threads()
 
-        while getRunningThreads(running) > 0:
-            time.sleep(0.5)
-            cycles += 1
-            if cycles % 120 == 0:
-                self.print_status(running)
+    def start_job(self, th):
+        th.start()
+        self.__journal.state(th, "running")
+        self.__runned_jobs += 1
+        self.__running.add(th)
 
-        ### Need to do something with the dead jobs. At least inform the user
+    ### Updates the DAG after a job has ended. Its successors are queued once all their dependencies are done
+    def job_finished(self, th):
+        th.join()
+        self.__running.discard(th)
+        self.__n_done += 1
+        self.__journal.state(th, "succeeded" if th.is_success() else "failed")
+        if th.is_success():
+            for succ in self.__successors[th]:
+                self.__n_waiting[succ] -= 1
+                if self.__n_waiting[succ] == 0 and not succ.in_dead_chain(): self.__ready.append(succ)
+            return
+        ### The job failed. None of the jobs depending on it can be executed
+        self.__dead_jobs += [th]
+        chain = deque(self.__successors[th])
+        while chain:
+            succ = chain.popleft()
+            if succ.in_dead_chain(): continue
+            succ.set_dead_chain()
+            self.__journal.state(succ, "skipped")
+            self.__n_done += 1
+            chain.extend(self.__successors[succ])
+
+    ### Number of jobs in each state
+    def run_status(self):
+        status = {"pending": 0, "running": len(self.__running), "succeeded": 0, "failed": len(self.__dead_jobs), "skipped": 0}
+        for th in self.get_threads():
+            if th.is_success(): status["succeeded"] += 1
+            elif th.in_dead_chain(): status["skipped"] += 1
+            elif not th.is_started() and th not in self.__running: status["pending"] += 1
+        return status
+
+    ### Informs the user about the jobs which could not be executed and closes the journal
+    def close_run(self):
+        if not self.run_finished():
+            logging.error("<LocalEngine>: %d jobs wait for dependencies which are never going to finish" %
+                          (self.n_threads() - self.__n_done))
+        for th in self.__dead_jobs:
+            logging.error("<LocalEngine>: %s failed. See %s" % (th.task_name(), th.log_file()))
+        n_skipped = len([th for th in self.get_threads() if th.in_dead_chain()])
+        if n_skipped:
+            logging.error("<LocalEngine>: %d jobs were not executed as their dependencies failed" % (n_skipped))
+        self.__journal.close()
+        return self.run_finished() and len(self.__dead_jobs) == 0 and n_skipped == 0
+
+    def finish(self):
+        if self.daemon():
+            from ClusterSubmission.LocalDaemon import submit_to_daemon
+            return submit_to_daemon(self.daemon(), self)
+        self.prepare_run()
+        last_status = time.time()
+        logging.info("<LocalEngine>: Run %d jobs on %d cores%s" %
+                     (self.n_threads() - self.__n_done, self.max_cores(), "" if self.max_memory() <= 0 else " with %d MB memory" %
+                      (self.max_memory())))
+        while not self.run_finished():
+            waiting = self.__resources.dispatch(pop_jobs(self.__ready), self.__running, self.start_job)
+            self.__ready.extendleft(reversed(waiting))
+            if not self.__running: break
+            try:
+                th = self.__finished.get(timeout=max(1., 120. - (time.time() - last_status)))
+            except queue.Empty:
+                th = None
+            if time.time() - last_status >= 120.:
+                self.print_status()
+                last_status = time.time()
+            if th is not None: self.job_finished(th)
+        return self.close_run()
 
 
 class LocalClusterThread(threading.Thread):
-    def __init__(self, thread_name="", subthread=-1, thread_engine=None, dependencies=[], script_exec=""):
+    def __init__(self, thread_name="", subthread=-1, thread_engine=None, dependencies=[], script_exec="", n_cores=1, mem=0, run_time=""):
         threading.Thread.__init__(self)
         self.__engine = thread_engine
         self.__name = thread_name
         self.__sub_num = subthread
+        self.__n_cores = n_cores
+        self.__mem = mem
+        self.__run_time_str = run_time
+        self.__run_time = TimeToSeconds(run_time) if run_time else -1
+        self.__start_time = -1
+        self.__end_time = -1
+        self.__exit_code = -1
 
         self.__isSuccess = False
         self.__started = False
+        self.__dead_chain = False
         self.__dependencies = [d for d in dependencies]
         self.__script_to_exe = script_exec
+        ### The temporary directory is created once the thread is started
         self.__tmp_dir = "%s/%s" % (thread_engine.tmp_dir(), id_generator(50))
-        CreateDirectory(self.__tmp_dir, True)
         self.__env_vars = [("LOCAL_TASK_ID", "%d" % (self.thread_number())), ("TMPDIR", self.__tmp_dir)]
 
-    def __del__(self):
-        logging.info("<LocalClusterThread>: Clean up %s" % (self.__tmp_dir))
-        os.system("rm -rf %s" % (self.__tmp_dir))
-
     def dependencies(self):
         return self.__dependencies
 
@@ -160,16 +562,63 @@ class LocalClusterThread(threading.Thread):
     def name(self):
         return self.__name
 
-    def is_launchable(self):
-        if self.isAlive() or self.__started or self.in_dead_chain(): return False
-        self.__dependencies = [th for th in self.__dependencies if th.isAlive() or not th.is_started() or not th.is_success()]
-        return len(self.__dependencies) == 0
+    def n_cores(self):
+        return self.__n_cores
+
+    ### Memory in MB
+    def memory(self):
+        return self.__mem
+
+    ### Expected run time in seconds or -1 if not given
+    def run_time(self):
+        return self.__run_time
+
+    ### Time when the job is expected to end. Infinite if the run time is not known
+    def expected_end(self):
+        if self.__run_time <= 0 or self.__start_time < 0: return float("inf")
+        return self.__start_time + self.__run_time
+
+    def start(self):
+        self.__start_time = time.time()
+        threading.Thread.start(self)
+
+    ### Exit code of the job script, -1 if it has not been executed
+    def exit_code(self):
+        return self.__exit_code
+
+    ### Run time of the job in seconds
+    def duration(self):
+        if self.__start_time < 0: return 0.
+        return (self.__end_time if self.__end_time > 0 else time.time()) - self.__start_time
+
+    ### Everything needed to rebuild the job from the journal
+    def spec(self):
+        return {
+            "name": self.name(),
+            "number": self.thread_number(),
+            "script": self.__script_to_exe,
+            "n_cores": self.n_cores(),
+            "mem": self.memory(),
+            "run_time": self.__run_time_str,
+            "dependencies": [th.task_name() for th in self.dependencies()],
+        }
+
+    ### The job succeeded in an interrupted run
+    def set_succeeded(self):
+        self.__isSuccess = True
+
+    def task_name(self):
+        return self.name() if self.thread_number() < 1 else "%s_%d" % (self.name(), self.thread_number())
 
     def in_dead_chain(self):
-        return len([th for th in self.__dependencies if th.is_dead() or th.in_dead_chain()]) > 0
+        return self.__dead_chain
+
+    ### One of the dependencies failed such that the job is never started
+    def set_dead_chain(self):
+        self.__dead_chain = True
 
     def is_dead(self):
-        return not self.isAlive() and self.is_started() and not self.is_success()
+        return not self.is_alive() and self.is_started() and not self.is_success()
 
     def is_success(self):
         return self.__isSuccess
@@ -180,11 +629,14 @@ class LocalClusterThread(threading.Thread):
     def run(self):
         self.__started = True
         ###################
-        self.__isSuccess = self._cmd_exec()
+        try:
+            self.__isSuccess = self._cmd_exec()
+        finally:
+            self.__end_time = time.time()
+            self.thread_engine().task_finished(self)
 
     def log_file(self):
-        return "%s/%s%s.log" % (self.thread_engine().log_dir(), self.name(), "" if self.thread_number() < 1 else "_%d" %
-                                (self.thread_number()))
+        return "%s/%s.log" % (self.thread_engine().log_dir(), self.task_name())
 
     def print_log_file(self, last_lines=10):
         if not os.path.exists(self.log_file()): return
@@ -202,13 +654,44 @@ class LocalClusterThread(threading.Thread):
         if not os.path.exists(self.__script_to_exe):
             logging.error("<_cmd_exec>: Could not find %s" % (self.__script_to_exe))
             return False
-        ### Threads can set their own enviroment variables without affecting the others
-        os.system("chmod 0700 %s" % (self.__script_to_exe))
         if self.thread_number() == -1:
             logging.info("<_cmd_exec> Start job %s" % (self.name()))
         else:
             logging.info("<_cmd_exec> Start task %d/%d in job %s" %
                          (self.thread_number(), self.thread_engine().get_array_size(task_name=self.name()), self.name()))
-        cmd_file = self.thread_engine().pack_environment(env_vars=self.__env_vars, script=self.__script_to_exe)
+        if not CreateDirectory(self.__tmp_dir, True): return False
+        ### The script packed by the engine is shared by all tasks of the array. The variables of the
+        ### task are passed to its process such that the threads do not affect each other
+        env = dict(self.thread_engine().job_environment())
+        env.update(self.__env_vars)
+        with open(self.log_file(), "w") as log:
+            self.__exit_code = subprocess.call([self.__script_to_exe], env=env, stdout=log, stderr=subprocess.STDOUT)
+        ### The scratch directory of failed jobs is kept for inspection
+        if self.__exit_code == 0: shutil.rmtree(self.__tmp_dir, ignore_errors=True)
+        return self.__exit_code == 0
+
+
+def getArgumentParser():
+    """Get arguments from command line."""
+    parser = argparse.ArgumentParser(prog='LocalEngine',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+                                     description="Resume a run of the local engine which has been interrupted")
+    parser.add_argument('--resume', help='Location of the journal of the run (<tmp_dir>/LocalJournal.txt)', required=True)
+    parser.add_argument("--maxCurrentJobs", help="Maximum number of running jobs. By default the one of the run", type=int, default=-1)
+    parser.add_argument("--localCores", help="Number of cores used. By default the one of the run", type=int, default=-1)
+    parser.add_argument("--localMemory", help="Memory in MB used. By default the one of the run", type=int, default=-1)
+    return parser
+
+
+def main():
+    options = getArgumentParser().parse_args()
+    engine = LocalEngine.resume(options.resume,
+                                maxCurrentJobs=options.maxCurrentJobs,
+                                maxCores=options.localCores,
+                                maxMemory=options.localMemory)
+    if not engine: exit(1)
+    exit(0 if engine.finish() else 1)
+
 
-        return os.system("python %s --Cmd %s > %s  2>&1" % (ResolvePath("ClusterSubmission/exeScript.py"), cmd_file, self.log_file())) == 0
+if __name__ == '__main__':
+    main()
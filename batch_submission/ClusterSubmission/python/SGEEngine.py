@@ -15,13 +15,15 @@ class SGEEngine(ClusterEngine):
         jobNames = []
         jobIDs = []
 
+        ### Arrays are cast into single jobs <jobName>_<task>. The names are matched exactly such that
+        ### a hold on task 1 does not match task 10
         if subJobs == []:
-            jobNames = [jobName]
+            jobNames = [jobName + "(_+[0-9]+)?"]
         else:
             jobNames = [jobName + "_%d" % i for i in subJobs] + [jobName + "__%d" % i for i in subJobs]
 
         for job in jobNames:
-            cmd = "qstat -f | grep -B 1 'Job_Name = {}' |  grep -o -E \"[0-9]{{8,}}\\..*.physics.ox.ac.uk\"".format(job)
+            cmd = "qstat -f | grep -B 1 -E 'Job_Name = {}$' |  grep -o -E \"[0-9]{{8,}}\\..*.physics.ox.ac.uk\"".format(job)
             try:
                 out = subprocess.check_output([cmd], shell=True)
             except:  # In case the grep commands fail, i.e. the job hasn't run or has finished running
@@ -97,11 +99,16 @@ class SGEEngine(ClusterEngine):
             return False
         ### Oxford cluster does not support arrays. Cast the jobs into single subjobs
         for job_n in range(array_size):
+            ### A one-by-one dependency (MyJobArray, -1) becomes a hold on the single subjob with the same task number
+            task_holds = [(H[0], [job_n + 1]) if isinstance(H, tuple) and (H[1] == -1 or
+                                                                            (isinstance(H[1], list) and -1 in H[1])) else H
+                          for H in hold_jobs]
             if not self.submit_job(script=script,
                                    sub_job="%s_%d" % (sub_job, job_n + 1),
                                    mem=mem,
                                    env_vars=env_vars + [("SGE_TASK_ID", job_n + 1)],
-                                   hold_jobs=hold_jobs,
-                                   run_time=run_time):
+                                   hold_jobs=task_holds,
+                                   run_time=run_time,
+                                   n_cores=n_cores):
                 return False
         return True
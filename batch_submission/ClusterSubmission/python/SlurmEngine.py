@@ -38,8 +38,8 @@ class SlurmEngine(ClusterEngine):
             return False
 
         if os.getenv("USER"): logging.info("Currently %d jobs are scheduled" % (get_num_scheduled(os.getenv("USER"))))
-        submit_cmd = "sbatch --output=%s/%s.log  --mail-type=FAIL --mail-user='%s' --mem=%iM %s %s --job-name='%s' %s %s" % (
-            self.log_dir(), sub_job if len(sub_job) > 0 else self.job_name(), self.mail_user(), mem, self.__partition(run_time),
+        submit_cmd = "sbatch --output=%s/%s.log  --mail-type=FAIL --mail-user='%s' --mem=%iM --cpus-per-task=%d %s %s --job-name='%s' %s %s" % (
+            self.log_dir(), sub_job if len(sub_job) > 0 else self.job_name(), self.mail_user(), mem, n_cores, self.__partition(run_time),
             self.__schedule_jobs(self.to_hold(hold_jobs), sub_job), self.subjob_name(sub_job),
             "" if len(self.excluded_nodes()) == 0 else "--exclude=" + ",".join(self.excluded_nodes()), exec_script)
 
@@ -66,16 +66,19 @@ class SlurmEngine(ClusterEngine):
                 time.sleep(1)
                 logging.info("Going to add %d job to the currently %d scheduled ones" %
                              (n_jobs_array, get_num_scheduled(os.getenv("USER"))))
-            submit_cmd = "sbatch --output=%s/%s_%%A_%%a.log --array=1-%i%s --mail-type=FAIL --mail-user='%s' --mem=%iM %s %s --job-name='%s' %s %s" % (
+            submit_cmd = "sbatch --output=%s/%s_%%A_%%a.log --array=1-%i%s --mail-type=FAIL --mail-user='%s' --mem=%iM --cpus-per-task=%d %s %s --job-name='%s' %s %s" % (
                 self.log_dir(),
                 sub_job if len(sub_job) > 0 else self.job_name(),
                 n_jobs_array,
                 "" if n_jobs_array < self.max_running_per_array() else "%%%d" % (self.max_running_per_array()),
                 self.mail_user(),
                 mem,
+                n_cores,
                 self.__partition(run_time),
                 ### Shedule the job after the hold jobs and also after previous array blocks
-                self.__schedule_jobs(self.to_hold(hold_jobs) + ([] if ArrayStart == 0 else [self.subjob_name(sub_job)]), sub_job),
+                self.__schedule_jobs(self.to_hold(hold_jobs) + ([] if ArrayStart == 0 else [self.subjob_name(sub_job)]),
+                                     sub_job,
+                                     block=ArrayStart // self.max_array_size()),
                 self.subjob_name(sub_job),
                 "" if len(self.excluded_nodes()) == 0 else "--exclude=" + ",".join(self.excluded_nodes()),
                 exec_script,
@@ -176,7 +179,9 @@ class SlurmEngine(ClusterEngine):
         return Ids
 
     ### Schedule the job after the following jobs succeeded
-    def __schedule_jobs(self, HoldJobs, sub_job="", RequireOk=True):
+    ###     --- block: Index of the array block to be submitted. Arrays exceeding the maximum array size
+    ###                are split into blocks and task i of block b corresponds to task i of block b of the array it depends on
+    def __schedule_jobs(self, HoldJobs, sub_job="", RequireOk=True, block=0):
         prettyPrint("", "#############################################################################")
         if len(sub_job) == 0: prettyPrint("Submit cluster job:", self.job_name())
         else: prettyPrint("Submit job: ", "%s in %s" % (sub_job, self.job_name()))
@@ -184,7 +189,7 @@ class SlurmEngine(ClusterEngine):
         info_written = False
 
         to_hold = []
-        dependency_str = ""
+        corr_hold = []
         for H in HoldJobs:
             ids = self.__slurm_id(H)
             if len(ids) > 0:
@@ -198,13 +203,17 @@ class SlurmEngine(ClusterEngine):
             ### Usual dependency on entire jobs or certain subjobs in an array
             if isinstance(H, str) or isinstance(H[1], list): to_hold += ids
             elif isinstance(H[1], int) and H[1] == -1:
-                dependency_str += " --dependency=aftercorr:%s " % (":".join(ids))
+                ### The blocks of the array are submitted in order
+                array_ids = sorted(ids, key=int)
+                if len(array_ids) > block: corr_hold += [array_ids[block]]
+                elif len(ids) > 0: logging.warning("<schedule_jobs> Failed to establish the 1 by 1 dependency on %s." % (H[0]))
             else:
                 logging.error("<schedule_jobs> Invalid object ")
                 logging.error(H)
                 exit(1)
-        if len(to_hold) == 0: return ""
-        if len(dependency_str) > 0:
-            return dependency_str
-
-        return " --dependency=" + ("afterok:" if RequireOk else "after:") + ":".join(to_hold)
+        ### Several dependency types are joined by commas, i.e. all of them must be satisfied
+        dependencies = []
+        if len(to_hold) > 0: dependencies += [("afterok:" if RequireOk else "after:") + ":".join(to_hold)]
+        if len(corr_hold) > 0: dependencies += ["aftercorr:" + ":".join(corr_hold)]
+        if len(dependencies) == 0: return ""
+        return " --dependency=" + ",".join(dependencies)
@@ -1,5 +1,5 @@
 #! /usr/bin/env python
-from ClusterSubmission.Utils import ReadListFromFile, setup_engine, setupBatchSubmitArgParser
+from ClusterSubmission.Utils import ReadListFromFile, WriteListIndex, setup_engine, setupBatchSubmitArgParser
 import argparse
 import logging
 logging.basicConfig(format='%(levelname)s : %(message)s', level=logging.INFO)
@@ -23,6 +23,7 @@ def main():
     if not list_of_cmds:
         logging.error("Please give a valid file with list of commands to execute")
         exit(1)
+    WriteListIndex(list_of_cmds)
 
     if not submit_engine.submit_build_job():
         logging.error("Submission failed")
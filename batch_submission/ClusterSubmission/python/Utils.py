@@ -1,5 +1,5 @@
 #! /usr/bin/env python
-import math, os, sys, time, threading, string, random, argparse, logging, subprocess
+import math, os, sys, time, threading, string, random, argparse, logging, subprocess, struct, shutil
 logging.basicConfig(format='%(levelname)s : %(message)s', level=logging.INFO)
 _has_commands = True
 try:
@@ -115,6 +115,17 @@ def setupBatchSubmitArgParser():
                         choices=[item for item in os.listdir(SINGULARITY_DIR)
                                  if item.startswith("x86_64")] if os.path.exists(SINGULARITY_DIR) else [],
                         default="x86_64-centos6.img")
+    parser.add_argument("--localCores",
+                        help="Number of cores used by the LOCAL engine. By default all cores of the machine",
+                        type=int,
+                        default=-1)
+    parser.add_argument("--localMemory",
+                        help="Memory in MB used by the LOCAL engine. By default the physical memory of the machine",
+                        type=int,
+                        default=-1)
+    parser.add_argument("--localDaemon",
+                        help="Socket of a daemon started with ClusterSubmission/python/LocalDaemon.py running the jobs of the LOCAL engine",
+                        default="")
     parser.add_argument("--exclude_nodes", help="Specify nodes to be excluded from the submission", default=["zt02", "zt01"], nargs="+")
     return parser
 
@@ -191,9 +202,12 @@ def setup_engine(RunOptions):
     elif RunOptions.engine == "LOCAL":
         return LocalEngine(jobName=RunOptions.jobName,
                            baseDir=RunOptions.BaseFolder,
-                           maxCurrentJobs=min(max(1, RunOptions.maxCurrentJobs), 16),
+                           maxCurrentJobs=RunOptions.maxCurrentJobs,
                            singularity_image=RunOptions.SingularityImage,
-                           run_in_container=RunOptions.ContainerShipping)
+                           run_in_container=RunOptions.ContainerShipping,
+                           maxCores=RunOptions.localCores,
+                           maxMemory=RunOptions.localMemory,
+                           daemon=RunOptions.localDaemon)
 
     ### seemingly impossible to arrive here - catch the error in any case
     logging.error("<setup_engine> : How could you parse %s? It's not part of the choices." % (RunOptions.engine))
@@ -220,11 +234,18 @@ class CmdLineThread(threading.Thread):
         return (self.__statusCode == 0)
 
 
+###    Format of the line-offset index: one unsigned 64 bit little-endian byte offset per line
+LIST_INDEX_FORMAT = "<Q"
+LIST_INDEX_SIZE = struct.calcsize(LIST_INDEX_FORMAT)
+
+
 ###    Writes a python list to an output file
 ###    Directories are resolved and created on the fly
 ###         --Files: List containing strings representing each a line in the final file
 ###         --OutLocation:  Final destination of the file
-def WriteList(Files, OutLocation):
+###         --index: Write the line-offset index <OutLocation>.idx next to the file such that
+###                  the batch jobs can seek directly to their line (see GetListEntry)
+def WriteList(Files, OutLocation, index=False):
     """Write list of files to output location. If output location does not exist, create directory."""
     if OutLocation.find("/") != -1:
         CreateDirectory(OutLocation[:OutLocation.rfind("/")], CleanUpOld=False)
@@ -235,16 +256,65 @@ def WriteList(Files, OutLocation):
         for F in Files:
             Out.write(F + "\n")
         Out.close()
+    if index:
+        WriteListIndex(OutLocation)
+    elif os.path.exists(ListIndexLocation(OutLocation)):
+        ### A stale index must not survive the list
+        os.remove(ListIndexLocation(OutLocation))
     return OutLocation
 
 
+def ListIndexLocation(List):
+    return List + ".idx"
+
+
+###    Writes the line-offset index of an existing list file. Line N starts at the
+###    byte offset stored at position (N-1) * LIST_INDEX_SIZE of the index
+###    The index is read by get_list_entry of scripts/ListIndex.sh
+###         --- List: Path to the list file
+###         --- start: Byte offset from which the lines are indexed. The offsets are appended to the existing index
+def WriteListIndex(List, start=0):
+    offsets = []
+    with open(List, "rb") as In:
+        In.seek(start)
+        offset = start
+        for line in In:
+            offsets.append(offset)
+            offset += len(line)
+    with open(ListIndexLocation(List), "ab" if start > 0 else "wb") as Out:
+        Out.write(struct.pack("<%dQ" % (len(offsets)), *offsets))
+    return ListIndexLocation(List)
+
+
+###    Returns the N-th line (counting from 1) of a list file without the trailing new line.
+###    The line-offset index is used if present, otherwise the file is read up to the line
+###         --- List: Path to the list file
+###         --- N: Line number
+def GetListEntry(List, N):
+    index = ListIndexLocation(List)
+    if os.path.exists(index) and os.path.getmtime(index) >= os.path.getmtime(List):
+        with open(index, "rb") as Idx:
+            Idx.seek((N - 1) * LIST_INDEX_SIZE)
+            entry = Idx.read(LIST_INDEX_SIZE)
+        if len(entry) == LIST_INDEX_SIZE:
+            with open(List, "rb") as In:
+                In.seek(struct.unpack(LIST_INDEX_FORMAT, entry)[0])
+                return In.readline().decode("utf-8").rstrip("\n")
+    with open(List) as In:
+        for i, line in enumerate(In, 1):
+            if i == N:
+                return line.rstrip("\n")
+    return None
+
+
 ###    If a txt file exists the Files are appended to the existing one without
 ###    reading the full file content before. In case that the list does not exist WriteList
-###    is invoked
+###    is invoked. An existing line-offset index is extended
 ###         --- Files: List containing strings representing each a line in the final file
 ###         --- OutLocation:  Final destination of the file
 def AppendToList(Files, OutLocation):
     if not os.path.isfile(OutLocation): return WriteList(Files, OutLocation)
+    start = os.path.getsize(OutLocation)
     with open(OutLocation, "a") as Out:
         if Out is None:
             logging.error("Could not write file " + OutLocation)
@@ -252,6 +322,9 @@ def AppendToList(Files, OutLocation):
         for F in Files:
             Out.write(F + "\n")
         Out.close()
+    ### Keep the line-offset index in sync
+    if os.path.exists(ListIndexLocation(OutLocation)):
+        WriteListIndex(OutLocation, start)
     return OutLocation
 
 
@@ -334,11 +407,16 @@ def CreateDirectory(Path, CleanUpOld=True):
     if os.path.exists(Path) and CleanUpOld:
         logging.info("Found old copy of the folder " + Path)
         logging.info("Will delete it.")
-        os.system("rm -rf " + Path)
+        if os.path.isdir(Path) and not os.path.islink(Path): shutil.rmtree(Path, ignore_errors=True)
+        else: os.remove(Path)
     if not os.path.exists(Path):
         logging.info("Create directory " + Path)
-    os.system("mkdir -p " + Path)
-    return os.path.exists(Path)
+        try:
+            os.makedirs(Path)
+        except OSError:
+            ### Another process may have created it in the meantime
+            pass
+    return os.path.isdir(Path)
 
 
 ###  Reads in a txt file and converts its content
@@ -468,7 +546,7 @@ def ExecuteCommands(ListOfCmds, MaxCurrent=16, MaxExec=-1, verbose=True, sleep_t
 def getRunningThreads(Threads):
     Running = 0
     for Th in Threads:
-        if Th.isAlive():
+        if Th.is_alive():
             Running += 1
     return Running
 
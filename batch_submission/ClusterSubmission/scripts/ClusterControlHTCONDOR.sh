@@ -10,4 +10,8 @@ function send_to_failure(){
     echo "WARNING: Failure send not yet defined for CONDOR"
     exit 1   
 }
+### get_list_entry is shared by all modules
+if [ -f "${ListIndexModule}" ]; then
+    source ${ListIndexModule}
+fi
 echo "Loaded the Cluster Control module for HTCondor clusters"
@@ -9,4 +9,8 @@ function get_task_ID() {
 function send_to_failure(){   
     exit 1   
 }
+### get_list_entry is shared by all modules
+if [ -f "${ListIndexModule}" ]; then
+    source ${ListIndexModule}
+fi
 echo "Loaded the Cluster Control module for LOCAL multi-threading"
@@ -20,4 +20,8 @@ function send_to_failure(){
     fi 
     exit 1   
 }
+### get_list_entry is shared by all modules
+if [ -f "${ListIndexModule}" ]; then
+    source ${ListIndexModule}
+fi
 echo "Loaded the Cluster Control module for SLURM clusters"
@@ -0,0 +1,15 @@
+#!/bin/bash
+function get_list_entry() {
+    ### Prints line $2 of the list $1. The byte offset of the line is read from the
+    ### index $1.idx written by WriteListIndex, such that the lookup does not depend on the list length
+    local list="$1"
+    local line="$2"
+    if [ -f "${list}.idx" ] && [ ! "${list}" -nt "${list}.idx" ]; then
+        local offset=`od -A n -t u8 -j $(( (line - 1) * 8 )) -N 8 "${list}.idx" | tr -d ' '`
+        if [ -n "${offset}" ]; then
+            tail -c +$((offset + 1)) "${list}" | head -n 1
+            return 0
+        fi
+    fi
+    sed -n "${line}{p;q;}" "${list}"
+}
@@ -30,8 +30,8 @@ ID=$(get_task_ID)
 echo "Got task ID ${ID}"
 MergeList=""
 if [ -f "${JobConfigList}" ];then
-    echo "MergeList=`sed -n \"${ID}{p;q;}\" ${JobConfigList}`"
-    MergeList=`sed -n "${ID}{p;q;}" ${JobConfigList}`
+    echo "MergeList=`get_list_entry ${JobConfigList} ${ID}`"
+    MergeList=`get_list_entry ${JobConfigList} ${ID}`
 else
     echo "ERROR: List ${JobConfigList} does not exist"
     send_to_failure
@@ -61,8 +61,8 @@ while read -r M; do
 done < "${MergeList}"
 
 if [ -f "${OutFileList}" ]; then
-    echo "OutFile=`sed -n \"${ID}{p;q;}\" ${OutFileList}`"
-    OutFile=`sed -n "${ID}{p;q;}" ${OutFileList}`
+    echo "OutFile=`get_list_entry ${OutFileList} ${ID}`"
+    OutFile=`get_list_entry ${OutFileList} ${ID}`
 fi
 if [ -f "${OutFile}" ];then
     echo "Remove the old ROOT file"
@@ -13,8 +13,8 @@ echo "                                 Batch JOB ${Name} - ${ID}"
 echo "###############################################################################################"
 Cmd=""
 if [ -f "${ListOfCmds}" ];then
-    echo "Cmd=`sed -n \"${ID}{p;q;}\" ${ListOfCmds}`"
-    Cmd=`sed -n "${ID}{p;q;}" ${ListOfCmds}`
+    echo "Cmd=`get_list_entry ${ListOfCmds} ${ID}`"
+    Cmd=`get_list_entry ${ListOfCmds} ${ID}`
 else
     echo "ERROR: No list of commands"
     send_to_failure 
@@ -22,6 +22,7 @@ if [ -f "${CONTAINER_SHIPING_FILE}" ]; then
     echo "export SLURM_JOB_ID=${SLURM_JOB_ID}"               >> ${TMPDIR}/singularity.sh
     echo "export TMPDIR=${TMPDIR}"                           >> ${TMPDIR}/singularity.sh
     echo "export IdOffSet=${IdOffSet}"                       >> ${TMPDIR}/singularity.sh    
+    echo "export LOCAL_TASK_ID=${LOCAL_TASK_ID}"             >> ${TMPDIR}/singularity.sh
     echo "source ${CONTAINER_SCRIPT}"                        >> ${TMPDIR}/singularity.sh   
     cat ${TMPDIR}/singularity.sh 
     echo "\" > ${TMPDIR}/singularity.sh"
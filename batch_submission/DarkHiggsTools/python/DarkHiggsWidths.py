@@ -0,0 +1,99 @@
+#! /usr/bin/env python
+"""Tree-level decay widths of the Z' (PDG 55) and the dark Higgs hs (PDG 54) in the DarkHiggs2MDM model.
+
+The couplings follow the conventions of the UFO model: gq is the vector coupling of the Z' to quarks,
+gx the axial coupling to the Majorana dark matter n1 and th the mixing angle between hs and the SM Higgs.
+The Z' mass is generated by the dark Higgs vev w = mzp / (2 gx), which fixes the dark matter Yukawa
+coupling y = 2 sqrt(2) gx mdm / mzp.
+"""
+import math
+
+# SM inputs as in the default parameter card of the model
+VEV = 246.22
+MH = 125.0
+MW = 80.4
+MZ = 91.1876
+QUARK_MASSES = [0.0, 0.0, 0.0, 0.0, 4.7, 173.0]
+LEPTON_MASSES = [0.0, 0.0, 1.777]
+
+
+def _beta(m_daughter, m_mother):
+    x = 1.0 - 4.0 * (m_daughter / m_mother) ** 2
+    return math.sqrt(x) if x > 0.0 else 0.0
+
+
+def width_zp_qq(mzp, gq):
+    width = 0.0
+    for mq in QUARK_MASSES:
+        if 2.0 * mq >= mzp:
+            continue
+        # vector coupling, summed over colours
+        width += gq ** 2 * mzp / (4.0 * math.pi) * (1.0 + 2.0 * (mq / mzp) ** 2) * _beta(mq, mzp)
+    return width
+
+
+def width_zp_dm(mzp, mdm, gx):
+    if 2.0 * mdm >= mzp:
+        return 0.0
+    # axial coupling gx / 2 to a Majorana fermion
+    return gx ** 2 * mzp / (24.0 * math.pi) * _beta(mdm, mzp) ** 3
+
+
+def width_zp(mzp, mdm, gq, gx):
+    """Total width of the Z'."""
+    return width_zp_qq(mzp, gq) + width_zp_dm(mzp, mdm, gx)
+
+
+def width_hs_ff(mhs, th):
+    width = 0.0
+    for n_colours, masses in [(3.0, QUARK_MASSES), (1.0, LEPTON_MASSES)]:
+        for mf in masses:
+            if mf == 0.0 or 2.0 * mf >= mhs:
+                continue
+            # SM Higgs-like Yukawa couplings suppressed by the mixing angle
+            width += math.sin(th) ** 2 * n_colours * mhs * mf ** 2 / (8.0 * math.pi * VEV ** 2) * _beta(mf, mhs) ** 3
+    return width
+
+
+def width_hs_dm(mhs, mzp, mdm, gx, th):
+    if 2.0 * mdm >= mhs:
+        return 0.0
+    return math.cos(th) ** 2 * gx ** 2 * mdm ** 2 * mhs / (4.0 * math.pi * mzp ** 2) * _beta(mdm, mhs) ** 3
+
+
+def _width_vv(mhs, mv, vev, symmetry):
+    if 2.0 * mv >= mhs:
+        return 0.0
+    x = (mv / mhs) ** 2
+    return mhs ** 3 / (16.0 * math.pi * symmetry * vev ** 2) * _beta(mv, mhs) * (1.0 - 4.0 * x + 12.0 * x ** 2)
+
+
+def width_hs_vv(mhs, mzp, gx, th):
+    # W and Z via the SM Higgs admixture, the Z' via the dark Higgs vev
+    width = math.sin(th) ** 2 * (_width_vv(mhs, MW, VEV, 1.0) + _width_vv(mhs, MZ, VEV, 2.0))
+    width += math.cos(th) ** 2 * _width_vv(mhs, mzp, mzp / (2.0 * gx), 2.0)
+    return width
+
+
+def width_hs_hh(mhs, mzp, gx, th):
+    if 2.0 * MH >= mhs:
+        return 0.0
+    # trilinear hs-h-h coupling of the scalar potential for the mixing angle th
+    vev_dark = mzp / (2.0 * gx)
+    coupling = (
+        math.sin(2.0 * th)
+        / (2.0 * VEV * vev_dark)
+        * (MH ** 2 + mhs ** 2 / 2.0)
+        * (VEV * math.sin(th) + vev_dark * math.cos(th))
+    )
+    return coupling ** 2 / (8.0 * math.pi * mhs) * _beta(MH, mhs)
+
+
+def width_hs(mhs, mzp, mdm, gx, th):
+    """Total width of the dark Higgs. Loop-induced and off-shell decays are neglected."""
+    return (
+        width_hs_ff(mhs, th)
+        + width_hs_dm(mhs, mzp, mdm, gx, th)
+        + width_hs_vv(mhs, mzp, gx, th)
+        + width_hs_hh(mhs, mzp, gx, th)
+    )
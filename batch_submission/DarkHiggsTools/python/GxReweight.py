@@ -0,0 +1,155 @@
+#! /usr/bin/env python
+"""Analytic reweighting of monoSbb LHE events to different values of the dark matter coupling gx.
+
+For the s-channel process p p > zp > n1 n1 hs (j), (hs > b b~) every diagram carries two powers of gx,
+so the squared matrix element scales as gx^4 apart from the Breit-Wigner propagators of the Z' and hs,
+whose widths depend on gx. All gx points are evaluated at once as array operations over a batch of events.
+"""
+from DarkHiggsTools.DarkHiggsWidths import width_zp, width_hs
+from DarkHiggsTools.LHEReader import LHEReader
+import argparse
+import logging
+import numpy as np
+
+logging.basicConfig(format="%(levelname)s : %(message)s", level=logging.INFO)
+
+PDG_HS = 54
+PDG_ZP = 55
+PDG_DM = 1000022
+
+
+def getArguments():
+    parser = argparse.ArgumentParser(
+        description="Compute the gx reweighting weights of monoSbb LHE files analytically "
+        "and validate them against the MadGraph reweight module."
+    )
+    parser.add_argument("--lhe", help="LHE files (plain or gzipped)", nargs="+", required=True)
+    parser.add_argument(
+        "--points",
+        help="gx values to reweight to",
+        nargs="+",
+        type=float,
+        default=[round(0.1 * i, 1) for i in range(1, 36)],
+    )
+    parser.add_argument(
+        "--validate",
+        help="gx values to compare with the MadGraph weights rwgt_gx_* stored in the LHE files",
+        nargs="+",
+        type=float,
+        default=[],
+    )
+    parser.add_argument("--output", help="Store the weight matrix in a .npy file", default="")
+    parser.add_argument("--batchSize", help="Number of events per batch", type=int, default=10000)
+    return parser
+
+
+def rwgt_name(gx):
+    return "rwgt_gx_{gx}".format(gx=str(gx).replace(".", "p"))
+
+
+class GxReweighter(object):
+    """Weights relative to the nominal sample generated at (mzp, mdm, mhs, gq, gx, th)."""
+
+    def __init__(self, mzp, mdm, mhs, gq, gx, th, points):
+        self.__mzp = mzp
+        self.__mhs = mhs
+        self.__gx = gx
+        self.__points = np.array(points, dtype=float)
+
+        self.__coupling = (self.__points / gx) ** 4
+        self.__width_zp = width_zp(mzp, mdm, gq, gx)
+        self.__width_hs = width_hs(mhs, mzp, mdm, gx, th)
+        # widths are recomputed for every gx point
+        self.__widths_zp = np.array([width_zp(mzp, mdm, gq, g) for g in self.__points])
+        self.__widths_hs = np.array([width_hs(mhs, mzp, mdm, g, th) for g in self.__points])
+
+    def points(self):
+        return self.__points
+
+    @staticmethod
+    def _breit_wigner_ratio(m, mass, width_nominal, widths):
+        off_shell = (m[:, np.newaxis] ** 2 - mass ** 2) ** 2
+        return (off_shell + (mass * width_nominal) ** 2) / (off_shell + (mass * widths[np.newaxis, :]) ** 2)
+
+    def ratios(self, m_zp, m_hs):
+        """Returns the (n_events, n_points) matrix of weight ratios."""
+        return (
+            self.__coupling[np.newaxis, :]
+            * self._breit_wigner_ratio(m_zp, self.__mzp, self.__width_zp, self.__widths_zp)
+            * self._breit_wigner_ratio(m_hs, self.__mhs, self.__width_hs, self.__widths_hs)
+        )
+
+    def weights(self, batch):
+        """Returns the (n_events, n_points) matrix of weights of a LHEBatch."""
+        # the Z' momentum is reconstructed from its decay products, the hs is kept as intermediate particle
+        m_zp = batch.invariant_mass([PDG_DM, PDG_HS])
+        m_hs = batch.invariant_mass([PDG_HS])
+        return batch.weight()[:, np.newaxis] * self.ratios(m_zp, m_hs)
+
+
+def reweighter_from_lhe(reader, points):
+    """Reweighter to the given gx points for the parameters stored in the header of the LHE file."""
+    return GxReweighter(
+        mzp=reader.parameter("mass", PDG_ZP),
+        mdm=reader.parameter("mass", PDG_DM),
+        mhs=reader.parameter("mass", PDG_HS),
+        gq=reader.parameter("frblock", 1),
+        gx=reader.parameter("frblock", 2),
+        th=reader.parameter("frblock", 3),
+        points=points,
+    )
+
+
+def main():
+    options = getArguments().parse_args()
+    points = sorted(set(options.points + options.validate))
+    validate = [points.index(gx) for gx in options.validate]
+
+    all_weights = []
+    # sum of the analytic and MadGraph weights, sum of the absolute and squared relative per-event deviation
+    closure = np.zeros((len(validate), 4))
+    max_dev = np.zeros(len(validate))
+    n_validated = np.zeros(len(validate))
+    for lhe in options.lhe:
+        reader = LHEReader(lhe, batch_size=options.batchSize)
+        reweighter = reweighter_from_lhe(reader, points)
+        logging.info("Reweighting {f}".format(f=lhe))
+        for batch in reader:
+            weights = reweighter.weights(batch)
+            if options.output:
+                all_weights += [weights]
+            for i, j in enumerate(validate):
+                if rwgt_name(points[j]) not in batch.rwgt_names():
+                    continue
+                mg_weights = batch.rwgt(rwgt_name(points[j]))
+                deviation = np.abs(weights[:, j] / np.where(mg_weights != 0.0, mg_weights, np.nan) - 1.0)
+                deviation = deviation[np.isfinite(deviation)]
+                closure[i] += [weights[:, j].sum(), mg_weights.sum(), deviation.sum(), (deviation ** 2).sum()]
+                max_dev[i] = max(max_dev[i], deviation.max() if len(deviation) else 0.0)
+                n_validated[i] += len(deviation)
+
+    if options.output:
+        np.save(options.output, np.concatenate(all_weights) if all_weights else np.zeros((0, len(points))))
+        logging.info("Stored the weights for gx = {p} in {o}".format(p=points, o=options.output))
+
+    if len(validate) == 0:
+        return
+    logging.info("Closure between the analytic and the MadGraph weights:")
+    logging.info("   {0:>6} {1:>12} {2:>12} {3:>10} {4:>10}".format("gx", "sum ratio", "mean |dev|", "rms dev", "max |dev|"))
+    for i, j in enumerate(validate):
+        if n_validated[i] == 0:
+            logging.warning("   {0:>6} no MadGraph weight {1} found".format(points[j], rwgt_name(points[j])))
+            continue
+        logging.info(
+            "   {0:>6} {1:>12.4f} {2:>12.4f} {3:>10.4f} {4:>10.4f}".format(
+                points[j],
+                closure[i][0] / closure[i][1],
+                closure[i][2] / n_validated[i],
+                np.sqrt(closure[i][3] / n_validated[i]),
+                max_dev[i],
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
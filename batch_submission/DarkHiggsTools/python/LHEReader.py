@@ -0,0 +1,217 @@
+#! /usr/bin/env python
+"""Streaming reader of LHE (v3) files yielding columnar NumPy batches.
+
+The file is read line by line without building a DOM, so the memory usage is bounded by the batch size
+regardless of the size of the file. Gzipped files are decompressed on the fly.
+"""
+import gzip
+import io
+import re
+import numpy as np
+
+# columns of a particle line: id status mother1 mother2 colour1 colour2 px py pz e m lifetime spin
+N_PARTICLE_FIELDS = 13
+WEIGHT_ID = re.compile(r"""<weight\s+id\s*=\s*['"]([^'"]+)['"]""")
+WGT = re.compile(r"""<wgt\s+id\s*=\s*['"]([^'"]+)['"]\s*>\s*([^<\s]+)\s*</wgt>""")
+
+
+class LHEBatch(object):
+    """Fixed-size batch of events. Particle arrays have the shape (n_events, max_particles), padded with zeros."""
+
+    def __init__(self, event_info, particles, n_particles, rwgt, rwgt_names):
+        self.__event_info = event_info
+        self.__particles = particles
+        self.__n_particles = n_particles
+        self.__rwgt = rwgt
+        self.__rwgt_names = rwgt_names
+
+    def size(self):
+        return len(self.__n_particles)
+
+    def n_particles(self):
+        return self.__n_particles
+
+    def process_id(self):
+        return self.__event_info[:, 1].astype(np.int32)
+
+    def weight(self):
+        return self.__event_info[:, 2]
+
+    def scale(self):
+        return self.__event_info[:, 3]
+
+    def alpha_qed(self):
+        return self.__event_info[:, 4]
+
+    def alpha_qcd(self):
+        return self.__event_info[:, 5]
+
+    def pdgid(self):
+        return self.__particles[:, :, 0].astype(np.int32)
+
+    def status(self):
+        return self.__particles[:, :, 1].astype(np.int32)
+
+    def mother1(self):
+        return self.__particles[:, :, 2].astype(np.int32)
+
+    def mother2(self):
+        return self.__particles[:, :, 3].astype(np.int32)
+
+    def px(self):
+        return self.__particles[:, :, 6]
+
+    def py(self):
+        return self.__particles[:, :, 7]
+
+    def pz(self):
+        return self.__particles[:, :, 8]
+
+    def e(self):
+        return self.__particles[:, :, 9]
+
+    def m(self):
+        return self.__particles[:, :, 10]
+
+    def rwgt_names(self):
+        return self.__rwgt_names
+
+    ### Matrix (n_events, n_weights) of the <rwgt> weights, ordered as rwgt_names(). Missing weights are NaN
+    def rwgt_matrix(self):
+        return self.__rwgt
+
+    def rwgt(self, name):
+        return self.__rwgt[:, self.__rwgt_names.index(name)]
+
+    ### Four-momentum sum (n_events, 4) of the particles whose |pdgid| is in pdgids
+    def sum_momentum(self, pdgids, status=None):
+        mask = np.isin(np.abs(self.pdgid()), pdgids)
+        if status is not None:
+            mask &= self.status() == status
+        mask = mask.astype(np.float64)
+        return np.stack([(self.__particles[:, :, i] * mask).sum(axis=1) for i in range(6, 10)], axis=1)
+
+    def invariant_mass(self, pdgids, status=None):
+        p = self.sum_momentum(pdgids, status)
+        return np.sqrt(np.maximum(p[:, 3] ** 2 - p[:, 0] ** 2 - p[:, 1] ** 2 - p[:, 2] ** 2, 0.0))
+
+    def pt(self, pdgids, status=None):
+        p = self.sum_momentum(pdgids, status)
+        return np.hypot(p[:, 0], p[:, 1])
+
+
+class LHEReader(object):
+    """Iterating over the reader yields LHEBatch objects of batch_size events (the last one may be smaller)."""
+
+    def __init__(self, path, batch_size=10000, buffer_size=1 << 20):
+        self.__path = path
+        self.__batch_size = batch_size
+        self.__buffer_size = buffer_size
+        self.__header = []
+        self.__parameters = {}
+        self.__rwgt_names = []
+        self.__read_header()
+
+    def path(self):
+        return self.__path
+
+    def _open(self):
+        raw = io.open(self.__path, "rb", buffering=self.__buffer_size)
+        if self.__path.endswith(".gz"):
+            raw = io.BufferedReader(gzip.GzipFile(fileobj=raw), buffer_size=self.__buffer_size)
+        return io.TextIOWrapper(raw)
+
+    def __read_header(self):
+        block = ""
+        with self._open() as lhe:
+            for line in lhe:
+                tag = line.strip()
+                if tag.startswith("<event"):
+                    break
+                self.__header += [line]
+                match = WEIGHT_ID.search(tag)
+                if match:
+                    self.__rwgt_names += [match.group(1)]
+                fields = tag.split("#")[0].split()
+                if len(fields) == 0:
+                    continue
+                if fields[0].lower() == "block":
+                    block = fields[1].lower()
+                elif fields[0].lower() == "decay" or fields[0].startswith("<"):
+                    block = ""
+                elif block and len(fields) == 2:
+                    try:
+                        self.__parameters[(block, int(fields[0]))] = float(fields[1])
+                    except ValueError:
+                        pass
+
+    def header(self):
+        return self.__header
+
+    ### SLHA parameters of the header keyed by (block name in lower case, index)
+    def parameters(self):
+        return self.__parameters
+
+    def parameter(self, block, index):
+        return self.__parameters[(block.lower(), index)]
+
+    ### Names of the event weights announced in <initrwgt>, i.e. reweight, PDF and scale variations
+    def rwgt_names(self):
+        return self.__rwgt_names
+
+    def __make_batch(self, event_info, tokens, n_particles, rwgt):
+        n_events = len(n_particles)
+        n_particles = np.array(n_particles, dtype=np.int32)
+        flat = np.array(tokens, dtype=np.float64).reshape(-1, N_PARTICLE_FIELDS)
+        particles = np.zeros((n_events, n_particles.max() if n_events else 0, N_PARTICLE_FIELDS))
+        rows = np.repeat(np.arange(n_events), n_particles)
+        cols = np.arange(len(flat)) - np.repeat(np.cumsum(n_particles) - n_particles, n_particles)
+        particles[rows, cols] = flat
+
+        weights = np.full((n_events, len(self.__rwgt_names)), np.nan)
+        columns = dict((name, i) for i, name in enumerate(self.__rwgt_names))
+        for i, event_rwgt in enumerate(rwgt):
+            for name, value in event_rwgt:
+                if name not in columns:
+                    # weights not announced in the header are appended
+                    columns[name] = len(self.__rwgt_names)
+                    self.__rwgt_names += [name]
+                    weights = np.concatenate([weights, np.full((n_events, 1), np.nan)], axis=1)
+                weights[i, columns[name]] = float(value)
+        return LHEBatch(
+            np.array(event_info, dtype=np.float64).reshape(-1, 6),
+            particles,
+            n_particles,
+            weights,
+            list(self.__rwgt_names),
+        )
+
+    def __iter__(self):
+        event_info, tokens, n_particles, rwgt = [], [], [], []
+        in_event = False
+        with self._open() as lhe:
+            for line in lhe:
+                tag = line.strip()
+                if not in_event:
+                    if tag.startswith("<event"):
+                        in_event = True
+                        to_read = -1
+                    continue
+                if to_read < 0:
+                    fields = tag.split()
+                    event_info += fields[:6]
+                    to_read = int(fields[0])
+                    n_particles += [to_read]
+                    rwgt += [[]]
+                elif to_read > 0:
+                    tokens += tag.split()[:N_PARTICLE_FIELDS]
+                    to_read -= 1
+                elif tag.startswith("<wgt"):
+                    rwgt[-1] += WGT.findall(tag)
+                elif tag.startswith("</event>"):
+                    in_event = False
+                    if len(n_particles) == self.__batch_size:
+                        yield self.__make_batch(event_info, tokens, n_particles, rwgt)
+                        event_info, tokens, n_particles, rwgt = [], [], [], []
+        if len(n_particles) > 0:
+            yield self.__make_batch(event_info, tokens, n_particles, rwgt)
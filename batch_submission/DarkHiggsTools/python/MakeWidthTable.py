@@ -0,0 +1,210 @@
+#! /usr/bin/env python
+"""Precompute the hs and Z' widths per parameter point and store them in the width table of the job options.
+
+The widths are either taken from the parameter cards written by MadGraph in previous productions
+(batch_evgen.sh keeps them next to the EVNT files) or computed with the analytic tree-level formulae.
+"""
+from DarkHiggsTools.DarkHiggsWidths import width_zp, width_hs
+import argparse
+import ast
+import itertools
+import os
+import re
+import logging
+
+logging.basicConfig(format="%(levelname)s : %(message)s", level=logging.INFO)
+
+PHYSICS_SHORT = re.compile(r"_zp(\d+)_dm(\d+)_dh(\d+)")
+COUPLING = re.compile(r"^\s*(gq|gx|th)\s*=\s*([0-9.eE+-]+)")
+REWEIGHT = re.compile(r"^\s*reweight\s*=\s*True")
+REWEIGHT_GRID = re.compile(r"^\s*(reweight_grid|reweight_points)\s*=\s*(.+)$")
+# parameter points are matched to this precision
+PRECISION = 6
+
+
+def getArguments():
+    parser = argparse.ArgumentParser(description="Fill the decay width table shipped with the monoSbb job options.")
+    parser.add_argument(
+        "--fromParamCards",
+        help="MadGraph parameter cards or directories containing them (e.g. <BaseFolder>/EVNT/<DSID>)",
+        nargs="+",
+        default=[],
+    )
+    parser.add_argument(
+        "--analytic",
+        help="Compute the widths of all points defined in the job option directories analytically",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument("--jobOptionsDir", help="Directory containing the 110xxx/111xxx folders", default="./..")
+    parser.add_argument(
+        "--gxScan",
+        help="gx points of the reweight card which are added for the samples with reweighting "
+        "if the job option does not define reweight_grid or reweight_points",
+        nargs="+",
+        type=float,
+        default=[round(0.1 * i, 1) for i in range(1, 36)],
+    )
+    parser.add_argument(
+        "--tables",
+        help="Width tables to update",
+        nargs="+",
+        default=["../110xxx/110000/monoSbb_widths.dat", "../111xxx/111000/monoSbb_widths.dat"],
+    )
+    return parser
+
+
+def point_key(mzp, mdm, mhs, gq, gx, th):
+    return tuple(round(float(x), PRECISION) for x in [mzp, mdm, mhs, gq, gx, th])
+
+
+def read_param_card(card):
+    """Returns (point, width_hs, width_zp) of a MadGraph parameter card or None if the widths are missing."""
+    params = {}
+    widths = {}
+    block = ""
+    with open(card) as f:
+        for line in f:
+            fields = line.split("#")[0].split()
+            if len(fields) == 0:
+                continue
+            if fields[0].lower() == "block":
+                block = fields[1].lower()
+            elif fields[0].lower() == "decay":
+                block = ""
+                widths[int(fields[1])] = fields[2]
+            elif block in ["mass", "frblock"] and len(fields) == 2:
+                params[(block, int(fields[0]))] = float(fields[1])
+    try:
+        point = point_key(
+            params[("mass", 55)],
+            params[("mass", 1000022)],
+            params[("mass", 54)],
+            params[("frblock", 1)],
+            params[("frblock", 2)],
+            params[("frblock", 3)],
+        )
+        return point, float(widths[54]), float(widths[55])
+    except (KeyError, ValueError):
+        return None
+
+
+def find_param_cards(paths):
+    cards = []
+    for path in paths:
+        if os.path.isdir(path):
+            cards += [os.path.join(path, f) for f in sorted(os.listdir(path)) if f.startswith("param_card") and f.endswith(".dat")]
+        elif os.path.isfile(path):
+            cards += [path]
+        else:
+            logging.warning("{p} does not exist".format(p=path))
+    return cards
+
+
+def coupling_values(spec):
+    # same expansion as in the job option: (min, max, step) ranges include both ends
+    if isinstance(spec, tuple) and len(spec) == 3:
+        low, high, step = spec
+        return [round(low + i * step, 6) for i in range(int(round((high - low) / step)) + 1)]
+    if isinstance(spec, (list, tuple)):
+        return [float(x) for x in spec]
+    return [float(spec)]
+
+
+def reweight_couplings(gq, gx, th, grid, points):
+    """(gq, gx, th) points of the reweight card of a job option."""
+    if points:
+        return [(p.get("gq", gq), p.get("gx", gx), p.get("th", th)) for p in points]
+    return list(
+        itertools.product(*[coupling_values(grid.get(c, nominal)) for c, nominal in [("gq", gq), ("gx", gx), ("th", th)]])
+    )
+
+
+def job_option_points(jobOptionsDir, gx_scan):
+    points = []
+    for block in sorted(os.listdir(jobOptionsDir)):
+        if not re.match(r"^\d{3}xxx$", block):
+            continue
+        for dsid in sorted(os.listdir(os.path.join(jobOptionsDir, block))):
+            dsid_dir = os.path.join(jobOptionsDir, block, dsid)
+            mc_files = [f for f in os.listdir(dsid_dir) if f.startswith("mc.") and f.endswith(".py")]
+            if len(mc_files) != 1:
+                continue
+            masses = PHYSICS_SHORT.search(mc_files[0])
+            if not masses:
+                continue
+            couplings = {}
+            reweight = False
+            grid = {"reweight_grid": {"gx": gx_scan}, "reweight_points": []}
+            with open(os.path.join(dsid_dir, mc_files[0])) as f:
+                for line in f:
+                    match = COUPLING.match(line)
+                    if match:
+                        couplings[match.group(1)] = float(match.group(2))
+                    reweight = reweight or REWEIGHT.match(line) is not None
+                    match = REWEIGHT_GRID.match(line)
+                    if match:
+                        # only single-line literals can be parsed
+                        try:
+                            grid[match.group(1)] = ast.literal_eval(match.group(2).split("#")[0].strip())
+                        except (SyntaxError, ValueError):
+                            logging.warning("Cannot parse {n} in {f}".format(n=match.group(1), f=mc_files[0]))
+            mzp, mdm, mhs = [int(x) for x in masses.groups()]
+            gq, gx, th = couplings["gq"], couplings["gx"], couplings["th"]
+            for point in [(gq, gx, th)] + (
+                reweight_couplings(gq, gx, th, grid["reweight_grid"], grid["reweight_points"]) if reweight else []
+            ):
+                points += [point_key(mzp, mdm, mhs, *point)]
+    return sorted(set(points))
+
+
+def read_table(table):
+    entries = {}
+    if not os.path.exists(table):
+        return entries
+    with open(table) as f:
+        for line in f:
+            fields = line.split()
+            if line.startswith("#") or len(fields) != 8:
+                continue
+            entries[point_key(*fields[:6])] = (float(fields[6]), float(fields[7]))
+    return entries
+
+
+def write_table(entries, table):
+    with open(table, "w") as f:
+        f.write("# Decay widths (GeV) of hs (54) and Z' (55) per parameter point\n")
+        f.write("# mzp mdm mhs gq gx th width_hs width_zp\n")
+        for key in sorted(entries.keys()):
+            f.write("%g %g %g %g %g %g %.6e %.6e\n" % (key + entries[key]))
+
+
+def main():
+    options = getArguments().parse_args()
+    widths = {}
+    if options.analytic:
+        for point in job_option_points(options.jobOptionsDir, options.gxScan):
+            mzp, mdm, mhs, gq, gx, th = point
+            widths[point] = (width_hs(mhs, mzp, mdm, gx, th), width_zp(mzp, mdm, gq, gx))
+        logging.info("Computed the widths of {n} points analytically.".format(n=len(widths)))
+    # the widths computed by MadGraph itself take precedence
+    n_cards = 0
+    for card in find_param_cards(options.fromParamCards):
+        result = read_param_card(card)
+        if not result:
+            logging.warning("No numeric widths found in {c}".format(c=card))
+            continue
+        widths[result[0]] = result[1:]
+        n_cards += 1
+    if options.fromParamCards:
+        logging.info("Read the widths from {n} parameter cards.".format(n=n_cards))
+
+    for table in options.tables:
+        entries = read_table(table)
+        entries.update(widths)
+        write_table(entries, table)
+        logging.info("Updated {t} ({n} entries)".format(t=table, n=len(entries)))
+
+
+if __name__ == "__main__":
+    main()
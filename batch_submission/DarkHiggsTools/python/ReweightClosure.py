@@ -0,0 +1,213 @@
+#! /usr/bin/env python
+"""Closure test of the gx reweighting of 110000 against the dedicated 111xxx samples generated at fixed gx.
+
+Every input file is read once in batches. The binned observables of a batch are combined with the
+(n_events, n_points) weight matrix into a single bincount, which fills the histograms of all gx points
+and observables at the same time. The files are processed in parallel and only the histograms are returned.
+"""
+from DarkHiggsTools.GxReweight import PDG_DM, PDG_HS, reweighter_from_lhe, rwgt_name
+from DarkHiggsTools.LHEReader import LHEReader
+from multiprocessing import Pool
+import argparse
+import math
+import logging
+import numpy as np
+
+logging.basicConfig(format="%(levelname)s : %(message)s", level=logging.INFO)
+
+# name: (observable of a LHEBatch, number of bins, lower edge, upper edge)
+OBSERVABLES = {
+    "met": (lambda batch: batch.pt([PDG_DM]), 50, 0.0, 1000.0),
+    "pt_hs": (lambda batch: batch.pt([PDG_HS]), 50, 0.0, 1000.0),
+    "m_hs": (lambda batch: batch.invariant_mass([PDG_HS]), 50, 0.0, 200.0),
+    "m_zp": (lambda batch: batch.invariant_mass([PDG_DM, PDG_HS]), 50, 0.0, 2000.0),
+}
+
+
+def getArguments():
+    parser = argparse.ArgumentParser(
+        description="Compare the reweighted 110000 LHE events with the 111xxx samples generated at fixed gx."
+    )
+    parser.add_argument("--reweighted", help="LHE files of the sample with reweighting", nargs="+", required=True)
+    parser.add_argument(
+        "--nominal",
+        help="gx value followed by the LHE files of the sample generated at this gx. Can be given several times",
+        nargs="+",
+        action="append",
+        default=[],
+    )
+    parser.add_argument(
+        "--points",
+        help="gx values to fill the reweighted histograms for",
+        nargs="+",
+        type=float,
+        default=[round(0.1 * i, 1) for i in range(1, 36)],
+    )
+    parser.add_argument(
+        "--weights",
+        help="Take the weights from the MadGraph reweight module or compute them analytically",
+        choices=["madgraph", "analytic"],
+        default="madgraph",
+    )
+    parser.add_argument(
+        "--observables",
+        help="Observables to compare",
+        nargs="+",
+        choices=sorted(OBSERVABLES.keys()),
+        default=["met", "pt_hs", "m_hs"],
+    )
+    parser.add_argument("--output", help="Store the histograms in a .npz file", default="")
+    parser.add_argument("--batchSize", help="Number of events per batch", type=int, default=10000)
+    parser.add_argument("--nProc", help="Number of files read in parallel", type=int, default=4)
+    return parser
+
+
+def bin_indices(batch, observables):
+    """Returns the (n_events, n_observables) bin indices, -1 for events outside of the histogram range."""
+    indices = []
+    for name in observables:
+        func, nbins, low, high = OBSERVABLES[name]
+        x = func(batch)
+        idx = np.floor((x - low) / (high - low) * nbins).astype(np.int64)
+        indices += [np.where((idx >= 0) & (idx < nbins), idx, -1)]
+    return np.stack(indices, axis=1)
+
+
+def fill(weights, indices, nbins):
+    """Fills the (n_observables, n_points, nbins) histograms of sum(w) and sum(w^2) with one bincount each."""
+    n_events, n_points = weights.shape
+    n_obs = indices.shape[1]
+    # global bin: bin + nbins * (point + n_points * observable)
+    offsets = nbins * (np.arange(n_points)[np.newaxis, :, np.newaxis] + n_points * np.arange(n_obs)[np.newaxis, np.newaxis, :])
+    flat = indices[:, np.newaxis, :] + offsets
+    valid = np.broadcast_to(indices[:, np.newaxis, :] >= 0, flat.shape)
+    w = np.broadcast_to(weights[:, :, np.newaxis], flat.shape)[valid]
+    flat = flat[valid]
+    size = nbins * n_points * n_obs
+    sumw = np.bincount(flat, weights=w, minlength=size)
+    sumw2 = np.bincount(flat, weights=w ** 2, minlength=size)
+    # the flat index runs over (observable, point, bin)
+    shape = (n_obs, n_points, nbins)
+    return sumw.reshape(shape), sumw2.reshape(shape)
+
+
+def fill_file(job):
+    """Histograms of a single LHE file. The reweighted sample is filled for all points, a nominal sample for its own gx."""
+    path, points, mode, observables, batch_size = job
+    nbins = OBSERVABLES[observables[0]][1]
+    reader = LHEReader(path, batch_size=batch_size)
+    reweighter = reweighter_from_lhe(reader, points) if mode == "analytic" else None
+    n_points = len(points) if mode != "nominal" else 1
+    sumw = np.zeros((len(observables), n_points, nbins))
+    sumw2 = np.zeros((len(observables), n_points, nbins))
+    for batch in reader:
+        if mode == "nominal":
+            weights = batch.weight()[:, np.newaxis]
+        elif mode == "analytic":
+            weights = reweighter.weights(batch)
+        else:
+            names = [rwgt_name(gx) for gx in points]
+            missing = [n for n in names if n not in batch.rwgt_names()]
+            if missing:
+                raise KeyError("{f} has no MadGraph weights {m}".format(f=path, m=", ".join(missing)))
+            weights = np.stack([batch.rwgt(n) for n in names], axis=1)
+        w, w2 = fill(np.nan_to_num(weights), bin_indices(batch, observables), nbins)
+        sumw += w
+        sumw2 += w2
+    return sumw, sumw2
+
+
+def fill_files(pool, files, points, mode, observables, batch_size):
+    """Cross-section histograms: with event_norm = sum each file is normalised to the cross-section, so files are averaged."""
+    sumw, sumw2 = 0.0, 0.0
+    for w, w2 in pool.imap_unordered(fill_file, [(f, points, mode, observables, batch_size) for f in files]):
+        sumw = sumw + w
+        sumw2 = sumw2 + w2
+    return sumw / len(files), sumw2 / len(files) ** 2
+
+
+def chi2_shape(sumw_a, sumw2_a, sumw_b, sumw2_b):
+    """chi2 and number of degrees of freedom of the comparison of the normalised shapes."""
+    norm_a, norm_b = sumw_a.sum(), sumw_b.sum()
+    if norm_a <= 0.0 or norm_b <= 0.0:
+        return float("nan"), 0
+    variance = sumw2_a / norm_a ** 2 + sumw2_b / norm_b ** 2
+    used = variance > 0.0
+    chi2 = ((sumw_a / norm_a - sumw_b / norm_b) ** 2)[used] / variance[used]
+    return chi2.sum(), max(int(used.sum()) - 1, 1)
+
+
+def ks_binned(sumw_a, sumw2_a, sumw_b, sumw2_b):
+    """Kolmogorov-Smirnov distance of the binned distributions and its p-value for the effective numbers of events."""
+    norm_a, norm_b = sumw_a.sum(), sumw_b.sum()
+    if norm_a <= 0.0 or norm_b <= 0.0:
+        return float("nan"), float("nan")
+    distance = np.abs(np.cumsum(sumw_a) / norm_a - np.cumsum(sumw_b) / norm_b).max()
+    n_a = norm_a ** 2 / sumw2_a.sum()
+    n_b = norm_b ** 2 / sumw2_b.sum()
+    n_eff = n_a * n_b / (n_a + n_b)
+    lam = (math.sqrt(n_eff) + 0.12 + 0.11 / math.sqrt(n_eff)) * distance
+    if lam < 1.0e-3:
+        return distance, 1.0
+    prob = 2.0 * sum((-1) ** (j - 1) * math.exp(-2.0 * j ** 2 * lam ** 2) for j in range(1, 101))
+    return distance, min(max(prob, 0.0), 1.0)
+
+
+def main():
+    options = getArguments().parse_args()
+    nbins = set(OBSERVABLES[name][1] for name in options.observables)
+    if len(nbins) != 1:
+        logging.error("All observables must have the same number of bins.")
+        exit(1)
+
+    nominal = {}
+    for entry in options.nominal:
+        if len(entry) < 2:
+            logging.error("--nominal expects the gx value followed by at least one file.")
+            exit(1)
+        nominal.setdefault(float(entry[0]), []).extend(entry[1:])
+    points = sorted(set(options.points + list(nominal.keys())))
+
+    pool = Pool(options.nProc)
+    logging.info(
+        "Filling the histograms of {n} gx points from {f} reweighted files".format(n=len(points), f=len(options.reweighted))
+    )
+    rw_sumw, rw_sumw2 = fill_files(pool, options.reweighted, points, options.weights, options.observables, options.batchSize)
+    nom_hists = {}
+    for gx in sorted(nominal.keys()):
+        logging.info("Filling the nominal histograms of gx = {gx} from {f} files".format(gx=gx, f=len(nominal[gx])))
+        nom_hists[gx] = fill_files(pool, nominal[gx], [gx], "nominal", options.observables, options.batchSize)
+    pool.close()
+    pool.join()
+
+    if options.output:
+        output = {"points": np.array(points), "reweighted_sumw": rw_sumw, "reweighted_sumw2": rw_sumw2}
+        for gx, (sumw, sumw2) in nom_hists.items():
+            output["nominal_{gx}_sumw".format(gx=gx)] = sumw[:, 0]
+            output["nominal_{gx}_sumw2".format(gx=gx)] = sumw2[:, 0]
+        np.savez(options.output, **output)
+        logging.info("Stored the histograms in {o}".format(o=options.output))
+
+    if len(nom_hists) == 0:
+        return
+    logging.info("Compatibility of the reweighted and the nominal samples:")
+    logging.info(
+        "   {0:>6} {1:>8} {2:>10} {3:>10} {4:>8} {5:>8}".format("gx", "obs", "xsec ratio", "chi2/ndf", "KS dist", "KS prob")
+    )
+    for gx in sorted(nom_hists.keys()):
+        k = points.index(gx)
+        nom_sumw, nom_sumw2 = nom_hists[gx]
+        for o, name in enumerate(options.observables):
+            args = (rw_sumw[o, k], rw_sumw2[o, k], nom_sumw[o, 0], nom_sumw2[o, 0])
+            chi2, ndf = chi2_shape(*args)
+            distance, prob = ks_binned(*args)
+            xsec_ratio = args[0].sum() / args[2].sum() if args[2].sum() > 0.0 else float("nan")
+            logging.info(
+                "   {0:>6} {1:>8} {2:>10.4f} {3:>10.3f} {4:>8.4f} {5:>8.3f}".format(
+                    gx, name, xsec_ratio, chi2 / ndf, distance, prob
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
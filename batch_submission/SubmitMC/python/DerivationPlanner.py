@@ -0,0 +1,112 @@
+from TaskManifest import TaskManifest
+from SeedRegistry import EVNT_FILE
+import os
+import re
+import time
+import logging
+
+# name of the DAOD files written by batch_derivation.sh
+DAOD_FILE = re.compile(r"^DAOD_(\w+?)\.mc16_13TeV\.(\d+)\.(\d+)\.root$")
+SNAPSHOT_COLUMNS = ["directory", "mtime", "scanned", "keys"]
+
+
+class DerivationPlanner(object):
+    """Matches the EVNT files of a DSID to the already produced DAOD files by (DSID, seed, format).
+
+    The keys found in each EVNT/<DSID> and TRUTH/<DSID> directory are cached in a snapshot together with the
+    modification time of the directory. A directory is only listed again if its modification time changed.
+    The EVNT seeds are taken from the output catalogue if its record of the DSID is newer than the directory.
+    """
+
+    def __init__(self, snapshot_file, evgen_dir, aod_dir, catalogue_dir=""):
+        self.__snapshot_file = snapshot_file
+        self.__evgen_dir = evgen_dir
+        self.__aod_dir = aod_dir
+        self.__catalogue_dir = catalogue_dir
+        self.__snapshot = {}
+        self.__changed = False
+        self.__n_scanned = 0
+        if os.path.exists(snapshot_file):
+            manifest = TaskManifest.read(snapshot_file)
+            if manifest is not None:
+                self.__snapshot = dict((r["directory"], r) for r in manifest.records())
+
+    def snapshot_file(self):
+        return self.__snapshot_file
+
+    def n_scanned(self):
+        return self.__n_scanned
+
+    def __keys(self, directory, pattern):
+        """Returns the set of match groups of the file names in the directory, listing it only if it changed."""
+        if not os.path.isdir(directory):
+            return set()
+        mtime = os.path.getmtime(directory)
+        prev = self.__snapshot.get(directory)
+        # a directory modified within the second of the last scan may have changed after it
+        if prev and float(prev["mtime"]) == mtime and float(prev["scanned"]) > mtime + 1:
+            return set(tuple(k.split(".")) for k in prev["keys"].split(",") if k)
+        keys = set()
+        for name in os.listdir(directory):
+            match = pattern.match(name)
+            if match:
+                keys.add(match.groups())
+        self.__snapshot[directory] = {
+            "directory": directory,
+            "mtime": repr(mtime),
+            "scanned": repr(time.time()),
+            "keys": ",".join(sorted(".".join(k) for k in keys)),
+        }
+        self.__changed = True
+        self.__n_scanned += 1
+        return keys
+
+    def __catalogue_keys(self, run):
+        """Keys of the valid EVNT files in the output catalogue or None if the catalogue is not up to date."""
+        if not self.__catalogue_dir:
+            return None
+        catalogue_file = os.path.join(self.__catalogue_dir, "EVNT_%d.txt" % (run))
+        run_dir = os.path.join(self.__evgen_dir, str(run))
+        if not os.path.exists(catalogue_file) or os.path.getmtime(catalogue_file) <= os.path.getmtime(run_dir) + 1:
+            return None
+        manifest = TaskManifest.read(catalogue_file)
+        if manifest is None:
+            return None
+        return set(
+            (str(run), r["seed"]) for r in manifest.records() if int(r["size"]) > 0 and int(r["events"]) > 0
+        )
+
+    def evnt_keys(self, run):
+        """Set of (DSID, seed) of the EVNT files in EVNT/<DSID>."""
+        run_dir = os.path.join(self.__evgen_dir, str(run))
+        if not os.path.isdir(run_dir):
+            return set()
+        keys = self.__catalogue_keys(run)
+        if keys is None:
+            keys = self.__keys(run_dir, EVNT_FILE)
+        return set((int(r), int(s)) for r, s in keys if int(r) == run)
+
+    def daod_keys(self, run):
+        """Set of (DSID, seed, format) of the DAOD files in TRUTH/<DSID>."""
+        keys = self.__keys(os.path.join(self.__aod_dir, str(run)), DAOD_FILE)
+        return set((int(r), int(s), f) for f, r, s in keys if int(r) == run)
+
+    ### Seeds of the DSID whose EVNT file has not been processed in the derivation format yet
+    def pending(self, run, derivation):
+        done = set((r, s) for r, s, f in self.daod_keys(run) if f == derivation)
+        return sorted(s for r, s in self.evnt_keys(run) - done)
+
+    def save(self):
+        if not self.__changed:
+            return True
+        manifest = TaskManifest(SNAPSHOT_COLUMNS)
+        for directory in sorted(self.__snapshot.keys()):
+            manifest.add(**self.__snapshot[directory])
+        # written to a temporary file first as several derivation formats may be planned at the same time
+        tmp_file = "%s.%d" % (self.__snapshot_file, os.getpid())
+        if not manifest.write(tmp_file):
+            logging.error("<DerivationPlanner::save>: Could not write {f}.".format(f=tmp_file))
+            return False
+        os.rename(tmp_file, self.__snapshot_file)
+        self.__changed = False
+        return True
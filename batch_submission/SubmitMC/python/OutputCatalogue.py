@@ -0,0 +1,171 @@
+#! /usr/bin/env python
+from ClusterSubmission.Utils import CreateDirectory
+from TaskManifest import TaskManifest
+from SeedRegistry import EVNT_FILE
+import argparse
+import os
+import re
+import zlib
+import logging
+
+logging.basicConfig(format="%(levelname)s : %(message)s", level=logging.INFO)
+
+try:
+    from os import scandir
+except ImportError:
+    scandir = None
+
+EVENT_PROCESSED = re.compile(r"done processing event #(\d+).*?(\d+)\s+events processed so far")
+CATALOGUE_COLUMNS = ["file", "seed", "size", "mtime", "events", "last_event", "adler32"]
+
+
+def getArguments():
+    USERNAME = os.getenv("USER")
+    parser = argparse.ArgumentParser(description="Update and print the catalogue of the produced EVNT files.")
+    parser.add_argument(
+        "--BaseFolder",
+        help="Base folder of the production",
+        default="/nfs/dust/atlas/user/{username}/MC".format(username=USERNAME),
+    )
+    parser.add_argument("-r", "--runNumbers", nargs="+", default=[], type=int)
+    return parser
+
+
+def _file_stats(directory):
+    """Yields (name, size, mtime) of the files in a directory using a single directory scan."""
+    if scandir is not None:
+        for entry in scandir(directory):
+            if entry.is_file():
+                st = entry.stat()
+                yield entry.name, st.st_size, int(st.st_mtime)
+        return
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if os.path.isfile(path):
+            yield name, os.path.getsize(path), int(os.path.getmtime(path))
+
+
+def adler32(path, block_size=1 << 20):
+    checksum = 1
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            checksum = zlib.adler32(block, checksum)
+    return "%08x" % (checksum & 0xFFFFFFFF)
+
+
+def parse_evnt_log(log_file):
+    """Returns (number of events, number of the last event) from the log file of an event generation job."""
+    events, last_event = 0, 0
+    with open(log_file) as log:
+        for line in log:
+            match = EVENT_PROCESSED.search(line)
+            if match:
+                last_event = max(last_event, int(match.group(1)))
+                events = max(events, int(match.group(2)))
+    return events, last_event
+
+
+class OutputCatalogue(object):
+    """Catalogue of the EVNT files of each DSID with size, number of events and adler32 checksum.
+
+    The catalogue of a DSID is a task manifest in <catalogue_dir>/EVNT_<DSID>.txt. Files whose size and
+    modification time did not change since the last update are not read again.
+    """
+
+    def __init__(self, catalogue_dir, evgen_dir):
+        self.__catalogue_dir = catalogue_dir
+        self.__evgen_dir = evgen_dir
+        self.__entries = {}
+        CreateDirectory(catalogue_dir, False)
+
+    def catalogue_file(self, run):
+        return os.path.join(self.__catalogue_dir, "EVNT_%d.txt" % (run))
+
+    def __read(self, run):
+        if not os.path.exists(self.catalogue_file(run)):
+            return {}
+        manifest = TaskManifest.read(self.catalogue_file(run))
+        if manifest is None:
+            return {}
+        return dict((r["file"], r) for r in manifest.records())
+
+    ### Scans EVNT/<DSID> and updates the catalogue of the DSID. Returns the list of records
+    def update(self, run):
+        run_dir = os.path.join(self.__evgen_dir, str(run))
+        old = self.__read(run)
+        if not os.path.isdir(run_dir):
+            self.__entries[run] = []
+            return []
+        stats = dict((name, (size, mtime)) for name, size, mtime in _file_stats(run_dir))
+        records = []
+        changed = False
+        for name in sorted(stats.keys()):
+            match = EVNT_FILE.match(name)
+            if not match:
+                continue
+            size, mtime = stats[name]
+            log_name = name.replace(".pool.root", ".log")
+            prev = old.get(name)
+            # the log is copied after the EVNT file, so a record without events is refreshed once the log appears
+            if prev and int(prev["size"]) == size and int(prev["mtime"]) == mtime and (int(prev["events"]) > 0 or log_name not in stats):
+                records += [prev]
+                continue
+            events, last_event = parse_evnt_log(os.path.join(run_dir, log_name)) if log_name in stats else (0, 0)
+            records += [
+                {
+                    "file": name,
+                    "seed": match.group(2),
+                    "size": str(size),
+                    "mtime": str(mtime),
+                    "events": str(events),
+                    "last_event": str(last_event),
+                    "adler32": adler32(os.path.join(run_dir, name)),
+                }
+            ]
+            changed = True
+        if changed or len(records) != len(old):
+            manifest = TaskManifest(CATALOGUE_COLUMNS)
+            for r in records:
+                manifest.add(**r)
+            manifest.write(self.catalogue_file(run))
+        self.__entries[run] = records
+        return records
+
+    def entries(self, run):
+        if run not in self.__entries:
+            self.update(run)
+        return self.__entries[run]
+
+    @staticmethod
+    def is_valid(record):
+        return int(record["size"]) > 0 and int(record["events"]) > 0
+
+    def valid_events(self, run):
+        return sum(int(r["events"]) for r in self.entries(run) if self.is_valid(r))
+
+    def last_event(self, run):
+        return max([int(r["last_event"]) for r in self.entries(run)] + [0])
+
+    def invalid(self, run):
+        return [r["file"] for r in self.entries(run) if not self.is_valid(r)]
+
+
+def main():
+    options = getArguments().parse_args()
+    evgen_dir = os.path.join(options.BaseFolder, "EVNT")
+    catalogue = OutputCatalogue(os.path.join(options.BaseFolder, "CATALOGUE"), evgen_dir)
+    runs = options.runNumbers if options.runNumbers else sorted(int(r) for r in os.listdir(evgen_dir) if r.isdigit())
+    logging.info("   {0:>8} {1:>8} {2:>12} {3:>8}".format("DSID", "files", "events", "invalid"))
+    for run in runs:
+        logging.info(
+            "   {0:>8} {1:>8} {2:>12} {3:>8}".format(
+                run, len(catalogue.entries(run)), catalogue.valid_events(run), len(catalogue.invalid(run))
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
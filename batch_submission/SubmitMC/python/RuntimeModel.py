@@ -0,0 +1,224 @@
+#! /usr/bin/env python
+from ClusterSubmission.Utils import TimeToSeconds
+import argparse
+import heapq
+import math
+import os
+import re
+import logging
+
+logging.basicConfig(format="%(levelname)s : %(message)s", level=logging.INFO)
+
+# athena log lines start with the wall clock time
+TIMESTAMP = re.compile(r"^(\d\d):(\d\d):(\d\d)\s")
+EVENTS_PROCESSED = re.compile(r"(\d+)\s+events processed so far")
+PHYSICS_SHORT = re.compile(r"_zp(\d+)_dm(\d+)_dh(\d+)")
+REWEIGHT = re.compile(r"^\s*reweight\s*=\s*True")
+
+
+def getArguments():
+    USERNAME = os.getenv("USER")
+    parser = argparse.ArgumentParser(
+        description="Fit the event generation runtime per DSID from the log files kept next to the EVNT files."
+    )
+    parser.add_argument(
+        "--evgenDir",
+        help="Directory containing the EVNT/<DSID> output folders",
+        default="/nfs/dust/atlas/user/{username}/MC/EVNT".format(username=USERNAME),
+    )
+    parser.add_argument("--jobOptionsDir", help="Directory containing the 110xxx/111xxx folders", default="./..")
+    parser.add_argument("-r", "--runNumbers", nargs="+", default=[], type=int, help="Print the prediction for these DSIDs")
+    parser.add_argument("--totalEvents", help="Events per DSID", type=int, default=10000)
+    parser.add_argument("--targetRuntime", help="Target runtime per task", default="03:00:00")
+    return parser
+
+
+def SecondsToTime(seconds):
+    """Convert seconds to the format HH:MM:SS."""
+    seconds = int(math.ceil(seconds))
+    return "%02d:%02d:%02d" % (seconds // 3600, (seconds % 3600) // 60, seconds % 60)
+
+
+def parse_evgen_log(log_file):
+    """Returns (events, wall time in seconds) of a log.generate file or None if the job did not process any event."""
+    first = None
+    last = None
+    elapsed = 0
+    events = 0
+    with open(log_file) as log:
+        for line in log:
+            match = TIMESTAMP.match(line)
+            if match:
+                t = 3600 * int(match.group(1)) + 60 * int(match.group(2)) + int(match.group(3))
+                if first is None:
+                    first = t
+                elif t < last:
+                    # the job ran over midnight
+                    elapsed += 86400
+                last = t
+            match = EVENTS_PROCESSED.search(line)
+            if match:
+                events = max(events, int(match.group(1)))
+    if first is None or events == 0:
+        return None
+    return events, elapsed + last - first
+
+
+def job_option_features(jobOptionsDir, run):
+    """Returns (reweight, mzp, mdm, mhs) of the mc.*.py file of a DSID or None."""
+    dsid_dir = os.path.join(jobOptionsDir, "{ddd}xxx".format(ddd=str(run)[:3]), str(run))
+    if not os.path.isdir(dsid_dir):
+        return None
+    mc_files = [f for f in os.listdir(dsid_dir) if f.startswith("mc.") and f.endswith(".py")]
+    if len(mc_files) != 1:
+        return None
+    masses = PHYSICS_SHORT.search(mc_files[0])
+    if not masses:
+        return None
+    with open(os.path.join(dsid_dir, mc_files[0])) as f:
+        reweight = any(REWEIGHT.match(line) for line in f)
+    return (reweight,) + tuple(int(x) for x in masses.groups())
+
+
+def lpt_order(costs):
+    """Indices of the tasks with decreasing cost (longest processing time first). Tasks with the same cost keep their order."""
+    return sorted(range(len(costs)), key=lambda i: -costs[i])
+
+
+def predicted_makespan(costs, slots=-1):
+    """Wall time until all tasks are finished if they are started in the given order as soon as one of the slots is free.
+    A non-positive number of slots means that all tasks run at the same time."""
+    if len(costs) == 0:
+        return 0.0
+    if slots <= 0 or slots >= len(costs):
+        return max(costs)
+    finish = [0.0 for i in range(slots)]
+    for cost in costs:
+        heapq.heappush(finish, heapq.heappop(finish) + cost)
+    return max(finish)
+
+
+class RuntimeModel(object):
+    """Linear model seconds = overhead + events * seconds per event, fitted per DSID.
+
+    DSIDs without measurement are predicted from the DSIDs with the same features: first the same
+    reweight setting and mass point, then the same reweight setting and dark Higgs mass, then the same reweight setting.
+    """
+
+    def __init__(self, evgen_dir="", joboptions_dir="./..", default_seconds_per_event=1.0, default_overhead=600.0):
+        self.__evgen_dir = evgen_dir
+        self.__joboptions_dir = joboptions_dir
+        self.__default = (default_overhead, default_seconds_per_event)
+        self.__fits = {}
+        self.__features = {}
+        if evgen_dir and os.path.isdir(evgen_dir):
+            self.__fit()
+
+    def __fit(self):
+        for run in sorted(os.listdir(self.__evgen_dir)):
+            run_dir = os.path.join(self.__evgen_dir, run)
+            if not run.isdigit() or not os.path.isdir(run_dir):
+                continue
+            measurements = []
+            for log_file in os.listdir(run_dir):
+                if not log_file.endswith(".log") or ".EVNT." not in log_file:
+                    continue
+                result = parse_evgen_log(os.path.join(run_dir, log_file))
+                if result:
+                    measurements += [result]
+            if not measurements:
+                continue
+            self.__fits[int(run)] = self.__fit_measurements(measurements)
+        if self.__fits:
+            # the overhead of DSIDs measured with a single number of events is taken from the other DSIDs
+            overheads = sorted(o for o, s, n, separated in self.__fits.values() if separated)
+            overhead = overheads[len(overheads) // 2] if overheads else 0.0
+            for run, (o, s, n, separated) in self.__fits.items():
+                if not separated:
+                    self.__fits[run] = (overhead, max(s - overhead / n, 0.0), n, False)
+
+    @staticmethod
+    def __fit_measurements(measurements):
+        """Least squares fit of (overhead, seconds per event). Returns the mean events as third element."""
+        n = float(len(measurements))
+        mean_x = sum(m[0] for m in measurements) / n
+        mean_y = sum(m[1] for m in measurements) / n
+        var_x = sum((m[0] - mean_x) ** 2 for m in measurements) / n
+        if var_x > 0.0:
+            slope = sum((m[0] - mean_x) * (m[1] - mean_y) for m in measurements) / n / var_x
+            if slope > 0.0:
+                return (max(mean_y - slope * mean_x, 0.0), slope, mean_x, True)
+        # the overhead cannot be separated: the per-event cost includes it until it is subtracted in __fit
+        return (0.0, mean_y / mean_x, mean_x, False)
+
+    def features(self, run):
+        if run not in self.__features:
+            self.__features[run] = job_option_features(self.__joboptions_dir, run)
+        return self.__features[run]
+
+    def measured(self, run):
+        return run in self.__fits
+
+    def parameters(self, run):
+        """Returns (overhead, seconds per event) of a DSID."""
+        if run in self.__fits:
+            return self.__fits[run][:2]
+        features = self.features(run)
+        if features is None:
+            return self.__default
+        # feature levels: (reweight, mzp, mdm, mhs), (reweight, mhs), (reweight,)
+        for same in [
+            lambda f: f == features,
+            lambda f: f[0] == features[0] and f[3] == features[3],
+            lambda f: f[0] == features[0],
+        ]:
+            matches = [self.__fits[r][:2] for r in self.__fits if self.features(r) is not None and same(self.features(r))]
+            if matches:
+                return (
+                    sum(m[0] for m in matches) / len(matches),
+                    sum(m[1] for m in matches) / len(matches),
+                )
+        return self.__default
+
+    def predict(self, run, events):
+        """Predicted wall time in seconds of a task generating the given number of events."""
+        overhead, seconds_per_event = self.parameters(run)
+        return overhead + events * seconds_per_event
+
+    def split(self, run, total_events, target_runtime, margin=0.2):
+        """Returns (events per job, number of jobs, wall time) such that all tasks of the DSID are about equally long
+        and the predicted runtime including the safety margin stays below the target runtime."""
+        target = TimeToSeconds(target_runtime) / (1.0 + margin)
+        overhead, seconds_per_event = self.parameters(run)
+        if target <= overhead:
+            logging.warning(
+                "The predicted overhead of DSID {r} ({o}) exceeds the target runtime {t}.".format(
+                    r=run, o=SecondsToTime(overhead), t=target_runtime
+                )
+            )
+            max_events = 1
+        else:
+            max_events = int((target - overhead) / seconds_per_event) if seconds_per_event > 0.0 else total_events
+        max_events = min(max(max_events, 1), total_events)
+        n_jobs = int(math.ceil(float(total_events) / max_events))
+        events_per_job = int(math.ceil(float(total_events) / n_jobs))
+        return events_per_job, n_jobs, SecondsToTime(self.predict(run, events_per_job) * (1.0 + margin))
+
+
+def main():
+    options = getArguments().parse_args()
+    model = RuntimeModel(evgen_dir=options.evgenDir, joboptions_dir=options.jobOptionsDir)
+    runs = options.runNumbers if options.runNumbers else sorted(int(r) for r in os.listdir(options.evgenDir) if r.isdigit())
+    logging.info("   {0:>8} {1:>9} {2:>10} {3:>12} {4:>8} {5:>10}".format("DSID", "measured", "overhead", "s / event", "jobs", "events/job"))
+    for run in runs:
+        overhead, seconds_per_event = model.parameters(run)
+        events_per_job, n_jobs, run_time = model.split(run, options.totalEvents, options.targetRuntime)
+        logging.info(
+            "   {0:>8} {1:>9} {2:>10} {3:>12.4f} {4:>8} {5:>10}   ({6} per job)".format(
+                run, str(model.measured(run)), SecondsToTime(overhead), seconds_per_event, n_jobs, events_per_job, run_time
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
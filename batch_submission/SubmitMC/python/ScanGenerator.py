@@ -0,0 +1,235 @@
+#! /usr/bin/env python
+from ClusterSubmission.Utils import CreateDirectory
+from TaskManifest import TaskManifest
+from submit import getArguments as getSubmitArguments, submit
+import itertools
+import os
+import re
+import sys
+import time
+import logging
+
+logging.basicConfig(format="%(levelname)s : %(message)s", level=logging.INFO)
+
+TEMPLATE = "MadGraphControl_MadGraphPythia8_N31LO_A14N23LO_monoSbb_CKKWL.py"
+# files shared by all DSIDs through symbolic links onto the folder holding the template
+SHARED_FILES = [TEMPLATE, "monoSbb_acceptance.dat", "monoSbb_widths.dat"]
+# couplings of the job options without coupling label
+NOMINAL = {"gq": 0.25, "gx": 1.0, "th": 0.01}
+COUPLINGS = ["gq", "gx", "th"]
+# DSIDs with reweighting are allocated in 110xxx, 112xxx, ... and without in 111xxx, 113xxx, ...
+FIRST_BLOCK = {True: 110, False: 111}
+BLOCK_FOLDER = re.compile(r"^(\d{3})xxx$")
+# settings of a sample in its mc.*.py file, e.g. gx = 1.50
+MC_SETTING = re.compile(r"^\s*(gq|gx|th|reweight)\s*=\s*(\S+)")
+SCAN_COLUMNS = ["dsid", "mzp", "mdm", "mhs", "gq", "gx", "th", "reweight", "job_option"]
+
+MC_FILE = """gq = {gq}
+gx = {gx}
+th = {th}
+evgenConfig.nEventsPerJob = {events}
+
+# activate MadGraph reweight in g(x)
+reweight = {reweight}
+
+include("{template}")
+"""
+
+
+def getArguments():
+    parser = getSubmitArguments()
+    parser.description = "Create the job option folders of a scan over the mass points and couplings and submit them as one array."
+    # the events per job, number of jobs and run time of each point are estimated by the runtime model
+    parser.set_defaults(autoSplit=True)
+    parser.add_argument("--jobOptionsDir", help="Directory containing the 110xxx/111xxx folders", default="./..")
+    parser.add_argument("--mzp", help="Z' masses of the scan", nargs="+", type=int, required=True)
+    parser.add_argument("--mdm", help="Dark matter masses of the scan", nargs="+", type=int, required=True)
+    parser.add_argument("--mhs", help="Dark Higgs masses of the scan", nargs="+", type=int, required=True)
+    parser.add_argument("--gq", help="Quark couplings of the scan", nargs="+", type=float, default=[NOMINAL["gq"]])
+    parser.add_argument("--gx", help="Dark matter couplings of the scan", nargs="+", type=float, default=[NOMINAL["gx"]])
+    parser.add_argument("--th", help="Mixing angles of the scan", nargs="+", type=float, default=[NOMINAL["th"]])
+    parser.add_argument(
+        "--reweight",
+        help="Run the MadGraph reweight module for the points",
+        nargs="+",
+        choices=["True", "False"],
+        default=["False"],
+    )
+    parser.add_argument("--scanName", help="Name of the table of the scan points written to <jobOptionsDir>/scans", default="")
+    parser.add_argument("--noSubmit", help="Only create the job option folders", action="store_true", default=False)
+    return parser
+
+
+def coupling_label(value):
+    # same labels as the existing samples, e.g. gx1p0, gx0p3
+    label = "%.1f" % value if abs(round(value, 1) - value) < 1.0e-9 else "%g" % value
+    return label.replace(".", "p")
+
+
+def coupling_str(value):
+    return "%.2f" % value if abs(round(value, 2) - value) < 1.0e-9 else repr(value)
+
+
+def physics_short(point):
+    name = "MGPy8EG_monoSbb_zp{mzp}_dm{mdm}_dh{mhs}".format(**point)
+    for c in COUPLINGS:
+        # samples without reweighting always carry their dark matter coupling, the one of reweighted samples
+        # is only the starting point of the reweighting in g(x)
+        if c == "gx" and point["reweight"]:
+            continue
+        if (c == "gx" and not point["reweight"]) or abs(point[c] - NOMINAL[c]) > 1.0e-9:
+            name += "_{c}{v}".format(c=c, v=coupling_label(point[c]))
+    return name
+
+
+def sample_key(name, point):
+    """Identifies a sample: Reweighted samples of different starting g(x) share their name but not their DSID."""
+    return (name,) + tuple(round(float(point[c]), 6) for c in COUPLINGS) + (bool(point["reweight"]),)
+
+
+def read_mc_settings(mc_file):
+    """Returns the couplings and the reweight flag set in a mc.*.py file. Settings not given are nominal."""
+    point = dict(NOMINAL)
+    point["reweight"] = False
+    with open(mc_file) as f:
+        for line in f:
+            match = MC_SETTING.match(line)
+            if not match:
+                continue
+            if match.group(1) == "reweight":
+                point["reweight"] = match.group(2) == "True"
+            else:
+                point[match.group(1)] = float(match.group(2))
+    return point
+
+
+def scan_points(mzp, mdm, mhs, gq, gx, th, reweight):
+    return [
+        {"mzp": p[0], "mdm": p[1], "mhs": p[2], "gq": p[3], "gx": p[4], "th": p[5], "reweight": p[6]}
+        for p in itertools.product(mzp, mdm, mhs, gq, gx, th, reweight)
+    ]
+
+
+class ScanGenerator(object):
+    """Allocates DSIDs for the points of a scan and creates their job option folders.
+
+    The existing folders are indexed once by the name of their mc.*.py file together with the couplings and the
+    reweight flag set in it, points which already have a DSID are not created again. New DSIDs are the free numbers of the blocks of the reweight setting.
+    """
+
+    def __init__(self, joboptions_dir, events_per_job=10000):
+        self.__joboptions_dir = joboptions_dir
+        self.__events_per_job = events_per_job
+        self.__existing = {}
+        self.__used = set()
+        self.__next = dict((r, b * 1000) for r, b in FIRST_BLOCK.items())
+        self.__index()
+
+    def __index(self):
+        for block in os.listdir(self.__joboptions_dir):
+            if not BLOCK_FOLDER.match(block):
+                continue
+            block_dir = os.path.join(self.__joboptions_dir, block)
+            for dsid in os.listdir(block_dir):
+                if not dsid.isdigit():
+                    continue
+                self.__used.add(int(dsid))
+                for f in os.listdir(os.path.join(block_dir, dsid)):
+                    if f.startswith("mc.") and f.endswith(".py"):
+                        point = read_mc_settings(os.path.join(block_dir, dsid, f))
+                        self.__existing[sample_key(f[3:-3], point)] = int(dsid)
+
+    def dsid_dir(self, dsid):
+        return os.path.join(self.__joboptions_dir, "{ddd}xxx".format(ddd=str(dsid)[:3]), str(dsid))
+
+    def __allocate(self, reweight):
+        dsid = self.__next[reweight]
+        while dsid in self.__used:
+            dsid += 1
+            if dsid % 1000 == 0:
+                # the next block with the same reweight setting
+                dsid += 1000
+        self.__used.add(dsid)
+        self.__next[reweight] = dsid
+        return dsid
+
+    def __master_dir(self, dsid):
+        """Folder holding the template of the block of the DSID, otherwise the one of the first block."""
+        for master in [int(dsid) // 1000 * 1000, FIRST_BLOCK[True] * 1000]:
+            template = os.path.join(self.dsid_dir(master), TEMPLATE)
+            if os.path.isfile(template) and not os.path.islink(template):
+                return self.dsid_dir(master)
+        return None
+
+    def __materialise(self, dsid, point, name):
+        master = self.__master_dir(dsid)
+        if not master:
+            logging.error("<ScanGenerator::materialise>: No folder with the template {t} found.".format(t=TEMPLATE))
+            return False
+        out_dir = self.dsid_dir(dsid)
+        CreateDirectory(out_dir, False)
+        with open(os.path.join(out_dir, "mc.%s.py" % (name)), "w") as mc_file:
+            mc_file.write(
+                MC_FILE.format(
+                    gq=coupling_str(point["gq"]),
+                    gx=coupling_str(point["gx"]),
+                    th=coupling_str(point["th"]),
+                    events=self.__events_per_job,
+                    reweight=str(point["reweight"]),
+                    template=TEMPLATE,
+                )
+            )
+        for f in SHARED_FILES:
+            os.symlink(os.path.relpath(os.path.join(master, f), out_dir), os.path.join(out_dir, f))
+        return True
+
+    ### Returns the scan table with the DSID of each point, the folders of new points are created
+    def generate(self, points):
+        scan = TaskManifest(SCAN_COLUMNS)
+        n_new = 0
+        in_scan = set()
+        for point in points:
+            name = physics_short(point)
+            key = sample_key(name, point)
+            if key in in_scan:
+                continue
+            in_scan.add(key)
+            dsid = self.__existing.get(key)
+            if dsid is None:
+                dsid = self.__allocate(point["reweight"])
+                if not self.__materialise(dsid, point, name):
+                    return None
+                self.__existing[key] = dsid
+                n_new += 1
+            scan.add(dsid=dsid, job_option="mc.%s.py" % (name), **point)
+        logging.info(
+            "INFO <ScanGenerator::generate> {n} samples, {c} new job option folders created".format(n=len(scan), c=n_new)
+        )
+        return scan
+
+
+def main():
+    RunOptions = getArguments().parse_args()
+    start = time.time()
+    points = scan_points(
+        RunOptions.mzp,
+        RunOptions.mdm,
+        RunOptions.mhs,
+        RunOptions.gq,
+        RunOptions.gx,
+        RunOptions.th,
+        [r == "True" for r in RunOptions.reweight],
+    )
+    scan = ScanGenerator(RunOptions.jobOptionsDir, RunOptions.eventsPerJob).generate(points)
+    if scan is None:
+        sys.exit("ERROR: The job option folders of the scan could not be created")
+    if RunOptions.scanName:
+        scan.write(os.path.join(RunOptions.jobOptionsDir, "scans", "%s.txt" % (RunOptions.scanName)))
+    logging.info("INFO <ScanGenerator> Job options of the scan ready after %.1f s" % (time.time() - start))
+    if RunOptions.noSubmit:
+        return
+    submit(RunOptions, sorted(set(int(d) for d in scan.column("dsid"))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+from ClusterSubmission.Utils import CreateDirectory
+import fcntl
+import os
+import re
+import logging
+
+# name of the EVNT files written by batch_evgen.sh
+EVNT_FILE = re.compile(r"^mc16_13TeV\.(\d+)\.EVNT\.(\d+)\.pool\.root$")
+
+
+class SeedRegistry(object):
+    """Persistent registry of the random seeds.
+
+    Seeds are handed out in contiguous blocks from a single counter shared by all DSIDs: the registry only stores
+    the next free seed, which is advanced under a file lock, so concurrent submissions never obtain the same seed
+    and no two DSIDs run with the same random streams.
+    The seeds of successful jobs are appended to <DSID>.valid by batch_evgen.sh.
+    """
+
+    def __init__(self, registry_dir, evgen_dir="", first_seed=100000):
+        self.__registry_dir = registry_dir
+        self.__evgen_dir = evgen_dir
+        self.__first_seed = first_seed
+        CreateDirectory(registry_dir, False)
+
+    def registry_dir(self):
+        return self.__registry_dir
+
+    def next_file(self):
+        return os.path.join(self.__registry_dir, "seeds.next")
+
+    def valid_file(self, run):
+        return os.path.join(self.__registry_dir, "%d.valid" % (run))
+
+    def lock_file(self):
+        return os.path.join(self.__registry_dir, "seeds.lock")
+
+    def __free_seed(self):
+        # first seed above the ones recorded by earlier registries, which kept one counter per DSID
+        first = self.__first_seed
+        for f in os.listdir(self.__registry_dir):
+            if not f.endswith(".next") and not f.endswith(".valid"):
+                continue
+            with open(os.path.join(self.__registry_dir, f)) as seed_file:
+                seeds = [int(s) for s in seed_file.read().split()]
+            first = max([first] + [s if f.endswith(".next") else s + 1 for s in seeds])
+        return first
+
+    def __existing_seeds(self, run):
+        # seeds of EVNT files produced before the registry was introduced
+        run_dir = os.path.join(self.__evgen_dir, str(run))
+        if not self.__evgen_dir or not os.path.isdir(run_dir):
+            return []
+        seeds = []
+        for f in os.listdir(run_dir):
+            match = EVNT_FILE.match(f)
+            if match:
+                seeds += [int(match.group(2))]
+        return seeds
+
+    ### Reserves a block of n contiguous seeds for the DSID and returns them
+    def allocate(self, run, n):
+        with open(self.lock_file(), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                if os.path.exists(self.next_file()):
+                    with open(self.next_file()) as f:
+                        first = int(f.read().strip())
+                else:
+                    first = self.__free_seed()
+                # start above all seeds already in use by the DSID
+                first = max([first] + [s + 1 for s in self.__existing_seeds(run) + self.valid_seeds(run)])
+                tmp_file = "%s.%d" % (self.next_file(), os.getpid())
+                with open(tmp_file, "w") as f:
+                    f.write("%d\n" % (first + n))
+                os.rename(tmp_file, self.next_file())
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        logging.info(
+            "<SeedRegistry::allocate> Reserved seeds {f}-{l} for DSID {r}".format(f=first, l=first + n - 1, r=run)
+        )
+        return [first + i for i in range(n)]
+
+    ### Seeds of the DSID which produced a valid EVNT file
+    def valid_seeds(self, run):
+        if not os.path.exists(self.valid_file(run)):
+            return []
+        with open(self.valid_file(run)) as f:
+            return [int(s) for s in f.read().split()]
@@ -0,0 +1,128 @@
+from ClusterSubmission.Utils import CreateDirectory
+from TaskManifest import TaskManifest
+import compileall
+import hashlib
+import os
+import shutil
+import tempfile
+import zipfile
+import logging
+
+# modification time given to the model sources before they are compiled. stage_bundle.sh sets the same time
+# on the extracted sources such that the shipped byte code is recognised as up to date
+SOURCE_EPOCH = 946684800
+
+
+def file_digest(path, block_size=1 << 20):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class StagingBundle(object):
+    """Zip file with everything the event generation tasks read from the submission host.
+
+    Layout of the bundle:
+        objects/<sha1>     content of the job option files, each distinct file is stored once
+        jobOptions.txt     task manifest mapping <DSID>/<file name> to the object holding its content
+        models/            the UFO models with their byte code, extracted by stage_bundle.sh
+    The bundle is named after the hash of its content, hence a bundle with the same content is only written once.
+    """
+
+    def __init__(self, bundle_dir):
+        self.__bundle_dir = bundle_dir
+        self.__objects = {}
+        self.__job_options = TaskManifest(["path", "digest"])
+        self.__model_dir = ""
+        self.__model_files = []
+        self.__location = ""
+
+    def bundle_dir(self):
+        return self.__bundle_dir
+
+    def location(self):
+        return self.__location
+
+    def n_objects(self):
+        return len(self.__objects)
+
+    def n_job_option_files(self):
+        return len(self.__job_options)
+
+    ### Adds the files of a job option folder (symbolic links are followed) as <run>/<file name>
+    def add_job_options(self, run, job_option_dir):
+        for name in sorted(os.listdir(job_option_dir)):
+            path = os.path.join(job_option_dir, name)
+            if not os.path.isfile(path):
+                continue
+            digest = file_digest(path)
+            self.__objects.setdefault(digest, path)
+            self.__job_options.add(path="%d/%s" % (run, name), digest=digest)
+        return True
+
+    ### Copies the models directory to a temporary place and compiles it there
+    def add_models(self, models_dir):
+        if not os.path.isdir(models_dir):
+            logging.error("<StagingBundle::add_models>: {d} is not a directory.".format(d=models_dir))
+            return False
+        self.__model_dir = tempfile.mkdtemp(prefix="models_")
+        staged = os.path.join(self.__model_dir, "models")
+        shutil.copytree(models_dir, staged, symlinks=False, ignore=shutil.ignore_patterns("*.pyc", "__pycache__"))
+        for root, dirs, files in os.walk(staged):
+            for f in files:
+                os.utime(os.path.join(root, f), (SOURCE_EPOCH, SOURCE_EPOCH))
+        compileall.compile_dir(staged, quiet=1)
+        for root, dirs, files in os.walk(staged):
+            for f in sorted(files):
+                path = os.path.join(root, f)
+                self.__model_files += [(os.path.relpath(path, self.__model_dir), path)]
+        return True
+
+    def __clean_models(self):
+        if self.__model_dir and os.path.isdir(self.__model_dir):
+            shutil.rmtree(self.__model_dir)
+        self.__model_dir = ""
+
+    def digest(self):
+        digest = hashlib.sha1()
+        for r in self.__job_options.records():
+            digest.update(("%s %s\n" % (r["path"], r["digest"])).encode())
+        for arc_name, path in self.__model_files:
+            # the byte code follows from the sources
+            if arc_name.endswith(".py"):
+                digest.update(("%s %s\n" % (arc_name, file_digest(path))).encode())
+        return digest.hexdigest()
+
+    def write(self):
+        self.__location = os.path.join(self.__bundle_dir, "%s.zip" % (self.digest()))
+        if os.path.exists(self.__location):
+            logging.info("INFO <StagingBundle::write> Reuse the bundle {b}".format(b=self.__location))
+            self.__clean_models()
+            return True
+        CreateDirectory(self.__bundle_dir, False)
+        manifest_file = os.path.join(tempfile.mkdtemp(prefix="bundle_"), "jobOptions.txt")
+        self.__job_options.write(manifest_file)
+        tmp_file = "%s.%d" % (self.__location, os.getpid())
+        with zipfile.ZipFile(tmp_file, "w", zipfile.ZIP_DEFLATED) as bundle:
+            bundle.write(manifest_file, "jobOptions.txt")
+            for digest in sorted(self.__objects.keys()):
+                bundle.write(self.__objects[digest], "objects/%s" % (digest))
+            for arc_name, path in self.__model_files:
+                bundle.write(path, arc_name)
+        shutil.rmtree(os.path.dirname(manifest_file))
+        self.__clean_models()
+        os.rename(tmp_file, self.__location)
+        logging.info(
+            "INFO <StagingBundle::write> Wrote {b} with {n} job option files in {o} objects and {m} model files".format(
+                b=self.__location,
+                n=self.n_job_option_files(),
+                o=self.n_objects(),
+                m=len(self.__model_files),
+            )
+        )
+        return True
@@ -0,0 +1,69 @@
+from ClusterSubmission.Utils import WriteList, ReadListFromFile
+import logging
+
+
+class TaskManifest(object):
+    """Task records of a job array gathered in memory and written once as a tab separated table.
+
+    The first line of the file is a comment holding the column names. Each further line is one task,
+    i.e. line i corresponds to the task ID i of the array.
+    """
+
+    def __init__(self, columns=[]):
+        self.__columns = [c for c in columns]
+        self.__records = []
+
+    def columns(self):
+        return self.__columns
+
+    def __len__(self):
+        return len(self.__records)
+
+    def add(self, **record):
+        missing = [c for c in self.__columns if c not in record]
+        if missing:
+            logging.error(
+                "<TaskManifest::add>: the columns {m} are missing in the record.".format(
+                    m=", ".join(missing)
+                )
+            )
+            return False
+        self.__records += [tuple(str(record[c]) for c in self.__columns)]
+        return True
+
+    def column(self, name):
+        i = self.__columns.index(name)
+        return [r[i] for r in self.__records]
+
+    ### Puts the tasks into the given order of their current indices
+    def reorder(self, order):
+        self.__records = [self.__records[i] for i in order]
+
+    def records(self):
+        return [dict(zip(self.__columns, r)) for r in self.__records]
+
+    def write(self, location):
+        return WriteList(
+            ["# " + "\t".join(self.__columns)] + ["\t".join(r) for r in self.__records],
+            location,
+        )
+
+    ### Writes a single column as plain list, one line per task, together with its line-offset index
+    ### such that the batch scripts can look up their line directly (get_list_entry)
+    def export(self, name, location):
+        return WriteList(self.column(name), location, index=True)
+
+    @classmethod
+    def read(cls, location):
+        with open(location) as f:
+            header = f.readline()
+        if not header.startswith("#"):
+            logging.error("<TaskManifest::read>: {l} has no column header.".format(l=location))
+            return None
+        manifest = cls(header[1:].split())
+        for line in ReadListFromFile(location):
+            fields = line.split("\t")
+            # empty trailing fields are lost by the stripping of the lines
+            fields += ["" for i in range(len(manifest.columns()) - len(fields))]
+            manifest.add(**dict(zip(manifest.columns(), fields)))
+        return manifest
@@ -0,0 +1,146 @@
+#! /usr/bin/env python
+from ClusterSubmission.Utils import ReadListFromFile, WriteList
+import argparse
+import os
+import re
+import logging
+
+logging.basicConfig(format="%(levelname)s : %(message)s", level=logging.INFO)
+
+# Pythia8 statistics row with the number of tried, selected and accepted events
+PYTHIA_SUM = re.compile(r"\|\s*sum\s*\|\s*(\d+)\s+(\d+)\s+(\d+)\s*\|")
+PHYSICS_SHORT = re.compile(r"_zp(\d+)_dm(\d+)_dh(\d+)")
+MERGING_SCALE = re.compile(r"Merging:TMS\s*=\s*([0-9.]+)")
+
+
+def getArguments():
+    USERNAME = os.getenv("USER")
+    parser = argparse.ArgumentParser(
+        description="Measure the CKKW-L merging acceptance from the log.generate files "
+        "kept next to the EVNT files and update the acceptance table of the job options."
+    )
+    parser.add_argument(
+        "--evgenDir",
+        help="Directory containing the EVNT/<DSID> output folders",
+        default="/nfs/dust/atlas/user/{username}/MC/EVNT".format(username=USERNAME),
+    )
+    parser.add_argument(
+        "--tables",
+        help="Acceptance tables to update",
+        nargs="+",
+        default=[
+            "../110xxx/110000/monoSbb_acceptance.dat",
+            "../111xxx/111000/monoSbb_acceptance.dat",
+        ],
+    )
+    parser.add_argument(
+        "--minTried",
+        help="Minimum number of showered LHE events of a mass point before its measurement is written. "
+        "The job option uses every row of the table",
+        type=int,
+        default=1000,
+    )
+    return parser
+
+
+def ktdurham_from_mhs(mhs):
+    # same choice as in the job option
+    return max(int(mhs / 4), 40)
+
+
+def parse_generate_log(log_file):
+    """Returns ((mzp, mdm, mhs, ktdurham), tried, accepted) or None if the log is incomplete."""
+    point = None
+    ktdurham = None
+    counts = None
+    with open(log_file) as log:
+        for line in log:
+            if point is None:
+                match = PHYSICS_SHORT.search(line)
+                if match:
+                    point = tuple(int(x) for x in match.groups())
+            if ktdurham is None:
+                match = MERGING_SCALE.search(line)
+                if match:
+                    ktdurham = int(float(match.group(1)))
+            match = PYTHIA_SUM.search(line)
+            if match:
+                counts = (int(match.group(1)), int(match.group(3)))
+    if point is None or counts is None:
+        return None
+    if ktdurham is None:
+        ktdurham = ktdurham_from_mhs(point[2])
+    return point + (ktdurham,), counts[0], counts[1]
+
+
+def read_table(table):
+    entries = {}
+    if not os.path.exists(table):
+        return entries
+    for line in ReadListFromFile(table):
+        fields = line.split()
+        if len(fields) != 6:
+            continue
+        entries[tuple(int(x) for x in fields[:4])] = (int(fields[4]), int(fields[5]))
+    return entries
+
+
+def write_table(entries, table):
+    content = [
+        "# CKKW-L merging acceptance measured from previous productions",
+        "# mzp mdm mhs ktdurham tried accepted",
+    ]
+    for key in sorted(entries.keys()):
+        content += ["%d %d %d %d %d %d" % (key + entries[key])]
+    return WriteList(content, table)
+
+
+def main():
+    options = getArguments().parse_args()
+    if not os.path.isdir(options.evgenDir):
+        logging.error("EVNT directory {d} does not exist.".format(d=options.evgenDir))
+        exit(1)
+
+    measured = {}
+    for run in sorted(os.listdir(options.evgenDir)):
+        run_dir = os.path.join(options.evgenDir, run)
+        if not os.path.isdir(run_dir):
+            continue
+        for log_file in os.listdir(run_dir):
+            if not log_file.endswith(".log") or ".EVNT." not in log_file:
+                continue
+            result = parse_generate_log(os.path.join(run_dir, log_file))
+            if not result:
+                continue
+            key, tried, accepted = result
+            old_tried, old_accepted = measured.get(key, (0, 0))
+            measured[key] = (old_tried + tried, old_accepted + accepted)
+
+    # the job option uses every row of the table, hence only measurements with enough showered events are written
+    for key in sorted(measured.keys()):
+        if measured[key][0] < options.minTried:
+            logging.warning(
+                "Only {t} LHE events were showered for mzp={0} mdm={1} mhs={2} ktdurham={3}, the point is not updated.".format(
+                    *key, t=measured[key][0]
+                )
+            )
+            del measured[key]
+    logging.info("Measured the merging acceptance for {n} mass points.".format(n=len(measured)))
+    for key in sorted(measured.keys()):
+        tried, accepted = measured[key]
+        logging.info(
+            "   +-=- mzp={0} mdm={1} mhs={2} ktdurham={3}: {4}/{5} = {6:.3f}".format(
+                *(key + (accepted, tried, float(accepted) / tried))
+            )
+        )
+
+    for table in options.tables:
+        # points without any log left on disk keep their previous measurement
+        entries = read_table(table)
+        entries.update(measured)
+        write_table(dict((k, v) for k, v in entries.items() if v[0] >= options.minTried), table)
+        logging.info("Updated {t}".format(t=table))
+
+
+if __name__ == "__main__":
+    main()
@@ -5,17 +5,23 @@ from ClusterSubmission.Utils import (
     WriteList,
     ReadListFromFile,
     CreateDirectory,
+    TimeToSeconds,
     id_generator,
     ResolvePath,
     setup_engine,
     setupBatchSubmitArgParser,
 )
 from ClusterSubmission.ClusterEngine import TESTAREA, ATLASVERSION, ATLASPROJECT
+from RuntimeModel import RuntimeModel, SecondsToTime, lpt_order, predicted_makespan
+from DerivationPlanner import DerivationPlanner
+from OutputCatalogue import OutputCatalogue
+from SeedRegistry import SeedRegistry
+from StagingBundle import StagingBundle
+from TaskManifest import TaskManifest
+import math
 import os
-import random
 import sys
 import logging
-import shutil
 
 
 def getArguments():
@@ -44,6 +50,61 @@ def getArguments():
         type=int,
         default=10000,
     )
+    parser.add_argument(
+        "--autoSplit",
+        help="Choose the events per job, the number of jobs and the run time per DSID from the runtime "
+        "fitted to the logs of previous productions",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "--totalEvents",
+        help="Events per DSID if --autoSplit or --sharding is given [default: nJobs x eventsPerJob]",
+        type=int,
+        default=-1,
+    )
+    parser.add_argument(
+        "--orderByCost",
+        help="Put the event generation tasks with the longest predicted run time at the lowest array indices "
+        "and report the predicted makespan for --maxCurrentJobs",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "--targetRuntime",
+        help="Target run time per job if --autoSplit is given [default: evgen_runtime]",
+        default="",
+    )
+    parser.add_argument(
+        "--sharding",
+        help="Split the totalEvents of each DSID into shards of eventsPerJob events with contiguous event numbers",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "--mergeEventsPerFile",
+        help="Merge the shards of each DSID into EVNT files with about this number of events [default: no merging]",
+        type=int,
+        default=-1,
+    )
+    parser.add_argument(
+        "--merge_runtime",
+        help="EVNT merge job time limit [default: 4 hours]",
+        default="04:00:00",
+    )
+    parser.add_argument(
+        "--merge_memory",
+        help="EVNT merge job memory limit [default: 2 GB]",
+        default=2000,
+        type=int,
+    )
+    parser.add_argument(
+        "--resume",
+        help="Only schedule the jobs needed to reach the requested events per DSID, "
+        "counting the valid EVNT files already in <BaseFolder>/EVNT/<DSID>",
+        action="store_true",
+        default=False,
+    )
     parser.add_argument(
         "--keepOutput",
         help="Keep RunDir after task",
@@ -53,6 +114,35 @@ def getArguments():
     parser.add_argument(
         "--AthGeneration", help="Event generation release version", default="21.6.61"
     )
+    parser.add_argument(
+        "--gridpack",
+        help="Build one MadGraph gridpack per DSID and generate the events of all seeds from it",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "--procDirCache",
+        help="Share the MadGraph process directory between the jobs via a cache in the base folder",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "--procDirCacheSize",
+        help="Maximum size of the MadGraph process directory cache in MB [default: 20 GB]",
+        default=20000,
+        type=int,
+    )
+    parser.add_argument(
+        "--gridpack_runtime",
+        help="Gridpack build job time limit [default: 8 hours]",
+        default="08:00:00",
+    )
+    parser.add_argument(
+        "--gridpack_memory",
+        help="Gridpack build job memory limit [default: 4 GB]",
+        default=4000,
+        type=int,
+    )
 
     parser.add_argument(
         "--noDerivationJob",
@@ -68,9 +158,17 @@ def getArguments():
     parser.add_argument(
         "--AthDerivation", help="Derivation release version", default="21.2.63.0"
     )
+    parser.add_argument(
+        "--streamDerivations",
+        help="Start the derivation of each EVNT file as soon as its event generation task has finished instead of waiting for the entire event generation array.",
+        action="store_true",
+    )
 
     parser.add_argument(
-        "--nCores", help="Number of cores per node.", type=int, default=1
+        "--nCores",
+        help="Number of cores per event generation task. Sets the core request of the batch system, the number of AthenaMP workers and the MadGraph cores.",
+        type=int,
+        default=1,
     )
     parser.add_argument(
         "--evgen_runtime",
@@ -83,6 +181,12 @@ def getArguments():
         default=4000,
         type=int,
     )
+    parser.add_argument(
+        "--evgen_memory_per_core",
+        help="Additional memory of an event generation task per further core in multi-core mode [default: 2 GB]",
+        default=2000,
+        type=int,
+    )
     parser.add_argument(
         "--deriv_runtime",
         help="Derivation job time limit [default: 8 hours]",
@@ -146,6 +250,7 @@ class EvGenSubmit(object):
         evgenRelease="AthGeneration",
         cores_to_use=1,
         memory=1200,
+        memory_per_core=2000,
         run_time="12:00:00",
         keep_output=False,
         joboptions_dir="",
@@ -154,6 +259,20 @@ class EvGenSubmit(object):
         preInclude="",
         postExec="",
         postInclude="",
+        gridpack=False,
+        gridpack_memory=4000,
+        gridpack_run_time="08:00:00",
+        proc_dir_cache=False,
+        proc_dir_cache_size=20000,
+        auto_split=False,
+        total_events=-1,
+        target_runtime="",
+        sharding=False,
+        merge_events=-1,
+        merge_memory=2000,
+        merge_run_time="04:00:00",
+        resume=False,
+        order_by_cost=False,
     ):
         self.__cluster_engine = cluster_engine
         self.__nJobs = nJobs
@@ -171,11 +290,41 @@ class EvGenSubmit(object):
 
         self.__n_scheduled = 0
         self.__run_time = run_time
-        self.__mem = memory
+        # the workers of a multi-core task each need their own memory on top of the single-core one
+        self.__mem = memory + (cores_to_use - 1) * memory_per_core
         self.__hold_jobs = [h for h in hold_jobs]
         self.__keep_out = keep_output
         self.__joboptions_dir = joboptions_dir
         self.__models_dir = models_dir
+        self.__gridpack = gridpack
+        self.__gridpack_mem = gridpack_memory + (cores_to_use - 1) * memory_per_core
+        self.__gridpack_run_time = gridpack_run_time
+        self.__n_gridpacks = 0
+        self.__proc_dir_cache = proc_dir_cache
+        self.__proc_dir_cache_size = proc_dir_cache_size
+        self.__total_events = total_events if total_events > 0 else nJobs * eventsPerJob
+        self.__target_runtime = target_runtime if len(target_runtime) > 0 else run_time
+        self.__runtime_model = None
+        self.__order_by_cost = order_by_cost
+        self.__sharding = sharding
+        self.__merge_events = merge_events if sharding else -1
+        self.__merge_mem = merge_memory
+        self.__merge_run_time = merge_run_time
+        self.__n_merge = 0
+        self.__catalogue = OutputCatalogue(self.catalogue_dir(), self.evgen_dir()) if resume else None
+        self.__seed_registry = SeedRegistry(self.seed_registry_dir(), self.evgen_dir())
+        self.__tasks = TaskManifest(
+            ["seed", "run", "job_option", "out_dir", "events", "first_event", "gridpack"]
+        )
+        self.__gridpack_tasks = TaskManifest(["run", "job_option", "out_file"])
+        self.__merge_tasks = TaskManifest(["in_files", "out_file"])
+        self.__bundle = StagingBundle(self.bundle_dir())
+        if auto_split:
+            self.__runtime_model = RuntimeModel(
+                evgen_dir=self.evgen_dir(), joboptions_dir=joboptions_dir
+            )
+            # the run time of the array is the longest predicted run time of all DSIDs
+            self.__run_time = "00:00:00"
         self.__get_job_options(sorted(ClearFromDuplicates(run_numbers)))
 
     def engine(self):
@@ -209,60 +358,193 @@ class EvGenSubmit(object):
             dir_to_copy = os.path.join(jobFolder, str(r))
             if len(dir_to_copy) == 0:
                 continue
-            shutil.copytree(
-                dir_to_copy, os.path.join(self.engine().config_dir(), str(r))
-            )
 
-            # assemble the config file for the job option
-            seeds = []
-            while len(seeds) < self.__nJobs:
-                s = random.uniform(100000, 500000)
-                if s not in seeds:
-                    seeds += [s]
+            total_events = self.__total_events
+            first_event = 1
+            if self.__catalogue:
+                produced = self.__catalogue.valid_events(r)
+                invalid = self.__catalogue.invalid(r)
+                if len(invalid) > 0:
+                    logging.warning(
+                        "DSID {r} has {n} invalid EVNT files which are not counted: {f}".format(
+                            r=r, n=len(invalid), f=", ".join(invalid)
+                        )
+                    )
+                total_events -= produced
+                if total_events <= 0:
+                    logging.info(
+                        "INFO <__get_job_options> DSID {r} already has {p} valid events. Skipping {r}...".format(
+                            r=r, p=produced
+                        )
+                    )
+                    # complete DSIDs whose merging never ran, e.g. after a shard of another DSID failed
+                    if self.__merge_events > 0 and not self.__is_merged(r):
+                        self.__schedule_merge(r, self.__valid_shards(r))
+                    continue
+                # the new shards continue the event numbering
+                first_event = self.__catalogue.last_event(r) + 1
+                logging.info(
+                    "INFO <__get_job_options> DSID {r}: {p} valid events found, {m} events missing".format(
+                        r=r, p=produced, m=total_events
+                    )
+                )
 
-            jo = [os.path.join(self.engine().config_dir(), str(r))][0]
-            out_dir = os.path.join(self.evgen_dir(), str(r))
+            # the job options are shipped in the bundle, each distinct file is stored once
+            self.__bundle.add_job_options(r, dir_to_copy)
 
-            WriteList(
-                (
-                    ReadListFromFile(self.seed_file())
-                    if os.path.exists(self.seed_file())
-                    else []
+            n_jobs = self.__nJobs
+            events_per_job = self.__events_per_job
+            if self.__runtime_model:
+                events_per_job, n_jobs, run_time = self.__runtime_model.split(
+                    r, total_events, self.__target_runtime
                 )
-                + ["%d" % (i) for i in seeds],
-                self.seed_file(),
-            )
-            WriteList(
-                (
-                    ReadListFromFile(self.run_file())
-                    if os.path.exists(self.run_file())
-                    else []
+                logging.info(
+                    "INFO <__get_job_options> DSID {r}: {n} jobs with {e} events, predicted run time {t}{m}".format(
+                        r=r,
+                        n=n_jobs,
+                        e=events_per_job,
+                        t=run_time,
+                        m="" if self.__runtime_model.measured(r) else " (estimated from similar DSIDs)",
+                    )
                 )
-                + ["%d" % (r) for i in range(self.__nJobs)],
-                self.run_file(),
+                if TimeToSeconds(run_time) > TimeToSeconds(self.__run_time):
+                    self.__run_time = run_time
+            elif self.__sharding or self.__catalogue:
+                n_jobs = int(math.ceil(float(total_events) / events_per_job))
+
+            if self.__sharding:
+                # contiguous event numbers, the last shard takes the remaining events
+                events = [
+                    min(events_per_job, total_events - i * events_per_job)
+                    for i in range(n_jobs)
+                ]
+                first_events = [first_event + i * events_per_job for i in range(n_jobs)]
+            else:
+                events = [events_per_job for i in range(n_jobs)]
+                first_events = [1 for i in range(n_jobs)]
+
+            # assemble the config file for the job option
+            seeds = self.__seed_registry.allocate(r, n_jobs)
+
+            # relative to the job option folder of the staged bundle
+            jo = str(r)
+            out_dir = os.path.join(self.evgen_dir(), str(r))
+
+            gridpack = os.path.join(
+                self.gridpack_dir(), str(r), "{r}.GRID.tar.gz".format(r=r)
             )
-            WriteList(
-                (
-                    ReadListFromFile(self.job_file())
-                    if os.path.exists(self.job_file())
-                    else []
+            for i in range(n_jobs):
+                self.__tasks.add(
+                    seed="%d" % (seeds[i]),
+                    run="%d" % (r),
+                    job_option=jo,
+                    out_dir=out_dir,
+                    events="%d" % (events[i]),
+                    first_event="%d" % (first_events[i]),
+                    gridpack=gridpack if self.__gridpack else "",
                 )
-                + [jo for i in range(self.__nJobs)],
-                self.job_file(),
+            if self.__merge_events > 0:
+                # the names of the shards are fixed by batch_evgen.sh
+                shards = [
+                    (os.path.join(out_dir, "mc16_13TeV.%d.EVNT.%d.pool.root" % (r, seeds[i])), events[i])
+                    for i in range(n_jobs)
+                ]
+                self.__schedule_merge(r, (self.__valid_shards(r) if self.__catalogue else []) + shards)
+            if self.__gridpack:
+                self.__gridpack_tasks.add(run="%d" % (r), job_option=jo, out_file=gridpack)
+                self.__n_gridpacks += 1
+
+            # submit the job array
+            self.__n_scheduled += n_jobs
+            logging.info("INFO <__get_job_options> Found %s" % (dir_to_copy))
+        if self.__n_scheduled > 0 and not self.__write_bundle():
+            logging.error("<__get_job_options>: The job options could not be bundled.")
+            self.__n_scheduled = 0
+            return
+        if self.__order_by_cost:
+            self.__order_tasks()
+        self.__write_manifests()
+
+    def __order_tasks(self):
+        # the most expensive tasks start first, such that they do not end up in the tail when the
+        # number of running tasks is limited
+        model = self.__runtime_model
+        if not model:
+            model = RuntimeModel(evgen_dir=self.evgen_dir(), joboptions_dir=self.__joboptions_dir)
+        costs = [model.predict(int(r["run"]), int(r["events"])) for r in self.__tasks.records()]
+        order = lpt_order(costs)
+        slots = self.engine().max_running_per_array()
+        logging.info(
+            "INFO <__order_tasks> Predicted makespan of {n} tasks on {s} slots: {b} in submission order, {a} longest task first".format(
+                n=len(costs),
+                s=slots if slots > 0 else len(costs),
+                b=SecondsToTime(predicted_makespan(costs, slots)),
+                a=SecondsToTime(predicted_makespan([costs[i] for i in order], slots)),
             )
-            WriteList(
-                (
-                    ReadListFromFile(self.out_file())
-                    if os.path.exists(self.out_file())
-                    else []
-                )
-                + [out_dir for i in range(self.__nJobs)],
-                self.out_file(),
+        )
+        self.__tasks.reorder(order)
+
+    def __write_bundle(self):
+        if len(self.__models_dir) > 0 and not self.__bundle.add_models(self.__models_dir):
+            return False
+        return self.__bundle.write()
+
+    def __write_manifests(self):
+        # all task records are written at once, the batch scripts read the per-column lists
+        self.__tasks.write(self.manifest_file())
+        for column, location in [
+            ("seed", self.seed_file()),
+            ("run", self.run_file()),
+            ("job_option", self.job_file()),
+            ("out_dir", self.out_file()),
+            ("events", self.events_file()),
+            ("first_event", self.first_event_file()),
+        ] + ([("gridpack", self.gridpack_file())] if self.__gridpack else []):
+            self.__tasks.export(column, location)
+        if len(self.__gridpack_tasks) > 0:
+            self.__gridpack_tasks.export("run", self.gridpack_run_file())
+            self.__gridpack_tasks.export("job_option", self.gridpack_job_file())
+            self.__gridpack_tasks.export("out_file", self.gridpack_out_file())
+        if len(self.__merge_tasks) > 0:
+            self.__merge_tasks.export("in_files", self.merge_in_file())
+            self.__merge_tasks.export("out_file", self.merge_out_file())
+
+    def __valid_shards(self, run):
+        # shards of previous submissions in the order of their event numbers
+        records = sorted(
+            [r for r in self.__catalogue.entries(run) if self.__catalogue.is_valid(r)],
+            key=lambda r: int(r["last_event"]),
+        )
+        return [(os.path.join(self.evgen_dir(), str(run), r["file"]), int(r["events"])) for r in records]
+
+    def __is_merged(self, run):
+        merged = os.path.join(self.merged_dir(), str(run))
+        return os.path.isdir(merged) and any(f.endswith(".pool.root") for f in os.listdir(merged))
+
+    def __schedule_merge(self, run, shards):
+        # consecutive shards (file, events) are merged into files of at most merge_events events,
+        # the merged files of a DSID are always written from all of its shards
+        groups = []
+        n_events = 0
+        for shard, events in shards:
+            if len(groups) == 0 or n_events + events > self.__merge_events:
+                groups += [[]]
+                n_events = 0
+            groups[-1] += [shard]
+            n_events += events
+        for i, group in enumerate(groups):
+            self.__merge_tasks.add(
+                in_files=",".join(group),
+                out_file=os.path.join(
+                    self.merged_dir(),
+                    str(run),
+                    "mc16_13TeV.%d.EVNT_MRG._%05d.pool.root" % (run, i + 1),
+                ),
             )
+            self.__n_merge += 1
 
-            # submit the job array
-            self.__n_scheduled += self.__nJobs
-            logging.info("INFO <__get_job_options> Found %s" % (jo))
+    def manifest_file(self):
+        return os.path.join(self.engine().config_dir(), "EvgenTasks.txt")
 
     def seed_file(self):
         return os.path.join(self.engine().config_dir(), "Seeds.txt")
@@ -276,16 +558,138 @@ class EvGenSubmit(object):
     def out_file(self):
         return os.path.join(self.engine().config_dir(), "outDirs.txt")
 
+    def events_file(self):
+        return os.path.join(self.engine().config_dir(), "Events.txt")
+
+    def first_event_file(self):
+        return os.path.join(self.engine().config_dir(), "FirstEvents.txt")
+
+    def merge_in_file(self):
+        return os.path.join(self.engine().config_dir(), "Merge_inFiles.txt")
+
+    def merge_out_file(self):
+        return os.path.join(self.engine().config_dir(), "Merge_outFiles.txt")
+
+    def gridpack_file(self):
+        return os.path.join(self.engine().config_dir(), "Gridpacks.txt")
+
+    def gridpack_run_file(self):
+        return os.path.join(self.engine().config_dir(), "Gridpack_RunNumbers.txt")
+
+    def gridpack_job_file(self):
+        return os.path.join(self.engine().config_dir(), "Gridpack_JobOptionLoc.txt")
+
+    def gridpack_out_file(self):
+        return os.path.join(self.engine().config_dir(), "Gridpack_outFiles.txt")
+
     def evgen_dir(self):
         return os.path.join(self.engine().base_dir(), "EVNT")
 
+    def merged_dir(self):
+        return os.path.join(self.engine().base_dir(), "EVNT_MRG")
+
+    def catalogue_dir(self):
+        return os.path.join(self.engine().base_dir(), "CATALOGUE")
+
+    def catalogue(self):
+        return self.__catalogue
+
+    def seed_registry_dir(self):
+        return os.path.join(self.engine().base_dir(), "SEEDS")
+
+    def seed_registry(self):
+        return self.__seed_registry
+
+    def bundle_dir(self):
+        return os.path.join(self.engine().base_dir(), "BUNDLE")
+
+    def bundle(self):
+        return self.__bundle.location()
+
+    def multi_core_env_vars(self):
+        if self.__ev_gen_cores <= 1:
+            return []
+        # AthenaMP workers and the cores used by the generator
+        return [
+            ("ATHENA_PROC_NUMBER", str(self.__ev_gen_cores)),
+            ("ATHENA_CORE_NUMBER", str(self.__ev_gen_cores)),
+        ]
+
+    def bundle_env_vars(self):
+        return [
+            ("Bundle", self.bundle()),
+            ("BundleStager", self.engine().link_to_copy_area("SubmitMC/stage_bundle.sh")),
+        ]
+
+    def gridpack_dir(self):
+        return os.path.join(self.engine().base_dir(), "GRIDPACK")
+
+    def proc_cache_dir(self):
+        return os.path.join(self.engine().base_dir(), "PROCCACHE")
+
+    def gridpack_job_name(self):
+        return "GRIDPACK"
+
+    def merge_job_name(self):
+        return "EVNTMERGE"
+
     def slha_dir(self):
         return os.path.join(self.engine().base_dir(), "SLHA")
 
     def n_scheduled(self):
         return self.__n_scheduled
 
+    def n_merge_scheduled(self):
+        return self.__n_merge
+
+    def submit_gridpack_job(self):
+        if self.__n_gridpacks == 0:
+            logging.error("<submit_gridpack_job>: no gridpacks have been scheduled.")
+            return False
+        return self.engine().submit_array(
+            sub_job=self.gridpack_job_name(),
+            script="SubmitMC/batch_gridpack.sh",
+            mem=self.__gridpack_mem,
+            n_cores=self.__ev_gen_cores,
+            env_vars=[
+                ("RunFile", self.gridpack_run_file()),
+                ("JobFile", self.gridpack_job_file()),
+                ("OutFile", self.gridpack_out_file()),
+                ("EvgenRelease", self.__evgenRelease),
+                ("EvgenCache", self.__evgenCache),
+            ]
+            + self.bundle_env_vars()
+            + self.multi_core_env_vars(),
+            hold_jobs=self.__hold_jobs,
+            run_time=self.__gridpack_run_time,
+            array_size=self.__n_gridpacks,
+        )
+
+    def submit_merge_job(self):
+        if self.__n_merge == 0:
+            logging.error("<submit_merge_job>: no merge jobs have been scheduled.")
+            return False
+        return self.engine().submit_array(
+            sub_job=self.merge_job_name(),
+            script="SubmitMC/batch_evnt_merge.sh",
+            mem=self.__merge_mem,
+            env_vars=[
+                ("InFile", self.merge_in_file()),
+                ("OutFile", self.merge_out_file()),
+                ("EvgenRelease", self.__evgenRelease),
+                ("EvgenCache", self.__evgenCache),
+            ],
+            # the merge array holds on the entire event generation array: a single failed shard leaves EVNTMERGE,
+            # and therefore the clean-up job, waiting until the missing shards are generated with --resume
+            hold_jobs=[self.engine().subjob_name(self.job_name())] if self.__n_scheduled > 0 else [],
+            run_time=self.__merge_run_time,
+            array_size=self.__n_merge,
+        )
+
     def submit_job(self):
+        if self.__n_scheduled == 0 and self.__n_merge > 0:
+            # only complete DSIDs of a resumed production are left to merge
+            return self.submit_merge_job()
         if self.__n_scheduled == 0:
             logging.error("<submit_job>: no jobs have been scheduled.")
             return False
@@ -305,6 +709,12 @@ class EvGenSubmit(object):
 
         print(self.__events_per_job)
 
+        hold_jobs = [h for h in self.__hold_jobs]
+        if self.__gridpack:
+            if not self.submit_gridpack_job():
+                return False
+            hold_jobs += [self.engine().subjob_name(self.gridpack_job_name())]
+
         if not self.engine().submit_array(
             sub_job=self.job_name(),
             script="SubmitMC/batch_evgen.sh",
@@ -317,21 +727,31 @@ class EvGenSubmit(object):
                 ("Keep", str(self.__keep_out)),
                 ("EvgenRelease", self.__evgenRelease),
                 ("EvgenCache", self.__evgenCache),
-                ("ModelsDirectory", self.__models_dir),
                 ("NumberOfEvents", self.__events_per_job),
-                ("SeedFile", self.seed_file()),
+                ("EventsFile", self.events_file()),
+                ("FirstEventFile", self.first_event_file()),
+                ("SeedRegistry", self.seed_registry_dir()),
                 ("ExtraArgs", extra_args),
             ]
+            + self.bundle_env_vars()
+            + ([("GridpackFile", self.gridpack_file())] if self.__gridpack else [])
             + (
-                [("ATHENA_PROC_NUMBER", "{c}".format(self.__ev_gen_cores))]
-                if self.__ev_gen_cores > 1
+                [
+                    ("ProcessCache", self.proc_cache_dir()),
+                    ("ProcessCacheSize", self.__proc_dir_cache_size),
+                ]
+                if self.__proc_dir_cache
                 else []
-            ),
-            hold_jobs=self.__hold_jobs,
+            )
+            + self.multi_core_env_vars(),
+            hold_jobs=hold_jobs,
             run_time=self.__run_time,
+            n_cores=self.__ev_gen_cores,
             array_size=self.__n_scheduled,
         ):
             return False
+        if self.__n_merge > 0 and not self.submit_merge_job():
+            return False
         return True
 
 
@@ -351,9 +771,12 @@ class DerivationSubmit(object):
         preInclude="",
         postExec="",
         postInclude="",
+        streaming=False,
     ):
         self.__cluster_engine = cluster_engine
         self.__evgen_submit = evgen_submit
+        # task i of the derivation array processes the output of task i of the event generation array
+        self.__streaming = streaming and evgen_submit is not None
 
         self.__derivation = derivation
         self.__derivCache = derivationCache
@@ -368,62 +791,50 @@ class DerivationSubmit(object):
 
         self.__postExec = postExec.replace('"', "'")
         self.__postInclude = postInclude.replace('"', "'")
+        self.__planner = DerivationPlanner(
+            self.snapshot_file(), self.evgen_dir(), self.aod_dir(), self.catalogue_dir()
+        )
+        seeds, run_list, in_dirs = [], [], []
         for r in runs:
-            self.__extract_seeds(r)
+            pending = self.__extract_seeds(r)
+            seeds += [str(seed) for seed in pending]
+            run_list += [str(r) for seed in pending]
+            in_dirs += [os.path.join(self.evgen_dir(), str(r)) for seed in pending]
+        self.__planner.save()
+        logging.info(
+            "<DerivationSubmit> Listed {n} EVNT and DAOD directories, the others were unchanged since the last plan.".format(
+                n=self.__planner.n_scanned()
+            )
+        )
+        if seeds:
+            WriteList(seeds, self.seed_file(), index=True)
+            WriteList(run_list, self.run_file(), index=True)
+            WriteList(in_dirs, self.in_file(), index=True)
+            self.__n_scheduled = len(seeds)
 
     def __extract_seeds(self, run):
-        try:
-            EVNT_DIR = [
-                os.path.join(self.evgen_dir(), R)
-                for R in os.listdir(self.evgen_dir())
-                if R.startswith(str(run))
-            ][0]
-        except:
-            return
+        EVNT_DIR = os.path.join(self.evgen_dir(), str(run))
+        if not os.path.isdir(EVNT_DIR):
+            return []
         logging.info(
             "<__extract_seeds> Searching {evntdir} for EVNT files not already processed in derivation format {d}.".format(
                 evntdir=EVNT_DIR, d=self.__derivation
             )
         )
-
-        DERIVATION_DIR = os.path.join(
-            self.aod_dir(), EVNT_DIR[EVNT_DIR.rfind("/") + 1 :]
-        )
-        CreateDirectory(DERIVATION_DIR, False)
-        Evnt_Seeds = [
-            int(E[E.find("EVNT") + 5 : E.find(".pool")])
-            for E in os.listdir(EVNT_DIR)
-            if E.endswith(".root")
-        ]
-        DAOD_Seeds = [
-            int(A.split(".")[-2])
-            for A in os.listdir(DERIVATION_DIR)
-            if A.find(self.__derivation) != -1 and A.endswith(".root")
-        ]
-        Non_ProcSeeds = [seed for seed in Evnt_Seeds if seed not in DAOD_Seeds]
+        CreateDirectory(os.path.join(self.aod_dir(), str(run)), False)
+        Non_ProcSeeds = self.__planner.pending(run, self.__derivation)
         if len(Non_ProcSeeds) == 0:
-            return
+            return []
         logging.info("Extracted seeds for run {r}:".format(r=run))
         logging.info("   +-=- {s}".format(s=", ".join([str(seed) for seed in Non_ProcSeeds])))
-
-        WriteList(
-            (ReadListFromFile(self.seed_file()) if os.path.exists(self.seed_file()) else []) + [str(seed) for seed in Non_ProcSeeds],
-            self.seed_file(),
-        )
-        WriteList(
-            (ReadListFromFile(self.run_file()) if os.path.exists(self.run_file()) else []) + [str(run) for seed in Non_ProcSeeds],
-            self.run_file(),
-        )
-        WriteList(
-            (ReadListFromFile(self.in_file()) if os.path.exists(self.in_file()) else []) + [EVNT_DIR for seed in Non_ProcSeeds],
-            self.in_file(),
-        )
-        self.__n_scheduled += len(Non_ProcSeeds)
+        return Non_ProcSeeds
 
     def hold_jobs(self):
+        if self.__streaming:
+            return self.__hold_jobs + [(self.engine().subjob_name(self.evgen().job_name()), -1)]
         if self.evgen():
-            return [(self.engine().subjob_name(self.evgen().job_name()))]
-        return []
+            return self.__hold_jobs + [self.engine().subjob_name(self.evgen().job_name())]
+        return self.__hold_jobs
 
     def n_scheduled(self):
         if self.evgen():
@@ -456,6 +867,12 @@ class DerivationSubmit(object):
     def aod_dir(self):
         return os.path.join(self.engine().base_dir(), "TRUTH/")
 
+    def catalogue_dir(self):
+        return os.path.join(self.engine().base_dir(), "CATALOGUE")
+
+    def snapshot_file(self):
+        return os.path.join(self.catalogue_dir(), "DirectorySnapshot.txt")
+
     def in_file(self):
         if self.evgen():
             return self.evgen().out_file()
@@ -476,6 +893,7 @@ class DerivationSubmit(object):
                 for D in ReadListFromFile(self.in_file())
             ],
             self.out_file(),
+            index=True,
         )
 
         extra_args = ""
@@ -524,7 +942,11 @@ def main():
 
     if len(runNumbersList) == 0:
         sys.exit("ERROR: Please give at least one MC sample to generate")
+    submit(RunOptions, runNumbersList)
+
 
+### Submits the event generation and the derivations of the given DSIDs
+def submit(RunOptions, runNumbersList):
     cluster_engine = setup_engine(RunOptions)
     evgen_submit = EvGenSubmit(
         cluster_engine=cluster_engine,
@@ -538,16 +960,34 @@ def main():
         evgenRelease="AthGeneration",
         evgenCache=RunOptions.AthGeneration,
         memory=RunOptions.evgen_memory,
+        memory_per_core=RunOptions.evgen_memory_per_core,
         run_time=RunOptions.evgen_runtime,
         preInclude=RunOptions.evgen_preInclude,
         postInclude=RunOptions.evgen_postInclude,
         preExec=RunOptions.evgen_preExec,
         postExec=RunOptions.evgen_postExec,
+        gridpack=RunOptions.gridpack,
+        gridpack_memory=RunOptions.gridpack_memory,
+        gridpack_run_time=RunOptions.gridpack_runtime,
+        proc_dir_cache=RunOptions.procDirCache,
+        proc_dir_cache_size=RunOptions.procDirCacheSize,
+        auto_split=RunOptions.autoSplit,
+        total_events=RunOptions.totalEvents,
+        target_runtime=RunOptions.targetRuntime,
+        sharding=RunOptions.sharding,
+        merge_events=RunOptions.mergeEventsPerFile,
+        merge_memory=RunOptions.merge_memory,
+        merge_run_time=RunOptions.merge_runtime,
+        resume=RunOptions.resume,
+        order_by_cost=RunOptions.orderByCost,
     )
+    if RunOptions.resume and evgen_submit.n_scheduled() == 0 and evgen_submit.n_merge_scheduled() == 0:
+        logging.info("All DSIDs have already reached the requested number of events.")
+        exit(0)
     if not evgen_submit.submit_job():
         exit(1)
 
-    for derivation in RunOptions.derivations:
+    for derivation in RunOptions.derivations if evgen_submit.n_scheduled() > 0 else []:
         daod_submit = DerivationSubmit(
                      cluster_engine = cluster_engine,
                      evgen_submit = evgen_submit,
@@ -560,11 +1000,16 @@ def main():
                      postInclude=RunOptions.deriv_postInclude,
                      preExec= RunOptions.deriv_preExec,
                      postExec=RunOptions.deriv_postExec,
+                     streaming=RunOptions.streamDerivations,
                      )
         if not daod_submit.submit_job():
            exit(1)
-    hold_jobs = [cluster_engine.subjob_name(evgen_submit.job_name())] + [
-                 cluster_engine.subjob_name(D) for D in RunOptions.derivations]
+    hold_jobs = []
+    if evgen_submit.n_scheduled() > 0:
+        hold_jobs += [cluster_engine.subjob_name(evgen_submit.job_name())] + [
+                      cluster_engine.subjob_name(D) for D in RunOptions.derivations]
+    if evgen_submit.n_merge_scheduled() > 0:
+        hold_jobs += [cluster_engine.subjob_name(evgen_submit.merge_job_name())]
     cluster_engine.submit_clean_all(hold_jobs)
 
     # schedule jobs
@@ -19,7 +19,7 @@ fi
 Seed=""
 if [ -f "${SeedFile}" ];then
     echo ${SeedFile}
-    Seed=`sed -n "${ID}{p;q;}" ${SeedFile}`
+    Seed=`get_list_entry ${SeedFile} ${ID}`
 else
     echo "Seed could not be extracted from seed file. Exiting."
     send_to_failure            
@@ -31,7 +31,7 @@ fi
 ################################################
 RUN=""
 if [ -f "${RunFile}" ];then
-    RUN=`sed -n "${ID}{p;q;}" ${RunFile}`
+    RUN=`get_list_entry ${RunFile} ${ID}`
 else
     echo "Run number not found. Exiting."
     send_to_failure            
@@ -44,7 +44,7 @@ fi
 ##################################################
 EVNT_DIR=""
 if [ -f "${InFile}" ];then
-    EVNT_DIR=`sed -n "${ID}{p;q;}" ${InFile}`
+    EVNT_DIR=`get_list_entry ${InFile} ${ID}`
 else
     echo "Input directory not found. Exiting."
     send_to_failure
@@ -55,7 +55,7 @@ fi
 ##################################################
 AOD_DIR=""
 if [ -f "${OutFile}" ];then
-    AOD_DIR=`sed -n "${ID}{p;q;}" ${OutFile}`
+    AOD_DIR=`get_list_entry ${OutFile} ${ID}`
 else
     echo "Output directory not found. Exiting"
     send_to_failure
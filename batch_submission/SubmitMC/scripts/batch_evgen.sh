@@ -19,7 +19,7 @@ fi
 Seed=""
 if [ -f "${SeedFile}" ];then
     echo ${SeedFile}
-    Seed=`sed -n "${ID}{p;q;}" ${SeedFile}`
+    Seed=`get_list_entry ${SeedFile} ${ID}`
 else
     echo "Seed could not be extracted from seed file. Exiting."
     send_to_failure            
@@ -32,7 +32,7 @@ fi
 JOBOPTION=""
 if [ -f "${JobFile}" ];then
     echo "${JobFile}"
-    JOBOPTION=`sed -n "${ID}{p;q;}" ${JobFile}`
+    JOBOPTION=`get_list_entry ${JobFile} ${ID}`
 else
     echo "Job option not found. Exiting."
     send_to_failure            
@@ -44,7 +44,7 @@ fi
 ################################################
 RUN=""
 if [ -f "${RunFile}" ];then
-    RUN=`sed -n "${ID}{p;q;}" ${RunFile}`
+    RUN=`get_list_entry ${RunFile} ${ID}`
 else
     echo "Run number not found. Exiting."
     send_to_failure            
@@ -56,13 +56,26 @@ fi
 ##################################################
 EVNT_DIR=""
 if [ -f "${OutFile}" ];then
-    EVNT_DIR=`sed -n "${ID}{p;q;}" ${OutFile}`
+    EVNT_DIR=`get_list_entry ${OutFile} ${ID}`
 else
     echo "Output location not found. Exiting."
     send_to_failure            
     exit 100
 fi
 
+##################################################
+## Find the gridpack (optional)
+##################################################
+GRIDPACK_FILE=""
+if [ -f "${GridpackFile}" ];then
+    GRIDPACK_FILE=`get_list_entry ${GridpackFile} ${ID}`
+    if [ ! -f "${GRIDPACK_FILE}" ];then
+        echo "Gridpack ${GRIDPACK_FILE} not found. Exiting."
+        send_to_failure
+        exit 100
+    fi
+fi
+
 sleeptime=$((${Seed}%30))
 echo "Sleeping for ${sleeptime}s to avoid too many parallel processes..."
 sleep $sleeptime
@@ -71,6 +84,35 @@ echo 'Starting job.'
 # check if TMPDIR exists or define it as TMP
 [[ -d "${TMPDIR}" ]] || export TMPDIR="${TMP}" || export TMPDIR="/tmp/"
 
+# stage the job options and models from the submission bundle to the local scratch
+if [ -f "${Bundle}" ] && [ -f "${BundleStager}" ];then
+    source ${BundleStager}
+    if ! stage_bundle ${Bundle} ${TMPDIR}/bundle; then
+        echo "Staging of the bundle failed. Exiting."
+        send_to_failure
+        exit 100
+    fi
+    JOBOPTION=${TMPDIR}/bundle/jobOptions/${JOBOPTION}
+    if [ -d ${TMPDIR}/bundle/models ];then
+        ModelsDirectory=${TMPDIR}/bundle/models
+    fi
+else
+    echo "Bundle ${Bundle} or stager ${BundleStager} not found. Exiting."
+    send_to_failure
+    exit 100
+fi
+
+# the number of events may differ per task (runtime-based splitting)
+if [ -f "${EventsFile}" ];then
+    NumberOfEvents=`get_list_entry ${EventsFile} ${ID}`
+fi
+
+# first event number of the task (sharding of one DSID with contiguous event numbers)
+FirstEvent=1
+if [ -f "${FirstEventFile}" ];then
+    FirstEvent=`get_list_entry ${FirstEventFile} ${ID}`
+fi
+
 # store number of events and model directory to a file in the TMPDIR to retrieve it later
 echo $NumberOfEvents > ${TMPDIR}/numberOfEvents.txt
 echo $ModelsDirectory
@@ -78,6 +120,12 @@ if [[ -n "${ModelsDirectory}" ]];then
   echo $ModelsDirectory > ${TMPDIR}/ModelPath.txt
 fi
 
+# share the MadGraph process directory between the jobs via the cache on the base folder
+if [[ -n "${ProcessCache}" ]];then
+  export MONOSBB_PROCDIR_CACHE=${ProcessCache}
+  export MONOSBB_PROCDIR_CACHE_SIZE=${ProcessCacheSize}
+fi
+
 echo "###############################################################################################"
 echo "                             Job submission"
 echo "###############################################################################################"
@@ -108,6 +156,12 @@ if [[ -f "ModelPath.txt" ]]; then
     export PYTHONPATH=${ModelsDirectory}:$PYTHONPATH
 fi
 
+# generate the events from the gridpack built for this run number
+if [[ -n "${GRIDPACK_FILE}" ]]; then
+    export MONOSBB_GRIDPACK=True
+    ExtraArgs="${ExtraArgs} --inputGeneratorFile=${GRIDPACK_FILE}"
+fi
+
 
 echo "###############################################################################################"
 echo "                             Configuration"
@@ -115,7 +169,9 @@ echo "##########################################################################
 echo "JobOption: "${JOBOPTION}
 echo "RunNumber: "${RUN}
 echo "NumberOfEvents: "${EVENTS}
+echo "FirstEvent: "${FirstEvent}
 echo "Seed: "${Seed} 
+echo "Gridpack: "${GRIDPACK_FILE}
 echo "Output: "${EVNT_DIR}
 echo "###############################################################################################"
 echo " "
@@ -125,10 +181,10 @@ file_log="mc16_13TeV.${RUN}.EVNT.${Seed}.log"
 GenSucced=2
 
 
-echo "Gen_tf.py ${ExtraArgs} --ecmEnergy=13000 --firstEvent=1 --maxEvents=${EVENTS} --randomSeed=${Seed} --jobConfig='${JOBOPTION}' --outputEVNTFile='${file_evnt}'" 
+echo "Gen_tf.py ${ExtraArgs} --ecmEnergy=13000 --firstEvent=${FirstEvent} --maxEvents=${EVENTS} --randomSeed=${Seed} --jobConfig='${JOBOPTION}' --outputEVNTFile='${file_evnt}'" 
 Gen_tf.py \
     --ecmEnergy=13000 \
-    --firstEvent=1 \
+    --firstEvent=${FirstEvent} \
     --maxEvents="${EVENTS}" \
     --randomSeed=${Seed} \
     --jobConfig=${JOBOPTION} \
@@ -158,6 +214,10 @@ fi
 
 mv ${file_evnt} ${EVNT_DIR}
 echo "Output: the EVNT file was saved to the output directory ${EVNT_DIR}."
+# record the seed of the valid EVNT file in the seed registry
+if [ "${GenSucced}" -eq "1" ] && [ -d "${SeedRegistry}" ];then
+  ( flock -x 9; echo ${Seed} >> ${SeedRegistry}/${RUN}.valid ) 9>>${SeedRegistry}/${RUN}.lock
+fi
 cp log.generate ${EVNT_DIR}/${file_log}
 echo "Output: the log file was saved to the output directory ${EVNT_DIR}."
 
@@ -0,0 +1,103 @@
+#!/bin/bash
+
+###############################################
+## Set up job for batch system
+###############################################
+if [ -f "${ClusterControlModule}" ]; then
+    source ${ClusterControlModule}
+fi
+
+ID=`get_task_ID`
+if [ -z ${ID} ]; then
+    echo "Error, job ID could not be determined: ID=${ID}. Exiting."
+    send_to_failure
+fi
+
+################################################
+## Find the input shards (comma separated)
+################################################
+IN_FILES=""
+if [ -f "${InFile}" ];then
+    IN_FILES=`get_list_entry ${InFile} ${ID}`
+else
+    echo "Input files not found. Exiting."
+    send_to_failure
+    exit 100
+fi
+
+##################################################
+## Set up output location
+##################################################
+OUT_FILE=""
+if [ -f "${OutFile}" ];then
+    OUT_FILE=`get_list_entry ${OutFile} ${ID}`
+else
+    echo "Output location not found. Exiting."
+    send_to_failure
+    exit 100
+fi
+
+# check if TMPDIR exists or define it as TMP
+[[ -d "${TMPDIR}" ]] || export TMPDIR="${TMP}" || export TMPDIR="/tmp/"
+
+echo "###############################################################################################"
+echo "                             EVNT merge job submission"
+echo "###############################################################################################"
+echo "Job name: ${Name}"
+echo "Job ID: ${ID}"
+echo "Working directory on batch machine: ${TMPDIR}"
+echo "###############################################################################################"
+echo " "
+
+# the merged files are only written from complete sets of shards. Failed shards are
+# generated again with submit.py --resume, which then merges all shards of the DSID
+for F in ${IN_FILES//,/ }; do
+    if [ ! -f "${F}" ]; then
+        echo "Shard ${F} does not exist. Exiting."
+        send_to_failure
+        exit 100
+    fi
+done
+
+echo "###############################################################################################"
+echo "                    Setting up the environment"
+echo "###############################################################################################"
+export ATLAS_LOCAL_ROOT_BASE=/cvmfs/atlas.cern.ch/repo/ATLASLocalRootBase
+echo "Setting Up the ATLAS Enviroment:"
+echo "source ${ATLAS_LOCAL_ROOT_BASE}/user/atlasLocalSetup.sh"
+source ${ATLAS_LOCAL_ROOT_BASE}/user/atlasLocalSetup.sh
+echo "cd ${TMPDIR}"
+cd ${TMPDIR}
+echo "Setup ${EvgenRelease} (release ${EvgenCache}):"
+echo "asetup ${EvgenRelease},${EvgenCache}"
+asetup ${EvgenRelease},${EvgenCache}
+
+echo "###############################################################################################"
+echo "                             Configuration"
+echo "###############################################################################################"
+echo "Input: "${IN_FILES}
+echo "Output: "${OUT_FILE}
+echo "###############################################################################################"
+echo " "
+
+file_merged=`basename ${OUT_FILE}`
+echo "EVNTMerge_tf.py --inputEVNTFile='${IN_FILES}' --outputEVNT_MRGFile='${file_merged}'"
+EVNTMerge_tf.py \
+    --inputEVNTFile=${IN_FILES} \
+    --outputEVNT_MRGFile=${file_merged}
+if [ $? -ne 0 ]; then
+    echo "EVNT merge failed."
+    send_to_failure
+    exit 100
+fi
+ls -lh
+
+mkdir -p `dirname ${OUT_FILE}`
+if [ -f ${OUT_FILE} ]; then
+  rm ${OUT_FILE}
+  echo "Cleaning up: an old merged file was removed."
+fi
+mv ${file_merged} ${OUT_FILE}
+cp log.EVNTMerge ${OUT_FILE/%.pool.root/.log}
+echo "Output: the merged EVNT file was saved to ${OUT_FILE}."
+echo "EVNT merge was successful. Proceed with the next step."
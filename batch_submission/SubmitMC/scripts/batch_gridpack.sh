@@ -0,0 +1,146 @@
+#!/bin/bash
+
+###############################################
+## Set up job for batch system
+###############################################
+if [ -f "${ClusterControlModule}" ]; then
+    source ${ClusterControlModule}
+fi
+
+ID=`get_task_ID`
+if [ -z ${ID} ]; then
+    echo "Error, job ID could not be determined: ID=${ID}. Exiting."
+    send_to_failure
+fi
+
+################################################
+## Find the job option file
+################################################
+JOBOPTION=""
+if [ -f "${JobFile}" ];then
+    echo "${JobFile}"
+    JOBOPTION=`get_list_entry ${JobFile} ${ID}`
+else
+    echo "Job option not found. Exiting."
+    send_to_failure
+    exit 100
+fi
+
+################################################
+## Find the run number
+################################################
+RUN=""
+if [ -f "${RunFile}" ];then
+    RUN=`get_list_entry ${RunFile} ${ID}`
+else
+    echo "Run number not found. Exiting."
+    send_to_failure
+    exit 100
+fi
+
+##################################################
+## Set up output location
+##################################################
+GRIDPACK_FILE=""
+if [ -f "${OutFile}" ];then
+    GRIDPACK_FILE=`get_list_entry ${OutFile} ${ID}`
+else
+    echo "Output location not found. Exiting."
+    send_to_failure
+    exit 100
+fi
+
+# check if TMPDIR exists or define it as TMP
+[[ -d "${TMPDIR}" ]] || export TMPDIR="${TMP}" || export TMPDIR="/tmp/"
+
+# stage the job options and models from the submission bundle to the local scratch
+if [ -f "${Bundle}" ] && [ -f "${BundleStager}" ];then
+    source ${BundleStager}
+    if ! stage_bundle ${Bundle} ${TMPDIR}/bundle; then
+        echo "Staging of the bundle failed. Exiting."
+        send_to_failure
+        exit 100
+    fi
+    JOBOPTION=${TMPDIR}/bundle/jobOptions/${JOBOPTION}
+    if [ -d ${TMPDIR}/bundle/models ];then
+        ModelsDirectory=${TMPDIR}/bundle/models
+    fi
+else
+    echo "Bundle ${Bundle} or stager ${BundleStager} not found. Exiting."
+    send_to_failure
+    exit 100
+fi
+
+# store model directory to a file in the TMPDIR to retrieve it later
+if [[ -n "${ModelsDirectory}" ]];then
+  echo $ModelsDirectory > ${TMPDIR}/ModelPath.txt
+fi
+
+echo "###############################################################################################"
+echo "                             Gridpack job submission"
+echo "###############################################################################################"
+echo "Job name: ${Name}"
+echo "Job ID: ${ID}"
+echo "Working directory on batch machine: ${TMPDIR}"
+echo "###############################################################################################"
+echo " "
+
+echo "###############################################################################################"
+echo "                    Setting up the environment"
+echo "###############################################################################################"
+export ATLAS_LOCAL_ROOT_BASE=/cvmfs/atlas.cern.ch/repo/ATLASLocalRootBase
+echo "Setting Up the ATLAS Enviroment:"
+echo "source ${ATLAS_LOCAL_ROOT_BASE}/user/atlasLocalSetup.sh"
+source ${ATLAS_LOCAL_ROOT_BASE}/user/atlasLocalSetup.sh
+echo "cd ${TMPDIR}"
+cd ${TMPDIR}
+echo "Setup ${EvgenRelease} (release ${EvgenCache}):"
+echo "asetup ${EvgenRelease},${EvgenCache}"
+asetup ${EvgenRelease},${EvgenCache}
+
+# retrieve model path from file
+if [[ -f "ModelPath.txt" ]]; then
+    ModelsDirectory=`cat ModelPath.txt`
+    export PYTHONPATH=${ModelsDirectory}:$PYTHONPATH
+fi
+
+# let the job option build the gridpack instead of generating events
+export MONOSBB_GRIDPACK=True
+
+echo "###############################################################################################"
+echo "                             Configuration"
+echo "###############################################################################################"
+echo "JobOption: "${JOBOPTION}
+echo "RunNumber: "${RUN}
+echo "Gridpack: "${GRIDPACK_FILE}
+echo "###############################################################################################"
+echo " "
+
+echo "Gen_tf.py --ecmEnergy=13000 --firstEvent=1 --maxEvents=-1 --randomSeed=${RUN} --jobConfig='${JOBOPTION}' --outputEVNTFile='tmp.EVNT.pool.root' --outputFileValidation=False"
+Gen_tf.py \
+    --ecmEnergy=13000 \
+    --firstEvent=1 \
+    --maxEvents=-1 \
+    --randomSeed=${RUN} \
+    --jobConfig=${JOBOPTION} \
+    --outputEVNTFile=tmp.EVNT.pool.root \
+    --outputFileValidation=False
+ls -lh
+
+# the transform exits after the gridpack has been written
+GRIDPACK=`ls *.GRID.tar.gz 2> /dev/null | head -n 1`
+if [ -z "${GRIDPACK}" ]; then
+    echo "Gridpack creation failed."
+    send_to_failure
+    exit 100
+fi
+
+mkdir -p `dirname ${GRIDPACK_FILE}`
+if [ -f ${GRIDPACK_FILE} ]; then
+  rm ${GRIDPACK_FILE}
+  echo "Cleaning up: an old gridpack was removed."
+fi
+mv ${GRIDPACK} ${GRIDPACK_FILE}
+cp log.generate ${GRIDPACK_FILE/%.GRID.tar.gz/.log}
+echo "Output: the gridpack was saved to ${GRIDPACK_FILE}."
+echo "Gridpack creation was successful. Proceed with the next step."
@@ -0,0 +1,49 @@
+#!/bin/bash
+
+###############################################
+## Stages the submission bundle written by StagingBundle.py to the local scratch
+## directory. The bundle is read once from the shared file system, the job option
+## folders are rebuilt from links onto the deduplicated objects.
+##      stage_bundle <bundle> <target directory>
+###############################################
+stage_bundle() {
+    local bundle=$1
+    local target=$2
+    if [ -f "${target}/.staged" ]; then
+        return 0
+    fi
+    if [ ! -f "${bundle}" ]; then
+        echo "Bundle ${bundle} not found."
+        return 1
+    fi
+    mkdir -p ${target}
+    cp ${bundle} ${target}/bundle.zip || return 1
+    local python_exe=`command -v python3 || command -v python`
+    ${python_exe} - ${target} <<'EOF'
+import os, sys, zipfile
+target = sys.argv[1]
+# same time as StagingBundle.SOURCE_EPOCH
+SOURCE_EPOCH = 946684800
+with zipfile.ZipFile(os.path.join(target, "bundle.zip")) as bundle:
+    bundle.extractall(target)
+    for name in bundle.namelist():
+        if name.startswith("models/"):
+            os.utime(os.path.join(target, name), (SOURCE_EPOCH, SOURCE_EPOCH))
+with open(os.path.join(target, "jobOptions.txt")) as manifest:
+    for line in manifest:
+        if line.startswith("#") or not line.strip():
+            continue
+        path, digest = line.split()
+        link = os.path.join(target, "jobOptions", path)
+        if not os.path.isdir(os.path.dirname(link)):
+            os.makedirs(os.path.dirname(link))
+        os.symlink(os.path.join(target, "objects", digest), link)
+EOF
+    if [ $? -ne 0 ]; then
+        echo "The bundle ${bundle} could not be extracted."
+        return 1
+    fi
+    rm ${target}/bundle.zip
+    touch ${target}/.staged
+    return 0
+}
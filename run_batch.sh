@@ -11,9 +11,15 @@ EVENTS=10000               #Events per job
 NJOBS=1                    #Number of jobs per DSID
 RUNTIME="03:00:00"         #Run time per job HH:MM:SS
 MEMORY=2000                #Memory per job in MB
+NCORES=1                   #Cores per job (e.g. 8 for multi-core slots), each further core adds --evgen_memory_per_core (2000 MB)
+AUTOSPLIT=0                #Set to 1 to choose events per job, jobs and run time per DSID from the logs of previous jobs
+TOTALEVENTS=10000          #Events per DSID with AUTOSPLIT=1 (RUNTIME is the target run time per job)
 MODELSDIR=$PWD/models
 
 cd batch_submission
-COMMAND="python SubmitMC/python/submit.py --jobName ${JOBNAME} --engine HTCONDOR --eventsPerJob ${EVENTS} --nJobs ${NJOBS} -r ${DSIDS} --noBuildJob --modelsDir ${MODELSDIR} --accountinggroup af-atlas --evgen_runtime ${RUNTIME} --evgen_memory ${MEMORY}"
+COMMAND="python SubmitMC/python/submit.py --jobName ${JOBNAME} --engine HTCONDOR --eventsPerJob ${EVENTS} --nJobs ${NJOBS} -r ${DSIDS} --noBuildJob --modelsDir ${MODELSDIR} --accountinggroup af-atlas --evgen_runtime ${RUNTIME} --evgen_memory ${MEMORY} --nCores ${NCORES}"
+if [ "${AUTOSPLIT}" == "1" ]; then
+  COMMAND="${COMMAND} --autoSplit --totalEvents ${TOTALEVENTS} --targetRuntime ${RUNTIME}"
+fi
 echo $COMMAND
 $COMMAND